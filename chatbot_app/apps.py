@@ -1,4 +1,11 @@
+import logging
+import threading
+import time
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class ChatbotAppConfig(AppConfig):
@@ -6,8 +13,49 @@ class ChatbotAppConfig(AppConfig):
     name = 'chatbot_app'
     
     def ready(self):
-        from .rag.chatbot import Chatbot
-        self.chatbot = Chatbot()
-        self.chatbot.setup_workflow()
+        # Chatbot (FAISS, LLM client, reranker, graph) chỉ được dựng khi có câu hỏi đầu tiên hoặc khi worker web
+        # gọi warm_up(); migrate, collectstatic, celery worker và beat không phải trả chi phí này
+        self._chatbot = None
+        self._chatbot_lock = threading.Lock()
 
         import chatbot_app.signals
+
+    def _load(self, remote: bool):
+        if self._chatbot is None:
+            with self._chatbot_lock:
+                if self._chatbot is None:
+                    if remote:
+                        # Worker web chỉ giữ client, Chatbot chạy trong process manage.py run_chatbot_server
+                        from .rag.inference import get_remote_chatbot
+                        self._chatbot = get_remote_chatbot()
+                        return self._chatbot
+                    from .rag.chatbot import Chatbot
+                    started = time.perf_counter()
+                    chatbot = Chatbot()
+                    chatbot.setup_workflow()
+                    self._chatbot = chatbot
+                    logger.info(f"Đã khởi tạo chatbot trong {time.perf_counter() - started:.1f}s")
+        return self._chatbot
+
+    @property
+    def chatbot(self):
+        return self._load(remote=settings.CHATBOT_INFERENCE_MODE == "remote")
+
+    def local_chatbot(self):
+        """Luôn dựng Chatbot trong process này, dùng cho inference server."""
+        return self._load(remote=False)
+
+    @property
+    def loaded_chatbot(self):
+        """Chatbot nếu process này đã dựng, None nếu chưa (không dựng mới)."""
+        return self._chatbot
+
+    def warm_up(self):
+        """Dựng chatbot trước request đầu tiên, chỉ gọi từ entrypoint web (config/asgi.py)."""
+        if not settings.CHATBOT_WARMUP:
+            return
+        try:
+            self.chatbot.warm_up()
+        except Exception as e:
+            # Không làm chết worker: request đầu tiên sẽ thử dựng lại
+            logger.exception(f"Không warm-up được chatbot: {e}")
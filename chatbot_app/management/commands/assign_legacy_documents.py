@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot_app.models import Document
+from chatbot_app.rag.index_factory import vectors_for
+from chatbot_app.rag.index_registry import bump_index_version, index_namespace
+from chatbot_app.rag.vector_db import VectorDB, index_exists
+from organizers.models import Organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Gắn Document cũ (chưa có tổ chức, nằm trong index chung) vào một tổ chức và chuyển vector của chúng "
+        "sang index riêng của tổ chức đó, không phải embed lại. Câu hỏi của người dùng không tìm trong index chung "
+        "nên tài liệu cũ chỉ trả lời được sau khi chạy lệnh này."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("documents", nargs="*", type=int, help="Id các Document cần chuyển")
+        parser.add_argument("--organization", type=int, required=True, help="Id tổ chức nhận Document")
+        parser.add_argument("--all", action="store_true", help="Chuyển mọi Document chưa gắn tổ chức")
+
+    def handle(self, *args, **options):
+        organization = Organization.objects.filter(pk=options["organization"]).first()
+        if organization is None:
+            raise CommandError(f"Không có tổ chức {options['organization']}")
+        documents = Document.objects.filter(organization__isnull=True).order_by("id")
+        if not options["all"]:
+            if not options["documents"]:
+                raise CommandError("Truyền id Document hoặc --all")
+            documents = documents.filter(pk__in=options["documents"])
+        documents = list(documents)
+        if not documents:
+            self.stdout.write("Không có Document nào chưa gắn tổ chức")
+            return
+
+        namespace = index_namespace(organization.id)
+        shared = VectorDB(writable=True) if index_exists(None) else None
+        target = VectorDB(writable=True, namespace=namespace)
+        # Vector được chép nguyên nên hai index phải cùng model embedding
+        if shared is not None and shared.index_embedding_model() != target.index_embedding_model():
+            raise CommandError(
+                f"Index chung dùng {shared.index_embedding_model()}, index {namespace} dùng "
+                f"{target.index_embedding_model()}: chạy reindex_embeddings cho một trong hai trước"
+            )
+
+        moved = 0
+        for document in documents:
+            source = document.file_path.path if document.file_path else None
+            chunks = shared.db.docstore.document_chunks(document.id, source) if shared is not None else {}
+            if chunks:
+                vectors = vectors_for(shared.db.index, list(chunks))
+                # replace=True để chạy lại lệnh không nhân đôi chunk trong index của tổ chức
+                if not target.merge_documents(list(chunks.values()), vectors, document_id=document.id, replace=True):
+                    raise CommandError(f"Không ghi được document {document.id} vào index {namespace}")
+                shared.delete_document(document.id, source)
+            # Gắn tổ chức sau cùng: dừng giữa chừng thì Document vẫn chưa có tổ chức, chạy lại lệnh là đủ
+            Document.objects.filter(pk=document.pk).update(organization=organization)
+            moved += len(chunks)
+            self.stdout.write(f"Document {document.id} ({document.file_name}): {len(chunks)} chunks -> {namespace}")
+
+        bump_index_version(namespace)
+        if shared is not None:
+            bump_index_version(None)
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã gắn {len(documents)} Document vào tổ chức {organization.id}, chuyển {moved} chunks"
+        ))
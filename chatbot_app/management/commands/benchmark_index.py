@@ -0,0 +1,85 @@
+import time
+
+import faiss
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chatbot_app.rag.index_factory import build_index, prepare_index
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Các chunk cùng một tài liệu nằm gần nhau nên sinh dữ liệu theo cụm rồi chuẩn hóa như embedding OpenAI."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 10000):
+        end = min(start + 10000, n)
+        labels = rng.integers(0, clusters, end - start)
+        vectors[start:end] = centers[labels] + 0.8 * rng.standard_normal((end - start, dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+class Command(BaseCommand):
+    help = "So sánh recall@k và độ trễ của HNSW, IVF-Flat, IVF-PQ với Flat trên corpus tổng hợp"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--n", type=int, default=100000)
+        parser.add_argument("--dim", type=int, default=3072)
+        parser.add_argument("--clusters", type=int, default=1000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--types", default="hnsw,ivf_flat,ivf_pq")
+        parser.add_argument("--nprobe", default="4,8,16,32")
+        parser.add_argument("--ef-search", default="32,64,128")
+        parser.add_argument("--nlist", type=int, default=None)
+        parser.add_argument("--hnsw-m", type=int, default=32)
+        parser.add_argument("--pq-m", type=int, default=64)
+
+    def _search(self, index, queries, k):
+        timings = []
+        results = np.empty((len(queries), k), dtype=np.int64)
+        # Tìm từng câu hỏi một như khi phục vụ request
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            results[i] = index.search(query.reshape(1, -1), k)[1][0]
+            timings.append((time.perf_counter() - start) * 1000)
+        return results, np.array(timings)
+
+    def _report(self, label, results, timings, ground_truth, k, size):
+        recall = np.mean([len(set(r) & set(g)) / k for r, g in zip(results, ground_truth)])
+        self.stdout.write(
+            f"{label:<24} recall@{k}={recall:.3f} mean={timings.mean():.2f}ms "
+            f"p95={np.percentile(timings, 95):.2f}ms size={size / 2**20:.0f}MB"
+        )
+
+    def handle(self, *args, **options):
+        n, dim, k = options["n"], options["dim"], options["k"]
+        self.stdout.write(f"Sinh {n} vector {dim} chiều...")
+        vectors = synthetic_corpus(n, dim, options["clusters"])
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.choice(n, options["queries"], replace=False)] \
+            + 0.05 * rng.standard_normal((options["queries"], dim), dtype=np.float32)
+        faiss.normalize_L2(queries)
+
+        flat = build_index("flat", vectors)
+        ground_truth, timings = self._search(flat, queries, k)
+        self._report("flat", ground_truth, timings, ground_truth, k, flat.ntotal * dim * 4)
+        del flat
+
+        params = {"nlist": options["nlist"], "hnsw_m": options["hnsw_m"], "pq_m": options["pq_m"]}
+        for index_type in options["types"].split(","):
+            start = time.perf_counter()
+            index = build_index(index_type, vectors, **params)
+            self.stdout.write(f"{index_type}: build {time.perf_counter() - start:.1f}s")
+            size = len(faiss.serialize_index(index))
+
+            if index_type == "hnsw":
+                sweep = [("ef_search", int(v)) for v in options["ef_search"].split(",")]
+            else:
+                sweep = [("nprobe", int(v)) for v in options["nprobe"].split(",")]
+            for name, value in sweep:
+                prepare_index(index, **{name: value})
+                results, timings = self._search(index, queries, k)
+                self._report(f"{index_type} {name}={value}", results, timings, ground_truth, k, size)
+            del index
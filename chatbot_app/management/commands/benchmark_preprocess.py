@@ -0,0 +1,72 @@
+import statistics
+import time
+
+import regex as re
+from django.core.management.base import BaseCommand, CommandError
+from pyvi import ViTokenizer
+
+from chatbot_app.rag import standardize
+from chatbot_app.rag.standardize import preprocess_text, preprocess_texts
+
+
+def reference_preprocess_text(text):
+    """preprocess_text trước khi có cache/fast path, dùng để so sánh kết quả từng byte."""
+    text = standardize.standardize_unicode(text)
+    words = text.lower().split()
+    for index, word in enumerate(words):
+        cw = re.sub(r'(^\p{P}*)([p{L}.]*\p{L}+)(\p{P}*$)', r'\1/\2/\3', word).split('/')
+        if len(cw) == 3:
+            cw[1] = standardize.standardize_vietnamese_word(cw[1])
+        words[index] = ''.join(cw)
+    return ViTokenizer.tokenize(' '.join(words)).lower()
+
+
+def load_pages(path):
+    if path.lower().endswith(".pdf"):
+        import pymupdf
+        import pymupdf4llm
+        with pymupdf.open(path) as doc:
+            return [pymupdf4llm.to_markdown(doc, pages=[i], show_progress=False, graphics_limit=5000)
+                    for i in range(len(doc))]
+    with open(path, encoding="utf-8") as f:
+        # File text: mỗi đoạn cách nhau một dòng trống coi như một trang
+        return [page for page in f.read().split("\n\n") if page.strip()]
+
+
+class Command(BaseCommand):
+    help = "So sánh tốc độ và kết quả của preprocess_text mới với bản cũ trên một tài liệu (PDF hoặc .txt)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Cẩm nang PDF hoặc file text tiếng Việt")
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def _time(self, fn, pages, repeat):
+        timings = []
+        for _ in range(repeat):
+            standardize._standardize_token.cache_clear()
+            start = time.perf_counter()
+            result = fn(pages)
+            timings.append(time.perf_counter() - start)
+        return result, statistics.median(timings)
+
+    def handle(self, *args, **options):
+        try:
+            pages = load_pages(options["path"])
+        except OSError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"{len(pages)} trang, {sum(len(p) for p in pages)} ký tự")
+        repeat = options["repeat"]
+
+        expected, reference_time = self._time(lambda ps: [reference_preprocess_text(p) for p in ps], pages, repeat)
+        single, single_time = self._time(lambda ps: [preprocess_text(p) for p in ps], pages, repeat)
+        batch, batch_time = self._time(preprocess_texts, pages, repeat)
+
+        self.stdout.write(f"bản cũ:               {reference_time:.2f}s")
+        self.stdout.write(f"preprocess_text:      {single_time:.2f}s (x{reference_time / single_time:.1f})")
+        self.stdout.write(f"preprocess_texts (lô): {batch_time:.2f}s (x{reference_time / batch_time:.1f})")
+        self.stdout.write(f"cache từ: {standardize._standardize_token.cache_info()}")
+
+        mismatches = [i for i, (a, b, c) in enumerate(zip(expected, single, batch)) if not a == b == c]
+        if mismatches:
+            raise CommandError(f"Kết quả khác bản cũ ở các trang {mismatches[:10]}")
+        self.stdout.write(self.style.SUCCESS("Kết quả giống hệt bản cũ trên mọi trang"))
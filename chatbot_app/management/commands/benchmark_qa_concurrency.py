@@ -0,0 +1,82 @@
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+ENDPOINTS = {
+    "sync": "ask/",
+    "async": "ask/async/",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test POST ask/ (DRF, sync) và ask/async/ trên một server đang chạy: gửi N request đồng thời "
+        "và so sánh throughput, độ trễ. Nên tắt CHATBOT_SEMANTIC_CACHE_ENABLED và CHATBOT_SINGLE_FLIGHT_ENABLED "
+        "trên server để mọi request đều chạy pipeline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000/api/chatbot/")
+        parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=["sync", "async"])
+        parser.add_argument("--concurrency", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=0, help="Tổng số request, mặc định bằng concurrency")
+        parser.add_argument("--question", default="Làm thế nào để giảm căng thẳng trước kỳ thi?")
+        parser.add_argument("--timeout", type=float, default=300.0)
+        parser.add_argument("--token", default="", help="JWT gửi kèm header Authorization nếu cần")
+
+    async def _run(self, url, options):
+        total = options["requests"] or options["concurrency"]
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        headers = {"Authorization": f"Bearer {options['token']}"} if options["token"] else {}
+        latencies, errors = [], []
+        in_flight = peak = 0
+
+        limits = httpx.Limits(max_connections=options["concurrency"], max_keepalive_connections=options["concurrency"])
+        async with httpx.AsyncClient(timeout=options["timeout"], limits=limits, headers=headers) as client:
+            async def one(i):
+                nonlocal in_flight, peak
+                async with semaphore:
+                    # Mỗi request một thread mới để không dùng chung lịch sử hội thoại
+                    payload = {"question": options["question"], "thread_id": f"loadtest-{uuid.uuid4().hex}"}
+                    in_flight += 1
+                    peak = max(peak, in_flight)
+                    start = time.perf_counter()
+                    try:
+                        response = await client.post(url, json=payload)
+                        response.raise_for_status()
+                        latencies.append(time.perf_counter() - start)
+                    except httpx.HTTPError as e:
+                        errors.append(repr(e))
+                    finally:
+                        in_flight -= 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(total)))
+            wall = time.perf_counter() - started
+        return total, wall, sorted(latencies), errors, peak
+
+    def handle(self, *args, **options):
+        base_url = options["base_url"].rstrip("/") + "/"
+        report = {}
+        for name in options["endpoints"]:
+            url = base_url + ENDPOINTS[name]
+            total, wall, latencies, errors, peak = asyncio.run(self._run(url, options))
+            if not latencies:
+                raise CommandError(f"{name}: mọi request đều lỗi, ví dụ {errors[:1]}")
+            report[name] = len(latencies) / wall
+            self.stdout.write(
+                f"{name:>5} {url}: {len(latencies)}/{total} ok, {len(errors)} lỗi, "
+                f"{wall:.1f}s, {report[name]:.1f} req/s, "
+                f"p50={statistics.median(latencies):.2f}s "
+                f"p95={latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.2f}s "
+                f"max={latencies[-1]:.2f}s, đồng thời phía client={peak}"
+            )
+            if errors:
+                self.stdout.write(f"      lỗi đầu tiên: {errors[0]}")
+
+        if "sync" in report and "async" in report:
+            self.stdout.write(self.style.SUCCESS(f"async/sync throughput: x{report['async'] / report['sync']:.1f}"))
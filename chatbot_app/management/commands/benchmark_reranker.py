@@ -0,0 +1,63 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot_app.models import QAHistory
+from chatbot_app.rag.reranker import get_rerank_backend
+from chatbot_app.rag.vector_db import VectorDB
+
+
+class Command(BaseCommand):
+    help = "So sánh độ trễ và recall@k của các backend reranker trên cùng tập ứng viên"
+
+    def add_arguments(self, parser):
+        parser.add_argument("queries", nargs="*")
+        parser.add_argument("--history", type=int, default=0,
+                            help="Lấy thêm N câu hỏi gần nhất từ QAHistory")
+        parser.add_argument("--backends", default="rankllm,onnx,bm25")
+        parser.add_argument("--reference", default="rankllm",
+                            help="Backend dùng làm chuẩn để tính recall@k")
+        parser.add_argument("--k", type=int, default=4)
+
+    def handle(self, *args, **options):
+        queries = list(options["queries"])
+        if options["history"]:
+            queries += list(QAHistory.objects.filter(intent="1")
+                            .order_by("-created_at")
+                            .values_list("question", flat=True)[:options["history"]])
+        if not queries:
+            raise CommandError("Cần truyền câu hỏi hoặc --history N")
+
+        retriever = VectorDB().get_context_enriched_retriever()
+        candidates = {query: [doc.page_content for doc in retriever.invoke(query)] for query in queries}
+
+        k = options["k"]
+        rankings = {}
+        for name in options["backends"].split(","):
+            try:
+                backend = get_rerank_backend(name)
+            except Exception as e:
+                self.stderr.write(f"{name:>8}: bỏ qua ({e})")
+                continue
+            timings = []
+            rankings[name] = {}
+            for query, texts in candidates.items():
+                start = time.perf_counter()
+                rankings[name][query] = backend.rank(query, texts)[:k]
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{name:>8}: mean={statistics.mean(timings):.1f}ms "
+                f"p50={timings[len(timings) // 2]:.1f}ms max={timings[-1]:.1f}ms"
+            )
+
+        reference = rankings.get(options["reference"])
+        if reference is None:
+            return
+        for name, ranking in rankings.items():
+            recall = statistics.mean(
+                len(set(ranking[query]) & set(reference[query])) / max(len(reference[query]), 1)
+                for query in queries
+            )
+            self.stdout.write(f"{name:>8}: recall@{k} so với {options['reference']} = {recall:.2f}")
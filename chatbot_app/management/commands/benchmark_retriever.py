@@ -0,0 +1,89 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from langchain.retrievers import EnsembleRetriever
+
+from chatbot_app.rag.vector_db import VectorDB
+
+
+class CountingEmbeddings:
+    """Đếm số lần embed câu hỏi, bọc embedding gốc (không qua cache)."""
+
+    def __init__(self, embedding):
+        self.embedding = embedding
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return self.embedding.embed_query(text)
+
+    def embed_documents(self, texts):
+        return self.embedding.embed_documents(texts)
+
+    def __call__(self, text):
+        return self.embed_query(text)
+
+
+class Command(BaseCommand):
+    help = "So sánh độ trễ giữa EnsembleRetriever(similarity + mmr) cũ và HybridRetriever"
+
+    def add_arguments(self, parser):
+        parser.add_argument("queries", nargs="*", default=[
+            "Điều kiện xét học bổng là gì?",
+            "Sinh viên được nghỉ học tối đa bao nhiêu buổi?",
+            "Quy định về đánh giá rèn luyện",
+        ])
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--k", type=int, default=5)
+        parser.add_argument("--cached", action="store_true",
+                            help="Dùng embedding có cache (mặc định gọi thẳng model để thấy chi phí embed)")
+
+    def _run(self, retriever, queries, iterations):
+        timings = []
+        results = {}
+        for _ in range(iterations):
+            for query in queries:
+                start = time.perf_counter()
+                docs = retriever.invoke(query)
+                timings.append((time.perf_counter() - start) * 1000)
+                results[query] = [doc.page_content for doc in docs]
+        timings.sort()
+        return timings, results
+
+    def handle(self, *args, **options):
+        vector_db = VectorDB()
+        db = vector_db.db
+        if db is None:
+            raise CommandError(f"Chưa có index tại {vector_db.path}, hãy ingest tài liệu trước")
+        embedding = vector_db.embedding if options["cached"] else getattr(vector_db.embedding, "embedding", vector_db.embedding)
+        counter = CountingEmbeddings(embedding)
+        db.embedding_function = counter
+
+        search_kwargs = {"k": options["k"]}
+        legacy = EnsembleRetriever(
+            retrievers=[
+                db.as_retriever(search_type="similarity", search_kwargs=search_kwargs),
+                db.as_retriever(search_type="mmr", search_kwargs=search_kwargs),
+            ],
+            weights=[0.8, 0.2],
+        )
+        hybrid = vector_db.get_retriever(search_kwargs=search_kwargs)
+
+        queries = options["queries"]
+        iterations = options["iterations"]
+        report = {}
+        for name, retriever in [("ensemble", legacy), ("hybrid", hybrid)]:
+            counter.calls = 0
+            timings, results = self._run(retriever, queries, iterations)
+            report[name] = results
+            self.stdout.write(
+                f"{name:>8}: mean={statistics.mean(timings):.2f}ms "
+                f"p50={timings[len(timings) // 2]:.2f}ms "
+                f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms "
+                f"embed_calls/query={counter.calls / len(timings):.1f}"
+            )
+
+        same = sum(report["ensemble"][q] == report["hybrid"][q] for q in queries)
+        self.stdout.write(f"Kết quả trùng khớp: {same}/{len(queries)} câu hỏi")
+        db.embedding_function = vector_db.embedding
@@ -0,0 +1,73 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Mỗi kịch bản chạy trong một process Python mới, in thời gian và RSS tối đa của chính nó
+SCENARIOS = {
+    # manage.py migrate/collectstatic, celery worker, celery beat
+    "setup": "import django; django.setup()",
+    # worker uvicorn: django.setup() rồi warm-up chatbot trong config/asgi.py
+    "asgi": "import config.asgi",
+    # worker uvicorn với CHATBOT_WARMUP=False, chatbot dựng ở câu hỏi đầu tiên
+    "asgi_lazy": "import config.asgi",
+}
+
+SCRIPT = """
+import json, resource, time
+started = time.perf_counter()
+{code}
+from django.apps import apps
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "chatbot_loaded": apps.get_app_config("chatbot_app").loaded_chatbot is not None,
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Đo thời gian khởi động và RSS tối đa của một process Django theo vai trò (manage.py/celery, worker web). "
+        "Các kịch bản không warm-up chatbot phải khởi động trong --budget giây, vượt thì lệnh báo lỗi"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+        parser.add_argument("--runs", type=int, default=3)
+        parser.add_argument("--budget", type=float, default=settings.CHATBOT_STARTUP_BUDGET_SECONDS)
+
+    def _run(self, name):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings")}
+        if name == "asgi_lazy":
+            env["CHATBOT_WARMUP"] = "False"
+        process = subprocess.run([sys.executable, "-c", SCRIPT.format(code=SCENARIOS[name])],
+                                 cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if process.returncode != 0:
+            raise CommandError(f"{name}: process lỗi\n{process.stderr[-2000:]}")
+        # Dòng JSON là dòng cuối, các dòng trước là log [DEBUG] khi khởi động
+        return json.loads(process.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        over_budget = []
+        for name in options["scenarios"]:
+            results = [self._run(name) for _ in range(options["runs"])]
+            seconds = [r["seconds"] for r in results]
+            rss = [r["max_rss_mb"] for r in results]
+            self.stdout.write(
+                f"{name:>9}: {statistics.median(seconds):.2f}s (min {min(seconds):.2f}s), "
+                f"RSS {statistics.median(rss):.0f} MB, chatbot {'đã' if results[0]['chatbot_loaded'] else 'chưa'} dựng"
+            )
+            # Warm-up (asgi) cố ý dựng chatbot nên không tính vào ngân sách
+            if not results[0]["chatbot_loaded"] and statistics.median(seconds) > options["budget"]:
+                over_budget.append(name)
+
+        if over_budget:
+            raise CommandError(f"Vượt ngân sách khởi động {options['budget']:.2f}s: {', '.join(over_budget)} "
+                               f"(xem manage.py profile_imports)")
+        self.stdout.write(self.style.SUCCESS(f"Trong ngân sách khởi động {options['budget']:.2f}s"))
@@ -0,0 +1,50 @@
+import faiss
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot_app.rag.index_factory import INDEX_TYPES, build_index, index_type_of, vectors_for
+from chatbot_app.rag.index_registry import bump_index_version, index_namespace
+from chatbot_app.rag.vector_db import VectorDB, index_exists
+
+
+class Command(BaseCommand):
+    help = "Chuyển FAISS index (index chung hoặc của một tổ chức) sang loại index khác (flat, hnsw, ivf_flat, ivf_pq)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--type", choices=INDEX_TYPES, default=settings.CHATBOT_FAISS_INDEX_TYPE)
+        parser.add_argument("--nlist", type=int, default=settings.CHATBOT_FAISS_NLIST or None)
+        parser.add_argument("--hnsw-m", type=int, default=settings.CHATBOT_FAISS_HNSW_M)
+        parser.add_argument("--pq-m", type=int, default=settings.CHATBOT_FAISS_PQ_M)
+        parser.add_argument("--organization", type=int, default=None,
+                            help="Id tổ chức, bỏ trống để chuyển index chung")
+
+    def handle(self, *args, **options):
+        namespace = index_namespace(options["organization"])
+        if namespace and not index_exists(namespace):
+            raise CommandError(f"Tổ chức {options['organization']} chưa có index")
+        vector_db = VectorDB(writable=True, namespace=namespace)
+        db = vector_db.db
+        current = index_type_of(db.index)
+        self.stdout.write(f"Index hiện tại: {current}, {db.index.ntotal} vector")
+
+        # Vector lấy lại từ index cũ nên không phải embed lại; IVF-PQ chỉ giữ bản xấp xỉ
+        if current == "ivf_pq" and options["type"] != "ivf_pq":
+            self.stderr.write("Cảnh báo: vector từ IVF-PQ là bản nén, nên dựng lại bằng embedding gốc nếu cần độ chính xác")
+        # Chỉ lấy vector còn nội dung trong docstore nên lệnh này cũng compact các tombstone của HNSW
+        in_index = None
+        if hasattr(db.index, "id_map"):
+            in_index = set(faiss.vector_to_array(db.index.id_map).tolist())
+        ids = [i for i in db.docstore.faiss_ids() if in_index is None or i in in_index]
+        vectors = vectors_for(db.index, ids)
+        try:
+            db.index = build_index(options["type"], vectors, ids=ids,
+                                   nlist=options["nlist"],
+                                   hnsw_m=options["hnsw_m"],
+                                   pq_m=options["pq_m"])
+        except (RuntimeError, ValueError) as e:
+            raise CommandError(f"Không dựng được index {options['type']}: {e}")
+
+        # Id FAISS giữ nguyên nên docstore không đổi
+        vector_db._save()
+        bump_index_version(namespace)
+        self.stdout.write(self.style.SUCCESS(f"Đã chuyển sang {options['type']} ({db.index.ntotal} vector)"))
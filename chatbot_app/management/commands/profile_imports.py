@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+TARGETS = {
+    # manage.py, celery worker, celery beat
+    "setup": "import django; django.setup()",
+    # worker uvicorn (chạy với CHATBOT_WARMUP=False để chỉ đo phần import)
+    "asgi": "import config.asgi",
+}
+
+
+def parse_importtime(stderr: str):
+    """[(module, độ sâu, self µs, cumulative µs, package cha trực tiếp)] từ output của python -X importtime."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Tên module thụt vào 2 dấu cách cho mỗi bậc import lồng nhau
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append([name.strip(), depth, int(self_us), int(cumulative_us), None])
+
+    # Module con được in trước module cha và thụt vào sâu hơn một bậc
+    pending = defaultdict(list)
+    for row in rows:
+        for child in pending.pop(row[1] + 1, []):
+            child[4] = row[0]
+        pending[row[1]].append(row)
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Chạy python -X importtime cho một process Django mới và cộng thời gian import (cumulative) theo từng app "
+        "của project và theo package bên ngoài, để tìm import nặng lúc khởi động"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", choices=list(TARGETS), default="setup")
+        parser.add_argument("--top", type=int, default=15, help="Số package bên ngoài nặng nhất được in ra")
+        parser.add_argument("--modules", type=int, default=0,
+                            help="In thêm N module của project có cumulative lớn nhất")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "CHATBOT_WARMUP": "False",
+               "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings")}
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", TARGETS[options["target"]]],
+                                 cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        rows = parse_importtime(process.stderr)
+        if process.returncode != 0 or not rows:
+            raise CommandError(f"Process lỗi\n{process.stderr[-2000:]}")
+
+        def package(module):
+            return module.split(".")[0]
+
+        def first_party(name):
+            return os.path.isdir(os.path.join(settings.BASE_DIR, name))
+
+        # Mỗi package chỉ tính ở các lần được import từ package khác, không cộng lặp module con
+        costs = defaultdict(int)
+        for module, depth, self_us, cumulative_us, parent in rows:
+            if parent is None or package(parent) != package(module):
+                costs[package(module)] += cumulative_us
+        total = sum(row[3] for row in rows if row[4] is None)
+
+        self.stdout.write(f"Tổng thời gian import ({options['target']}): {total / 1e6:.2f}s, {len(rows)} module")
+        self.stdout.write("Theo app (cumulative, gồm package bên ngoài mà app kéo theo):")
+        for name, cost in sorted(costs.items(), key=lambda item: -item[1]):
+            if first_party(name):
+                self.stdout.write(f"  {name:<28} {cost / 1e6:7.3f}s")
+
+        self.stdout.write("Package bên ngoài nặng nhất:")
+        external = [(name, cost) for name, cost in costs.items() if not first_party(name)]
+        for name, cost in sorted(external, key=lambda item: -item[1])[:options["top"]]:
+            self.stdout.write(f"  {name:<28} {cost / 1e6:7.3f}s")
+
+        if options["modules"]:
+            self.stdout.write("Module của project nặng nhất:")
+            modules = [row for row in rows if first_party(package(row[0]))]
+            for module, depth, self_us, cumulative_us, parent in sorted(modules, key=lambda row: -row[3])[:options["modules"]]:
+                self.stdout.write(f"  {module:<44} {cumulative_us / 1e6:7.3f}s  (import bởi {parent or '-'})")
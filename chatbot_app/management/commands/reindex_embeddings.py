@@ -0,0 +1,99 @@
+import os
+import time
+
+import faiss
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot_app.rag.embedding_provider import EMBEDDING_PROVIDERS, get_embedding
+from chatbot_app.rag.index_factory import INDEX_TYPES, build_index, index_type_of
+from chatbot_app.rag.index_registry import bump_index_version, index_namespace
+from chatbot_app.rag.vector_db import VectorDB, index_exists, vector_db_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Embed lại toàn bộ chunk trong docstore bằng provider khác (openai | onnx) rồi dựng lại FAISS index, "
+        "id FAISS và chunk giữ nguyên. Worker đang chạy với provider cũ giữ index đã nạp (không nạp được index mới) "
+        "cho tới khi đổi CHATBOT_EMBEDDING_PROVIDER và restart."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--provider", choices=EMBEDDING_PROVIDERS, required=True)
+        parser.add_argument("--organization", type=int, default=None,
+                            help="Id tổ chức, bỏ trống để dựng lại index chung")
+        parser.add_argument("--all", action="store_true", help="Dựng lại index chung và index của mọi tổ chức")
+        parser.add_argument("--type", choices=INDEX_TYPES, default=None,
+                            help="Loại index mới, mặc định giữ loại hiện tại")
+        parser.add_argument("--batch-size", type=int, default=500, help="Số chunk đọc từ docstore mỗi lần")
+
+    def _namespaces(self, options):
+        if not options["all"]:
+            namespace = index_namespace(options["organization"])
+            if namespace and not index_exists(namespace):
+                raise CommandError(f"Tổ chức {options['organization']} chưa có index")
+            return [namespace]
+        namespaces = [None] if index_exists(None) else []
+        if os.path.isdir(vector_db_path):
+            namespaces += sorted(name for name in os.listdir(vector_db_path)
+                                 if name.startswith("org_") and index_exists(name))
+        return namespaces
+
+    def _reindex(self, namespace, embedding, options):
+        label = namespace or "chung"
+        vector_db = VectorDB(embedding=embedding, writable=True, namespace=namespace, verify_embedding=False)
+        db = vector_db.db
+        current = vector_db.index_embedding_model()
+        if current == embedding.model:
+            self.stdout.write(f"Index {label} đã dùng {embedding.model}, bỏ qua")
+            return
+
+        # Chỉ embed chunk còn trong index và docstore: tombstone của HNSW được dọn luôn
+        in_index = None
+        if hasattr(db.index, "id_map"):
+            in_index = set(faiss.vector_to_array(db.index.id_map).tolist())
+        ids = [i for i in db.docstore.faiss_ids() if in_index is None or i in in_index]
+        self.stdout.write(f"Index {label}: {len(ids)} chunks, {current} -> {embedding.model}")
+
+        started = time.perf_counter()
+        parts = []
+        for i in range(0, len(ids), options["batch_size"]):
+            batch = ids[i:i + options["batch_size"]]
+            documents = db.docstore.documents_at(batch)
+            # Cùng đường embed với ingestion (batch, song song, rate limit của OpenAI)
+            parts.append(vector_db.embed_documents([documents[faiss_id] for faiss_id in batch]))
+            self.stdout.write(f"  {i + len(batch)}/{len(ids)} chunks, {time.perf_counter() - started:.1f}s")
+        vectors = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        if not len(vectors):
+            raise CommandError(f"Index {label} không có chunk nào để embed lại")
+
+        index_type = options["type"] or index_type_of(db.index)
+        try:
+            index = build_index(index_type, vectors, ids=ids,
+                                nlist=settings.CHATBOT_FAISS_NLIST or None,
+                                hnsw_m=settings.CHATBOT_FAISS_HNSW_M,
+                                pq_m=settings.CHATBOT_FAISS_PQ_M)
+        except (RuntimeError, ValueError) as e:
+            raise CommandError(f"Không dựng được index {index_type}: {e}")
+
+        # Ghi embedding.json trước index.faiss: worker nạp lại giữa chừng thấy provider lệch thì giữ bản cũ,
+        # không bao giờ tìm vector cũ bằng embedding mới
+        vector_db.write_embedding_info(vectors.shape[1])
+        db.index = index
+        vector_db._save()
+        bump_index_version(namespace)
+        self.stdout.write(self.style.SUCCESS(
+            f"Index {label}: {index_type}, {index.ntotal} vector {vectors.shape[1]} chiều "
+            f"({time.perf_counter() - started:.1f}s)"
+        ))
+
+    def handle(self, *args, **options):
+        embedding = get_embedding(options["provider"])
+        for namespace in self._namespaces(options):
+            self._reindex(namespace, embedding, options)
+
+        if options["provider"] != settings.CHATBOT_EMBEDDING_PROVIDER:
+            self.stdout.write(f"Đặt CHATBOT_EMBEDDING_PROVIDER={options['provider']} rồi restart worker và celery")
+        # Model intent_router học trên embedding nên phải huấn luyện lại với provider mới
+        self.stdout.write("Chạy lại manage.py train_intent_router để model phân loại intent dùng embedding mới")
@@ -0,0 +1,37 @@
+import asyncio
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Chạy Chatbot (FAISS, reranker, graph) trong một process duy nhất, phục vụ các worker web qua Unix socket. "
+        "Worker web dùng process này khi CHATBOT_INFERENCE_MODE=remote"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default=settings.CHATBOT_INFERENCE_SOCKET)
+        parser.add_argument("--metrics-port", type=int, default=None,
+                            help="Cổng HTTP xuất metrics Prometheus của process này (cache, intent, token...)")
+
+    def handle(self, *args, **options):
+        from prometheus_client import start_http_server
+
+        from chatbot_app.metrics import metrics_registry
+        from chatbot_app.rag.inference import InferenceServer
+
+        app_config = apps.get_app_config("chatbot_app")
+        chatbot = app_config.local_chatbot()
+        chatbot.warm_up()
+
+        # Metrics được ghi ở process này, không phải ở worker web nên /metrics/ của web không thấy
+        if options["metrics_port"]:
+            start_http_server(options["metrics_port"], registry=metrics_registry())
+            self.stdout.write(f"Metrics tại :{options['metrics_port']}/metrics")
+
+        try:
+            asyncio.run(InferenceServer(chatbot, options["socket"]).serve_forever())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,71 @@
+import os
+
+import joblib
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot_app.models import QAHistory
+from chatbot_app.rag.intent_router import embed_questions, intent_model_payload, normalize_intent, train_intent_model
+from chatbot_app.rag.embedding_provider import get_embedding
+from chatbot_app.rag.standardize import preprocess_texts
+
+
+class Command(BaseCommand):
+    help = (
+        "Huấn luyện model phân loại intent cục bộ từ QAHistory. Các view hỏi đáp ghi QAHistory cho người dùng "
+        "đã đăng nhập (trừ luồng SKTT) cùng intent_route. Chỉ dùng các dòng do gpt-4o gán nhãn (llm) hoặc đã sửa "
+        "tay (manual): dòng do chính router cục bộ dự đoán (local) hay lấy từ cache sẽ khiến model học lại lỗi "
+        "của nó. Sau khi kiểm tra một dòng trong bảng chatbot_qa_history, đặt intent_route='manual' để đưa vào"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-samples", type=int, default=20,
+                            help="Số câu hỏi tối thiểu của mỗi intent")
+        parser.add_argument("--holdout", type=float, default=0.2,
+                            help="Tỉ lệ dữ liệu giữ lại để đánh giá ngưỡng")
+        parser.add_argument("--output", default=settings.CHATBOT_INTENT_ROUTER_MODEL_PATH)
+
+    def handle(self, *args, **options):
+        labelled = QAHistory.objects.filter(
+            intent_route__in=[QAHistory.IntentRoute.LLM, QAHistory.IntentRoute.MANUAL]
+        )
+        rows = [(question, normalize_intent(intent))
+                for question, intent in labelled.values_list("question", "intent")]
+        rows = [(question, intent) for question, intent in rows if intent is not None and question and question.strip()]
+        # Router phân loại câu hỏi đã qua preprocess_text (Chatbot._build_state) nên huấn luyện trên cùng dạng đó
+        samples = {}
+        for question, (_, intent) in zip(preprocess_texts([question for question, _ in rows]), rows):
+            samples[question.strip()] = intent
+        questions, intents = list(samples.keys()), list(samples.values())
+
+        counts = {intent: intents.count(intent) for intent in set(intents)}
+        self.stdout.write(f"Dữ liệu: {counts}")
+        if len(counts) < 2 or min(counts.values()) < options["min_samples"]:
+            raise CommandError("Chưa đủ dữ liệu cho cả hai intent, router sẽ tiếp tục dùng LLM")
+
+        embedding = get_embedding()
+        order = np.random.RandomState(0).permutation(len(questions))
+        n_holdout = int(len(questions) * options["holdout"])
+        if n_holdout:
+            train_idx, test_idx = order[n_holdout:], order[:n_holdout]
+            model = train_intent_model(embedding,
+                                       [questions[i] for i in train_idx],
+                                       [intents[i] for i in train_idx])
+            probabilities = model.predict_proba(embed_questions(embedding, [questions[i] for i in test_idx]))
+            predicted = model.classes_[probabilities.argmax(axis=1)]
+            confidence = probabilities.max(axis=1)
+            expected = np.array([intents[i] for i in test_idx])
+            for threshold in (0.6, 0.7, 0.8, 0.9, 0.95):
+                local = confidence >= threshold
+                accuracy = (predicted[local] == expected[local]).mean() if local.any() else float("nan")
+                self.stdout.write(f"threshold={threshold:.2f} local={local.mean():.0%} "
+                                  f"llm_fallback={1 - local.mean():.0%} local_accuracy={accuracy:.3f}")
+
+        model = train_intent_model(embedding, questions, intents)
+        os.makedirs(os.path.dirname(options["output"]), exist_ok=True)
+        # Ghi file tạm rồi thay thế để worker không đọc phải model ghi dở
+        tmp_path = f"{options['output']}.tmp"
+        joblib.dump(intent_model_payload(embedding, model), tmp_path)
+        os.replace(tmp_path, options["output"])
+        self.stdout.write(self.style.SUCCESS(f"Đã lưu model vào {options['output']}"))
@@ -0,0 +1,111 @@
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+
+SEMANTIC_CACHE_REQUESTS = Counter(
+    'chatbot_semantic_cache_requests_total',
+    'Semantic answer cache lookups, by result (hit/miss).',
+    ['result'],
+)
+
+SEMANTIC_CACHE_SAVED_SECONDS = Counter(
+    'chatbot_semantic_cache_saved_seconds_total',
+    'Pipeline latency avoided by answering from the semantic cache.',
+)
+
+INTENT_ROUTE_REQUESTS = Counter(
+    'chatbot_intent_route_total',
+    'Intent classifications, by route (local model or llm fallback) and intent.',
+    ['route', 'intent'],
+)
+
+SINGLE_FLIGHT_REQUESTS = Counter(
+    'chatbot_single_flight_total',
+    'First-turn questions by single-flight role (leader runs the pipeline, follower reuses its answer, fallback runs after waiting).',
+    ['role'],
+)
+
+TENANT_INDEX_EVENTS = Counter(
+    'chatbot_tenant_index_events_total',
+    'Per-organization index pool events (hit, load on first use, evict to stay under the memory budget).',
+    ['event'],
+)
+
+PROMPT_TOKENS = Histogram(
+    'chatbot_prompt_tokens',
+    'Prompt tokens per answer, by part (template, input, answer_query, chat_history, context, total).',
+    ['part'],
+    buckets=(50, 100, 250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000),
+)
+
+
+REQUEST_SECONDS = Histogram(
+    'chatbot_request_seconds',
+    'End-to-end chatbot latency, by method (ask/aask/astream) and route (pipeline, semantic_cache, single_flight, error).',
+    ['method', 'route'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 12, 20, 30, 60),
+)
+
+STAGE_SECONDS = Histogram(
+    'chatbot_stage_seconds',
+    'Duration of one pipeline stage, by kind (node, llm, retriever, embedding, faiss, rerank, cache, ingestion) and name.',
+    ['kind', 'name'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30),
+)
+
+LLM_TOKENS = Histogram(
+    'chatbot_llm_tokens',
+    'Tokens reported by the API per LLM call, by model and type (prompt/completion).',
+    ['model', 'type'],
+    buckets=(10, 25, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000),
+)
+
+RETRIEVED_DOCUMENTS = Histogram(
+    'chatbot_retrieved_documents',
+    'Documents returned per retrieval step, by stage (retriever name, faiss candidates, rerank).',
+    ['stage'],
+    buckets=(0, 1, 2, 3, 4, 6, 8, 10, 15, 20, 30, 50),
+)
+
+CACHE_LOOKUPS = Counter(
+    'chatbot_cache_lookups_total',
+    'Embedding (per text) and rerank cache lookups, by cache and result (hit/miss).',
+    ['cache', 'result'],
+)
+
+def metrics_registry():
+    # Uvicorn chạy nhiều worker nên cần gộp số liệu qua PROMETHEUS_MULTIPROC_DIR
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def _metrics_allowed(request) -> bool:
+    token = settings.CHATBOT_METRICS_TOKEN
+    if token:
+        scheme, _, value = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(value.strip(), token):
+            return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_active and user.is_staff)
+
+
+def metrics_view(request):
+    # Metrics lộ lưu lượng, model và độ trễ của hệ thống nên không để công khai
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
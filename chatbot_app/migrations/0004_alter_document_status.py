@@ -0,0 +1,18 @@
+# Generated by Django 5.0.9 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot_app', '0003_remove_document_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('waiting', 'Waiting'), ('parsing', 'Parsing'), ('chunking', 'Chunking'), ('embedding', 'Embedding'), ('indexing', 'Indexing'), ('completed', 'Completed'), ('failed', 'Failed')], default='waiting', max_length=10),
+        ),
+    ]
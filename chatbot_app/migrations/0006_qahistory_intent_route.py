@@ -0,0 +1,18 @@
+# Generated by Django 5.0.9 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot_app', '0005_document_organization'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qahistory',
+            name='intent_route',
+            field=models.CharField(blank=True, choices=[('local', 'Local'), ('llm', 'LLM'), ('cached', 'Cached'), ('manual', 'Manual')], default='', max_length=10),
+        ),
+    ]
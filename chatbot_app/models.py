@@ -1,15 +1,29 @@
 from django.db import models
 from .utils import CustomStorage
 from django.contrib.auth import get_user_model
+from organizers.models import Organization
 
 User = get_user_model()
 
 class Document(models.Model):
     class Status(models.TextChoices):
         WAITING = ('waiting', 'Waiting')
+        # Các bước của ingestion (chatbot_app.tasks.ingest_document_task)
+        PARSING = ('parsing', 'Parsing')
+        CHUNKING = ('chunking', 'Chunking')
+        EMBEDDING = ('embedding', 'Embedding')
+        INDEXING = ('indexing', 'Indexing')
         COMPLETED = ('completed', 'Completed')
         FAILED = ('failed', 'Failed')
 
+    # Mỗi tổ chức có index riêng; Document cũ (null) nằm trong index chung
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='documents',
+        null=True,
+        blank=True,
+    )
     file_path = models.FileField(upload_to='documents/', storage=CustomStorage())
     file_name = models.CharField(max_length=255, null=False)
     uploaded_at = models.DateTimeField(auto_now_add=True, null=False)
@@ -32,10 +46,23 @@ class FAQ(models.Model):
         db_table = 'chatbot_faq'
 
 class QAHistory(models.Model):
+    class IntentRoute(models.TextChoices):
+        # Nguồn của intent: chỉ nhãn LLM và nhãn sửa tay được dùng để huấn luyện lại router
+        LOCAL = ('local', 'Local')
+        LLM = ('llm', 'LLM')
+        CACHED = ('cached', 'Cached')
+        MANUAL = ('manual', 'Manual')
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='qa_history')
     created_at = models.DateTimeField(auto_now_add=True)
     thread_id = models.CharField(max_length=36)
     intent = models.CharField(max_length=30)
+    intent_route = models.CharField(
+        max_length=10,
+        choices=IntentRoute.choices,
+        blank=True,
+        default='',
+    )
     question = models.TextField()
     answer = models.TextField()
 
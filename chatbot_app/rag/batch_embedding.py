@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import numpy as np
+import tiktoken
+from django.conf import settings
+
+
+class RateLimiter:
+    """
+    Giới hạn token/phút và request/phút gửi lên API embedding theo cửa sổ trượt 60 giây,
+    dùng chung cho mọi thread embed trong process ingestion.
+    """
+
+    def __init__(self, tokens_per_minute: int, requests_per_minute: int, window: float = 60.0):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.window = window
+        self._events = deque()
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._events and now - self._events[0][0] >= self.window:
+                    self._tokens -= self._events.popleft()[1]
+                # Một batch lớn hơn cả hạn mức vẫn được gửi khi cửa sổ trống, không thì chờ mãi
+                fits_tokens = not self._events or self._tokens + tokens <= self.tokens_per_minute
+                fits_requests = len(self._events) < self.requests_per_minute
+                if fits_tokens and fits_requests:
+                    self._events.append((now, tokens))
+                    self._tokens += tokens
+                    return
+                wait = self._events[0][0] + self.window - now
+            time.sleep(max(wait, 0.05))
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_embedding_rate_limiter() -> RateLimiter:
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(settings.CHATBOT_EMBEDDING_TPM, settings.CHATBOT_EMBEDDING_RPM)
+    return _limiter
+
+
+def embed_concurrently(embed_fn: Callable[[List[str]], List[List[float]]],
+                       texts: List[str],
+                       batch_size: int,
+                       concurrency: int,
+                       limiter: RateLimiter = None,
+                       rate_limited: bool = True) -> np.ndarray:
+    """
+    Embed theo batch lớn, nhiều batch chạy song song nhưng không vượt rate limit của provider.
+    rate_limited=False (model chạy cục bộ như ONNX) bỏ qua đếm token và hạn mức TPM/RPM của OpenAI.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    if rate_limited:
+        limiter = limiter or get_embedding_rate_limiter()
+        # text-embedding-3-* dùng cl100k_base
+        encoding = tiktoken.get_encoding("cl100k_base")
+
+    def embed_batch(batch: List[str]) -> np.ndarray:
+        if rate_limited:
+            limiter.acquire(sum(len(tokens) for tokens in encoding.encode_batch(batch)))
+        return np.asarray(embed_fn(batch), dtype=np.float32)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as pool:
+        return np.concatenate(list(pool.map(embed_batch, batches)))
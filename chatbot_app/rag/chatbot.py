@@ -1,103 +1,34 @@
+import threading
+import time
+import weakref
+from typing import Optional
+from django.conf import settings
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables.config import run_in_executor
 from langgraph.graph import START, StateGraph
-from langchain.chains import create_retrieval_chain
+from langgraph.types import StreamWriter
+from langgraph.utils.runnable import RunnableCallable
 from langchain_core.prompts import ChatPromptTemplate
 from .llm_model import get_openai_llm
-from .vector_db import VectorDB
+from .embedding_provider import get_embedding
+from .index_pool import get_index_pool
 from .contextual_retriever import ContextualRetriever
 from .qa_chain import QuestionAnsweringChain
 from .state_manager import StateManager
 from .intent_classifier import IntentClassifier
+from .intent_router import get_intent_router
 from .data_manager import DataManager
 from .standardize import preprocess_text
+from .checkpointer import get_checkpointer
+from .semantic_cache import SemanticCache
+from .single_flight import get_single_flight
+from .prompt_budget import HistorySummarizer, get_prompt_budgeter
+from .tracing import trace_request
 
-class Chatbot:
-    def __init__(self):
-        self.llm_4o = get_openai_llm()
-        self.llm_4o_mini = get_openai_llm(model_name="gpt-4o-mini")
-       
-        self.vector_db = VectorDB() 
-        self.retriever = self.vector_db.get_compressed_retriever(search_kwargs={"k": 6})
-        self.contextual_retriever = ContextualRetriever(self.llm_4o, self.retriever).get_history_aware_retriever()
-        self.db_manager = DataManager(self.llm_4o_mini)
-        self.qa_chain = QuestionAnsweringChain(self.llm_4o).create_qa_chain()
-        
-        self.rag_chain = create_retrieval_chain(self.contextual_retriever, self.qa_chain)
-        
-        self.intent_classifier = IntentClassifier(self.llm_4o)
-        
-        # Khởi tạo bộ nhớ
-        self.memory = MemorySaver()
-
-
-    def reset(self):
-        """Reset all components of the chatbot."""
-        self.llm_4o = get_openai_llm()
-        self.llm_4o_mini = get_openai_llm(model_name="gpt-4o-mini")
-        self.vector_db = VectorDB()
-        self.retriever = self.vector_db.get_compressed_retriever()
-        self.contextual_retriever = ContextualRetriever(self.llm_4o, self.retriever).get_history_aware_retriever()
-        self.db_manager = DataManager(self.llm_4o_mini)
-        self.qa_chain = QuestionAnsweringChain(self.llm_4o).create_qa_chain()
-        
-        # Rebuild retrieval-augmented generation (RAG) chain
-        self.rag_chain = create_retrieval_chain(self.contextual_retriever, self.qa_chain)
-        
-        self.intent_classifier = IntentClassifier(self.llm_4o)
-        # Re-initialize memory saver
-        self.memory = MemorySaver()
-
-
-    def classify_intent(self, state: StateManager):
-        question = state["input"]
-        
-        intent = self.intent_classifier.classify(question)
-        state["current_intent"] = intent
-        
-        return state
-
-    def call_model(self, state: StateManager):
-        question = state["input"]
-        current_intent = state.get("current_intent", "1")   
-        
-        is_sktt = state.get("is_sktt", False)
-        
-        if is_sktt:
-            response = self.call_sktt_model(state)
-            return response
-        else:
-            if current_intent == "0":
-                response = self.rag_chain.invoke(state)
-                
-                return {
-                    "chat_history": [
-                        HumanMessage(state["input"]),
-                        AIMessage(response["answer"]),
-                    ],
-                    "context": response["context"],
-                    "answer": response["answer"],
-                    "current_intent": current_intent,
-                }
-                
-            relevant_docs = self.retriever.invoke(question)
-            state["context"] = "\n".join([doc.page_content for doc in relevant_docs])
-
-            response = self.rag_chain.invoke(state)        
-            
-            return {
-                "chat_history": [
-                    HumanMessage(state["input"]),
-                    AIMessage(response["answer"]),
-                ],
-                "context": response["context"],
-                "answer": response["answer"],
-                "current_intent": current_intent,
-            }
+# intent_route của câu trả lời lấy từ semantic cache / single-flight: intent không do lượt này phân loại
+CACHED_ROUTE = "cached"
 
-    def call_sktt_model(self, state: StateManager):
-         
-        template = """
+sktt_template = """
         # DIRECTIVE
 Mục tiêu duy nhất của bạn là cung cấp các câu trả lời chính xác và hữu ích cho các câu hỏi của người dùng *chỉ* liên quan đến sức khỏe tinh thân người dùng. Bạn phải sử dụng thông tin ngữ cảnh được cung cấp bên dưới để tạo ra câu trả lời của mình.
 # PERSONA DEFINITION
@@ -122,8 +53,8 @@ Người dùng: Hãy phân tích kết quả bài đánh giá tâm lý của tô
 # RESPONSE
 Trợ lý:
 """.strip()
-        
-        state["context"] = """1. Mức độ nhẹ – vừa
+
+sktt_context = """1. Mức độ nhẹ – vừa
 Nội dung tư vấn: Kết quả rối loạn mức độ nhẹ hoặc vừa không đồng nghĩa với bệnh tâm thần mà là cảnh báo tình trạng cảm xúc bị ảnh hưởng. 
 -	Những việc nên làm:
 + Tập cường hoạt động thể chất: chọn môn thể thao yêu thích (đi bộ, đạp xe, yoga….), tập tối thiểu 5 ngày/tuần, mỗi lần tập 45-60 phút.
@@ -138,21 +69,178 @@ Nội dung tư vấn: Kết quả rối loạn mức độ nhẹ hoặc vừa kh
 Khuyến nghị: Theo dõi lại sau 2–4 tuần. Nếu triệu chứng không cải thiện, chuyển sang nhóm tư vấn sâu hoặc y tế chuyên khoa.
 2. Mức độ nặng – rất nặng
 - Cần liên hệ với Bác sĩ tâm thần hoặc chuyên gia tư vấn tâm lý để được tư vấn, điều trị kịp thời."""
+
+class Chatbot:
+    def __init__(self):
+        self.llm_4o = get_openai_llm()
+        self.llm_4o_mini = get_openai_llm(model_name="gpt-4o-mini")
+       
+        # Index của từng tổ chức được nạp dần vào pool khi có câu hỏi; không nạp sẵn index nào lúc khởi động
+        self.embedding = get_embedding()
+        self.indexes = get_index_pool()
+        self._retrievers = weakref.WeakKeyDictionary()
+        self._retrievers_lock = threading.Lock()
+        self.db_manager = DataManager(self.llm_4o_mini)
+        self.budgeter = get_prompt_budgeter()
+        self.history_summarizer = HistorySummarizer(self.llm_4o_mini, self.budgeter)
+        self.qa_chain = QuestionAnsweringChain(self.llm_4o, budgeter=self.budgeter).create_qa_chain()
+        
+        self.intent_classifier = IntentClassifier(self.llm_4o)
+        self.intent_router = get_intent_router(self.embedding, self.intent_classifier)
+        
+        # Khởi tạo bộ nhớ (Redis, dùng chung giữa các worker)
+        self.memory = get_checkpointer()
+
+        self.semantic_cache = SemanticCache(self.embedding,
+                                            threshold=settings.CHATBOT_SEMANTIC_CACHE_THRESHOLD,
+                                            ttl=settings.CHATBOT_SEMANTIC_CACHE_TTL,
+                                            max_entries=settings.CHATBOT_SEMANTIC_CACHE_MAX_ENTRIES)
+        self.single_flight = get_single_flight()
+
+
+    def warm_up(self):
+        """Nạp trước các phần được import/nạp lười (model tách từ pyvi) để câu hỏi đầu tiên không phải chờ."""
+        preprocess_text("xin chào")
+
+    def reset(self):
+        """Reset all components of the chatbot."""
+        self.llm_4o = get_openai_llm()
+        self.llm_4o_mini = get_openai_llm(model_name="gpt-4o-mini")
+        self.embedding = get_embedding()
+        self.indexes = get_index_pool()
+        self._retrievers = weakref.WeakKeyDictionary()
+        self.db_manager = DataManager(self.llm_4o_mini)
+        self.budgeter = get_prompt_budgeter()
+        self.history_summarizer = HistorySummarizer(self.llm_4o_mini, self.budgeter)
+        self.qa_chain = QuestionAnsweringChain(self.llm_4o, budgeter=self.budgeter).create_qa_chain()
+        
+        self.intent_classifier = IntentClassifier(self.llm_4o)
+        self.intent_router = get_intent_router(self.embedding, self.intent_classifier)
+        # Bộ nhớ hội thoại nằm trên Redis nên được giữ nguyên khi reset
+
+    def reload_index(self, namespace: Optional[str] = None):
+        """Nạp lại FAISS index ở background, giữ nguyên LLM, chain và bộ nhớ hội thoại."""
+        vector_db = self.indexes.peek(namespace)
+        # Index chưa nạp trong worker này sẽ được đọc bản mới khi có câu hỏi đầu tiên
+        return vector_db.reload() if vector_db is not None else None
+
+    def _contextual_retriever(self, namespace: Optional[str]):
+        """Retriever (viết lại câu hỏi + tìm kiếm + rerank) trên index của tổ chức, None nếu tổ chức chưa có tài liệu."""
+        vector_db = self.indexes.get(namespace)
+        if vector_db is None:
+            return None
+        with self._retrievers_lock:
+            # Gắn với VectorDB trong pool, bị bỏ cùng lúc khi index bị evict
+            retriever = self._retrievers.get(vector_db)
+            if retriever is None:
+                retriever = ContextualRetriever(
+                    self.llm_4o, vector_db.get_compressed_retriever(search_kwargs={"k": 6})
+                ).get_history_aware_retriever()
+                self._retrievers[vector_db] = retriever
+            return retriever
+
+    def classify_intent(self, state: StateManager):
+        question = state["input"]
+
+        # Luồng SKTT luôn là tư vấn tâm lý, câu hỏi rỗng thì không cần hỏi LLM
+        if state.get("is_sktt", False) or not question:
+            return {"current_intent": "1", "intent_route": ""}
+        
+        # Model cục bộ trước, chỉ gọi gpt-4o khi độ tin cậy thấp
+        intent, route = self.intent_router.classify(question)
+        
+        return {"current_intent": intent, "intent_route": route}
+
+    async def aclassify_intent(self, state: StateManager):
+        question = state["input"]
+
+        if state.get("is_sktt", False) or not question:
+            return {"current_intent": "1", "intent_route": ""}
+
+        intent, route = await self.intent_router.aclassify(question)
+        return {"current_intent": intent, "intent_route": route}
+
+    def retrieve(self, state: StateManager, writer: StreamWriter):
+        """Viết lại câu hỏi theo lịch sử và truy xuất tài liệu, chạy song song với phân loại intent."""
+        # Luồng SKTT dùng ngữ cảnh cố định nên bỏ qua truy xuất
+        if state.get("is_sktt", False) or not state["input"]:
+            return {"context": []}
+
+        # Chỉ tìm trong index của tổ chức người hỏi
+        retriever = self._contextual_retriever(state.get("namespace"))
+        if retriever is None:
+            return {"context": []}
+        context = retriever.invoke(state)
+        writer(self._documents_event(context))
+        return {"context": context}
+
+    async def aretrieve(self, state: StateManager, writer: StreamWriter):
+        if state.get("is_sktt", False) or not state["input"]:
+            return {"context": []}
+
+        # Lần đầu gặp tổ chức thì phải đọc index từ đĩa, không chạy trên event loop
+        retriever = await run_in_executor(None, self._contextual_retriever, state.get("namespace"))
+        if retriever is None:
+            return {"context": []}
+        context = await retriever.ainvoke(state)
+        writer(self._documents_event(context))
+        return {"context": context}
+
+    def summarize_history(self, state: StateManager):
+        """Tóm tắt các lượt vừa rời khỏi cửa sổ lịch sử, chạy song song với truy xuất."""
+        pending = self.history_summarizer.pending(state.get("chat_history", []), state.get("history_summary_upto"))
+        if not pending:
+            return {}
+        summary = self.history_summarizer.summarize(state.get("history_summary", ""), pending)
+        return {"history_summary": summary, "history_summary_upto": pending[-1].id}
+
+    async def asummarize_history(self, state: StateManager):
+        pending = self.history_summarizer.pending(state.get("chat_history", []), state.get("history_summary_upto"))
+        if not pending:
+            return {}
+        summary = await self.history_summarizer.asummarize(state.get("history_summary", ""), pending)
+        return {"history_summary": summary, "history_summary_upto": pending[-1].id}
+
+    def _model_response(self, state: StateManager, answer: str):
+        return {
+            "chat_history": [
+                HumanMessage(state["input"]),
+                AIMessage(answer),
+            ],
+            "context": state["context"],
+            "answer": answer,
+            "current_intent": state.get("current_intent", "1"),
+        }
+
+    def call_model(self, state: StateManager, writer: StreamWriter):
+        # writer chỉ dùng ở acall_model nhưng RunnableCallable đọc tham số từ bản sync
+        if state.get("is_sktt", False):
+            return self.call_sktt_model(state)
+
+        # context và answer_query đã có sẵn từ các nhánh chạy song song
+        answer = self.qa_chain.invoke(state)
+        return self._model_response(state, answer)
+
+    def _build_sktt_prompt(self, state: StateManager):
+        state["context"] = sktt_context
         prompt = ChatPromptTemplate.from_messages([
-            ("system", template),
+            ("system", sktt_template),
         ])
+        answer_query = str(state["result"])
+        packed = self.budgeter.pack(sktt_template,
+                                    input="",
+                                    answer_query=answer_query,
+                                    documents=sktt_context,
+                                    messages=state.get("chat_history", []),
+                                    summary=state.get("history_summary", ""))
         
-        prompt = prompt.format(
-            chat_history=state["chat_history"],
-            context=state["context"],
-            answer_query=state["result"]
+        return prompt.format(
+            chat_history=packed.chat_history,
+            context=packed.context,
+            answer_query=answer_query
         )
-        
-        response = self.llm_4o.invoke(prompt)
-
-# Lấy nội dung câu trả lời từ đối tượng AIMessage
-        ai_answer_content = response.content
 
+    def _sktt_response(self, state: StateManager, ai_answer_content: str):
         # Lấy lịch sử trò chuyện cũ từ state
         previous_chat_history = state.get("chat_history", [])
 
@@ -162,52 +250,280 @@ Khuyến nghị: Theo dõi lại sau 2–4 tuần. Nếu triệu chứng không
             AIMessage(content=ai_answer_content),
         ]
 
-        print(state)
         # Trả về state đã được cập nhật
         return {
             "chat_history": new_chat_history,
             "context": state["context"],  # Lấy lại context từ state, không phải từ response
             "answer": ai_answer_content  # Trả về nội dung câu trả lời
         }
-        
+
+    def call_sktt_model(self, state: StateManager):
+        prompt = self._build_sktt_prompt(state)
+        response = self.llm_4o.invoke(prompt)
+
+        # Lấy nội dung câu trả lời từ đối tượng AIMessage
+        return self._sktt_response(state, response.content)
+
+    async def acall_model(self, state: StateManager, writer: StreamWriter):
+        """Async counterpart of call_model used by astream: streams answer tokens through the writer."""
+        if state.get("is_sktt", False):
+            prompt = self._build_sktt_prompt(state)
+            answer = ""
+            async for chunk in self.llm_4o.astream(prompt):
+                answer += chunk.content
+                writer({"event": "token", "data": chunk.content})
+            return self._sktt_response(state, answer)
+
+        answer = ""
+        async for token in self.qa_chain.astream(state):
+            answer += token
+            writer({"event": "token", "data": token})
+
+        return self._model_response(state, answer)
+
+    @staticmethod
+    def _documents_event(docs):
+        return {
+            "event": "documents",
+            "data": [
+                {"source": doc.metadata.get("source"), "page": doc.metadata.get("page")}
+                for doc in docs
+            ],
+        }
 
     def setup_workflow(self):
         self.workflow = StateGraph(state_schema=StateManager)
 
-        self.workflow.add_sequence([
-            self.db_manager.get_data, 
-            self.db_manager.generate_answer
-        ])
-
-        self.workflow.add_node("classify_intent", self.classify_intent)
-        self.workflow.add_node("model", self.call_model)  
+        # Phân loại intent, truy xuất tài liệu, tóm tắt kết quả khảo sát và tóm tắt lịch sử chat độc lập
+        # với nhau nên chạy song song; model chờ tất cả các nhánh rồi mới sinh câu trả lời
+        self.workflow.add_node("classify_intent", RunnableCallable(self.classify_intent, self.aclassify_intent))
+        self.workflow.add_node("retrieve", RunnableCallable(self.retrieve, self.aretrieve))
+        self.workflow.add_node("get_data", self.db_manager.get_data)
+        self.workflow.add_node("generate_answer", RunnableCallable(self.db_manager.generate_answer,
+                                                                   self.db_manager.agenerate_answer))
+        self.workflow.add_node("summarize_history", RunnableCallable(self.summarize_history, self.asummarize_history))
+        self.workflow.add_node("model", RunnableCallable(self.call_model, self.acall_model))  
 
         self.workflow.add_edge(START, "classify_intent")
+        self.workflow.add_edge(START, "retrieve")
+        self.workflow.add_edge(START, "generate_answer")
+        self.workflow.add_edge(START, "summarize_history")
         self.workflow.add_edge("classify_intent", "get_data")
-        self.workflow.add_edge("get_data", "generate_answer")
-        self.workflow.add_edge("generate_answer", "model")  
+        self.workflow.add_edge(["get_data", "retrieve", "generate_answer", "summarize_history"], "model")
 
         self.app = self.workflow.compile(checkpointer=self.memory)
         return self.app
 
-    def ask(self, question: str, config: dict, user_id: int, is_sktt:bool = False, result: dict = None):
-        
+    def _build_state(self, question: str, user_id: int, is_sktt: bool = False, result: dict = None,
+                     namespace: Optional[str] = None):
         clean_question = preprocess_text(question)
         
-        state = {
+        return {
             "input": clean_question,
             "context": "",
             "result_query": "" ,
             "answer_query": "",
             "answer": "",
             "current_intent": "",
+            # Reset mỗi lượt để không mang nguồn intent của lượt trước (checkpointer giữ state của thread)
+            "intent_route": "",
             "is_sktt": is_sktt,
             "user_id": user_id,
             "result": result,
+            "namespace": namespace,
         }
-        print("is_sktt:", state["is_sktt"])
-        
-        result = self.app.invoke(state, config=config)
 
-        return result["current_intent"], result["answer"]
-  
\ No newline at end of file
+    def _is_first_turn(self, state: StateManager, config: dict) -> bool:
+        """Câu hỏi đầu tiên của thread, không thuộc luồng SKTT (chưa có lịch sử hội thoại riêng)."""
+        if state["is_sktt"]:
+            return False
+        return not self.app.get_state(config).values.get("chat_history")
+
+    def _record_answer(self, state: StateManager, config: dict, intent: str, answer: str):
+        # Ghi lượt hỏi đáp vào bộ nhớ để các lượt sau vẫn có lịch sử
+        self.app.update_state(config, {
+            "chat_history": [HumanMessage(state["input"]), AIMessage(answer)],
+            "input": state["input"],
+            "answer": answer,
+            "current_intent": intent,
+        }, as_node="model")
+
+    @staticmethod
+    def _is_personalized(state: StateManager) -> bool:
+        """Request kèm kết quả khảo sát của người hỏi (result -> answer_query nằm trong prompt tư vấn)."""
+        return bool(state.get("result"))
+
+    def _lookup_cache(self, state: StateManager, config: dict, first_turn: bool):
+        """
+        Tra semantic cache cho câu hỏi đầu tiên của thread.
+        Trả về (vector, hit); vector là None nếu câu hỏi không được phép cache.
+        """
+        if not settings.CHATBOT_SEMANTIC_CACHE_ENABLED or not first_turn:
+            return None, None
+        # Câu trả lời dựng từ kết quả khảo sát riêng của một người không được tra hay lưu vào cache chung
+        if self._is_personalized(state):
+            return None, None
+
+        vector = self.semantic_cache.embed(state["input"])
+        hit = self.semantic_cache.lookup(vector, namespace=state.get("namespace"))
+        if hit:
+            self._record_answer(state, config, hit.intent, hit.answer)
+        return vector, hit
+
+    def _begin_flight(self, state: StateManager, first_turn: bool):
+        """Tham gia single-flight cho câu hỏi đầu tiên, None nếu tắt hoặc không phải lượt đầu."""
+        if not settings.CHATBOT_SINGLE_FLIGHT_ENABLED or not first_turn:
+            return None
+        # Flight chỉ khóa theo câu hỏi: câu trả lời có kết quả khảo sát của người dẫn không được chia sẻ
+        if self._is_personalized(state):
+            return None
+        return self.single_flight.begin(state["input"], namespace=state.get("namespace"))
+
+    def _use_shared(self, state: StateManager, config: dict, cache_vector, shared):
+        self._record_answer(state, config, shared.intent, shared.answer)
+        self._store_cache(state, cache_vector, shared.intent, shared.answer, shared.elapsed)
+
+    @staticmethod
+    def _publish(flight, intent: str, answer: str, elapsed: float):
+        # Giống semantic cache: chỉ chia sẻ câu trả lời tư vấn (HTGD), TTND phụ thuộc người hỏi
+        if flight is not None and intent == "1" and answer:
+            flight.publish(intent, answer, elapsed)
+
+    def _store_cache(self, state: StateManager, vector, intent: str, answer: str, elapsed: float):
+        # Chỉ cache câu trả lời tư vấn (HTGD), không cache thông tin cá nhân (TTND, kết quả khảo sát)
+        if vector is not None and intent == "1" and answer and not self._is_personalized(state):
+            self.semantic_cache.store(vector, intent, answer, elapsed, namespace=state.get("namespace"))
+
+    def ask(self, question: str, config: dict, user_id: int, is_sktt:bool = False, result: dict = None,
+            namespace: Optional[str] = None):
+        """
+        Trả về (intent, answer, intent_route); intent_route cho biết intent do model cục bộ ("local"),
+        gpt-4o ("llm") phân loại hay lấy lại từ câu trả lời đã có (CACHED_ROUTE).
+        """
+        state = self._build_state(question, user_id, is_sktt=is_sktt, result=result, namespace=namespace)
+
+        # Mỗi câu hỏi một tracer: thời gian từng node/LLM/retriever, token, cache -> Prometheus và một dòng log
+        with trace_request("ask", config, is_sktt=is_sktt, namespace=namespace) as tracer:
+            config = tracer.config(config)
+            first_turn = self._is_first_turn(state, config)
+            with tracer.stage("cache", "semantic_lookup"):
+                cache_vector, hit = self._lookup_cache(state, config, first_turn)
+            if hit:
+                tracer.route = "semantic_cache"
+                return hit.intent, hit.answer, CACHED_ROUTE
+
+            # Nhiều người hỏi cùng một câu cùng lúc: chỉ một request chạy pipeline, các request khác chờ kết quả
+            flight = self._begin_flight(state, first_turn)
+            try:
+                with tracer.stage("cache", "single_flight_wait"):
+                    shared = flight.wait() if flight else None
+                if shared:
+                    tracer.route = "single_flight"
+                    self._use_shared(state, config, cache_vector, shared)
+                    return shared.intent, shared.answer, CACHED_ROUTE
+
+                started = time.perf_counter()
+                result = self.app.invoke(state, config=config)
+                elapsed = time.perf_counter() - started
+                self._store_cache(state, cache_vector, result["current_intent"], result["answer"], elapsed)
+                self._publish(flight, result["current_intent"], result["answer"], elapsed)
+            finally:
+                if flight:
+                    flight.close()
+
+            tracer.fields["intent"] = result["current_intent"]
+            return result["current_intent"], result["answer"], result.get("intent_route", "")
+
+    async def aask(self, question: str, config: dict, user_id: int, is_sktt: bool = False, result: dict = None,
+                   namespace: Optional[str] = None):
+        """
+        Bản async của ask cho view async: các node gọi LLM bằng ainvoke nên request chờ OpenAI
+        không giữ thread nào; phần sync (Redis, embed, FAISS) chạy ngắn trong executor.
+        """
+        state = self._build_state(question, user_id, is_sktt=is_sktt, result=result, namespace=namespace)
+
+        with trace_request("aask", config, is_sktt=is_sktt, namespace=namespace) as tracer:
+            config = tracer.config(config)
+            first_turn = await run_in_executor(None, self._is_first_turn, state, config)
+            with tracer.stage("cache", "semantic_lookup"):
+                cache_vector, hit = await run_in_executor(None, self._lookup_cache, state, config, first_turn)
+            if hit:
+                tracer.route = "semantic_cache"
+                return hit.intent, hit.answer, CACHED_ROUTE
+
+            flight = await run_in_executor(None, self._begin_flight, state, first_turn)
+            try:
+                with tracer.stage("cache", "single_flight_wait"):
+                    shared = await flight.await_result() if flight else None
+                if shared:
+                    tracer.route = "single_flight"
+                    await run_in_executor(None, self._use_shared, state, config, cache_vector, shared)
+                    return shared.intent, shared.answer, CACHED_ROUTE
+
+                started = time.perf_counter()
+                result = await self.app.ainvoke(state, config=config)
+                elapsed = time.perf_counter() - started
+                self._store_cache(state, cache_vector, result["current_intent"], result["answer"], elapsed)
+                if flight:
+                    await run_in_executor(None, self._publish, flight, result["current_intent"], result["answer"], elapsed)
+            finally:
+                if flight:
+                    await run_in_executor(None, flight.close)
+
+            tracer.fields["intent"] = result["current_intent"]
+            return result["current_intent"], result["answer"], result.get("intent_route", "")
+
+    async def astream(self, question: str, config: dict, user_id: int, is_sktt: bool = False, result: dict = None,
+                      namespace: Optional[str] = None):
+        """
+        Stream the pipeline as (event, data) tuples: intent, documents, token and a final done event.
+        `namespace` selects the caller's organization index (index_registry.index_namespace).
+        """
+        state = self._build_state(question, user_id, is_sktt=is_sktt, result=result, namespace=namespace)
+        current_intent = ""
+        intent_route = ""
+
+        with trace_request("astream", config, is_sktt=is_sktt, namespace=namespace) as tracer:
+            config = tracer.config(config)
+            first_turn = await run_in_executor(None, self._is_first_turn, state, config)
+            with tracer.stage("cache", "semantic_lookup"):
+                cache_vector, hit = await run_in_executor(None, self._lookup_cache, state, config, first_turn)
+            if hit:
+                tracer.route = "semantic_cache"
+                yield "intent", {"intent": hit.intent}
+                yield "token", hit.answer
+                yield "done", {"intent": hit.intent, "answer": hit.answer, "intent_route": CACHED_ROUTE}
+                return
+
+            flight = await run_in_executor(None, self._begin_flight, state, first_turn)
+            try:
+                with tracer.stage("cache", "single_flight_wait"):
+                    shared = await flight.await_result() if flight else None
+                if shared:
+                    tracer.route = "single_flight"
+                    await run_in_executor(None, self._use_shared, state, config, cache_vector, shared)
+                    yield "intent", {"intent": shared.intent}
+                    yield "token", shared.answer
+                    yield "done", {"intent": shared.intent, "answer": shared.answer, "intent_route": CACHED_ROUTE}
+                    return
+
+                started = time.perf_counter()
+                async for mode, chunk in self.app.astream(state, config=config, stream_mode=["updates", "custom"]):
+                    if mode == "custom":
+                        yield chunk["event"], chunk["data"]
+                    elif "classify_intent" in chunk:
+                        current_intent = chunk["classify_intent"]["current_intent"]
+                        intent_route = chunk["classify_intent"].get("intent_route", "")
+                        tracer.fields["intent"] = current_intent
+                        yield "intent", {"intent": current_intent}
+                    elif "model" in chunk:
+                        current_intent = chunk["model"].get("current_intent", current_intent)
+                        answer = chunk["model"]["answer"]
+                        elapsed = time.perf_counter() - started
+                        self._store_cache(state, cache_vector, current_intent, answer, elapsed)
+                        if flight:
+                            await run_in_executor(None, self._publish, flight, current_intent, answer, elapsed)
+                        yield "done", {"intent": current_intent, "answer": answer, "intent_route": intent_route}
+            finally:
+                if flight:
+                    await run_in_executor(None, flight.close)
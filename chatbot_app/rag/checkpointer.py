@@ -0,0 +1,272 @@
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+import msgpack
+import redis
+from django.conf import settings
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import run_in_executor
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.constants import TASKS
+
+# Payload lớn hơn ngưỡng này sẽ được nén zlib trước khi ghi vào Redis
+COMPRESS_THRESHOLD = 1024
+
+
+class RedisSaver(BaseCheckpointSaver):
+    """
+    Checkpointer lưu trạng thái hội thoại trên Redis để mọi worker dùng chung.
+
+    Mỗi thread chỉ giữ checkpoint mới nhất và checkpoint cha của nó, mọi key đều có TTL
+    được gia hạn sau mỗi lượt hỏi, và lịch sử chat bị cắt còn `max_messages` tin nhắn.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: int, max_messages: int,
+                 messages_key: str = "chat_history", prefix: str = "chatbot:checkpoint"):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.messages_key = messages_key
+        self.prefix = prefix
+
+    def _checkpoints_key(self, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{self.prefix}:{thread_id}:{checkpoint_ns}"
+
+    def _writes_key(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> str:
+        return f"{self.prefix}:{thread_id}:{checkpoint_ns}:writes:{checkpoint_id}"
+
+    def _dumps(self, obj: Any) -> Tuple[str, bytes, bool]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) > COMPRESS_THRESHOLD:
+            return type_, zlib.compress(data), True
+        return type_, data, False
+
+    def _loads(self, packed) -> Any:
+        type_, data, compressed = packed
+        if compressed:
+            data = zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    def _trim_messages(self, checkpoint: Checkpoint) -> Checkpoint:
+        channel_values = checkpoint.get("channel_values", {})
+        messages = channel_values.get(self.messages_key)
+        if self.max_messages and messages and len(messages) > self.max_messages:
+            checkpoint["channel_values"] = {
+                **channel_values,
+                self.messages_key: list(messages)[-self.max_messages:],
+            }
+        return checkpoint
+
+    def _pending_sends(self, thread_id: str, checkpoint_ns: str, parent_checkpoint_id: Optional[str]):
+        if not parent_checkpoint_id:
+            return []
+        writes = self._load_writes(thread_id, checkpoint_ns, parent_checkpoint_id)
+        return [value for _, channel, value in writes if channel == TASKS]
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str):
+        raw = self.client.hgetall(self._writes_key(thread_id, checkpoint_ns, checkpoint_id))
+        entries = []
+        for field, value in raw.items():
+            task_id, idx = field.decode().rsplit(":", 1)
+            _, channel, packed_value = msgpack.unpackb(value)
+            entries.append((task_id, int(idx), channel, packed_value))
+        entries.sort(key=lambda e: (e[0], e[1]))
+        return [(task_id, channel, self._loads(value)) for task_id, _, channel, value in entries]
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, raw: bytes) -> CheckpointTuple:
+        packed_checkpoint, packed_metadata, parent_checkpoint_id = msgpack.unpackb(raw)
+        checkpoint = self._loads(packed_checkpoint)
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "pending_sends": self._pending_sends(thread_id, checkpoint_ns, parent_checkpoint_id),
+            },
+            metadata=self._loads(packed_metadata),
+            pending_writes=self._load_writes(thread_id, checkpoint_ns, checkpoint_id),
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": parent_checkpoint_id,
+                }
+            }
+            if parent_checkpoint_id
+            else None,
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        key = self._checkpoints_key(thread_id, checkpoint_ns)
+
+        checkpoint_id = get_checkpoint_id(config)
+        if not checkpoint_id:
+            checkpoint_ids = self.client.hkeys(key)
+            if not checkpoint_ids:
+                return None
+            checkpoint_id = max(checkpoint_ids).decode()
+
+        raw = self.client.hget(key, checkpoint_id)
+        if raw is None:
+            return None
+        return self._to_tuple(thread_id, checkpoint_ns, checkpoint_id, raw)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        # Chỉ hỗ trợ liệt kê theo thread, không quét toàn bộ keyspace của Redis
+        if not config:
+            return
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        config_checkpoint_id = get_checkpoint_id(config)
+        before_checkpoint_id = get_checkpoint_id(before) if before else None
+
+        stored = self.client.hgetall(self._checkpoints_key(thread_id, checkpoint_ns))
+        for checkpoint_id, raw in sorted(stored.items(), reverse=True):
+            checkpoint_id = checkpoint_id.decode()
+            if config_checkpoint_id and checkpoint_id != config_checkpoint_id:
+                continue
+            if before_checkpoint_id and checkpoint_id >= before_checkpoint_id:
+                continue
+            checkpoint_tuple = self._to_tuple(thread_id, checkpoint_ns, checkpoint_id, raw)
+            if filter and not all(
+                checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()
+            ):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)
+        c = self._trim_messages(c)
+
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        key = self._checkpoints_key(thread_id, checkpoint_ns)
+
+        # Chỉ giữ checkpoint mới và checkpoint cha, các bản cũ hơn bị xóa
+        stale_ids = [
+            checkpoint_id for checkpoint_id in self.client.hkeys(key)
+            if checkpoint_id.decode() not in (checkpoint["id"], parent_checkpoint_id)
+        ]
+
+        pipe = self.client.pipeline()
+        pipe.hset(key, checkpoint["id"], msgpack.packb(
+            [self._dumps(c), self._dumps(metadata), parent_checkpoint_id]
+        ))
+        if stale_ids:
+            pipe.hdel(key, *stale_ids)
+            pipe.delete(*[
+                self._writes_key(thread_id, checkpoint_ns, checkpoint_id.decode())
+                for checkpoint_id in stale_ids
+            ])
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        key = self._writes_key(thread_id, checkpoint_ns, checkpoint_id)
+
+        pipe = self.client.pipeline()
+        for idx, (channel, value) in enumerate(writes):
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            field = f"{task_id}:{write_idx}"
+            packed = msgpack.packb([task_path, channel, self._dumps(value)])
+            # Ghi đặc biệt (error, interrupt...) không ghi đè bản đã có, giống MemorySaver
+            if write_idx >= 0:
+                pipe.hsetnx(key, field, packed)
+            else:
+                pipe.hset(key, field, packed)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await run_in_executor(None, self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await run_in_executor(
+            None, lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await run_in_executor(None, self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await run_in_executor(None, self.put_writes, config, writes, task_id, task_path)
+
+
+def get_checkpointer():
+    client = redis.Redis.from_url(settings.CHATBOT_CHECKPOINT_REDIS_URL)
+    return RedisSaver(client,
+                      ttl=settings.CHATBOT_CHECKPOINT_TTL,
+                      max_messages=settings.CHATBOT_CHECKPOINT_MAX_MESSAGES)
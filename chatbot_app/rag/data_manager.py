@@ -1,7 +1,11 @@
 
+import logging
+
 from .state_manager import StateManager
 from core.fetchers import CustomerPsychologyFetcher, CustomerFetcher
 
+logger = logging.getLogger(__name__)
+
 
 class DataManager:
     def __init__(self, llm):
@@ -19,25 +23,49 @@ class DataManager:
             return {"result_query": result_query}
         
         
-    def generate_answer(self, state: StateManager):
-        """Answer question using retrieved information as context and store the result in state."""
+    @staticmethod
+    def _summary_prompt(state: StateManager):
         input_question = state.get("input")
         data_result = state.get("result")
 
-        prompt = (
+        # Không có kết quả khảo sát thì không cần gọi LLM để tóm tắt
+        if not data_result:
+            return None
+
+        return (
             "Given the following user question"
             "and json data result, summarize the data result in a concise way"
             "Note: If question relates to student score, keep the name of fields as is.\n\n"
             f'User Question: {input_question}\n'
             f'Data result: {data_result}\n'
         )
+
+    def generate_answer(self, state: StateManager):
+        """Answer question using retrieved information as context and store the result in state."""
+        prompt = self._summary_prompt(state)
+        if prompt is None:
+            return {"answer_query": ""}
         
         try:
             response = self.llm.invoke(prompt)
             answer = response.content
-            print("[D]answer:", answer)
+            # Thời gian và token của lần gọi LLM này nằm trong dòng log chatbot_request (tracing)
+            logger.debug(f'generate_answer answer_query={len(answer)} chars')
             return {"answer_query": answer}
         except Exception as e:
             error_msg = f"Error generating answer: {str(e)}"
             state["answer_query"] = error_msg
             return {"answer_query": error_msg}
+
+    async def agenerate_answer(self, state: StateManager):
+        prompt = self._summary_prompt(state)
+        if prompt is None:
+            return {"answer_query": ""}
+
+        try:
+            response = await self.llm.ainvoke(prompt)
+            answer = response.content
+            logger.debug(f'generate_answer answer_query={len(answer)} chars')
+            return {"answer_query": answer}
+        except Exception as e:
+            return {"answer_query": f"Error generating answer: {str(e)}"}
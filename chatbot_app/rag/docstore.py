@@ -0,0 +1,231 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+
+class SQLiteDocstore(Docstore):
+    """
+    Docstore trên SQLite thay cho index.pkl.
+
+    Mỗi dòng là một chunk, khóa bằng id của vector trong FAISS (`faiss_id`, không bao giờ dùng lại)
+    và gắn với Document đã upload nó. Nội dung và metadata chỉ được đọc khi cần (top-k và các
+    chunk lân cận), không nằm trong heap của worker. Dòng bị xóa đóng vai trò tombstone cho các
+    vector còn trong index (HNSW, hoặc snapshot cũ của worker khác) cho tới khi compact.
+    Bản read-only dùng cho worker phục vụ request, bản ghi chỉ dùng khi thêm/xóa tài liệu:
+    các thay đổi chỉ hiện ra cho worker khác sau commit().
+    """
+
+    def __init__(self, path: str, read_only: bool = True):
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False, timeout=30)
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            create_schema(self._conn)
+            self._conn.commit()
+
+    @staticmethod
+    def _to_document(doc_id: str, page_content: str, metadata: str) -> Document:
+        return Document(id=doc_id, page_content=page_content, metadata=json.loads(metadata))
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def search(self, search: str) -> Union[str, Document]:
+        rows = self._query("SELECT doc_id, page_content, metadata FROM chunks WHERE doc_id = ?", (search,))
+        if not rows:
+            return f"ID {search} not found."
+        return self._to_document(*rows[0])
+
+    def doc_id_of(self, faiss_id: int) -> Optional[str]:
+        rows = self._query("SELECT doc_id FROM chunks WHERE faiss_id = ?", (faiss_id,))
+        return rows[0][0] if rows else None
+
+    def existing(self, faiss_ids: Sequence[int]) -> Set[int]:
+        """Các id còn nội dung trong docstore, id đã xóa (tombstone) bị loại."""
+        if not faiss_ids:
+            return set()
+        rows = self._query(
+            f"SELECT faiss_id FROM chunks WHERE faiss_id IN ({','.join('?' * len(faiss_ids))})",
+            [int(i) for i in faiss_ids],
+        )
+        return {row[0] for row in rows}
+
+    def documents_at(self, faiss_ids: Sequence[int]) -> Dict[int, Document]:
+        """Lấy các chunk theo id FAISS trong một truy vấn."""
+        if not faiss_ids:
+            return {}
+        rows = self._query(
+            "SELECT faiss_id, doc_id, page_content, metadata FROM chunks"
+            f" WHERE faiss_id IN ({','.join('?' * len(faiss_ids))})",
+            [int(i) for i in faiss_ids],
+        )
+        return {faiss_id: self._to_document(*row) for faiss_id, *row in rows}
+
+    def neighbors(self, source: str, chunk_index: int, context_size: int) -> List[Document]:
+        rows = self._query(
+            "SELECT doc_id, page_content, metadata FROM chunks"
+            " WHERE source = ? AND chunk_index BETWEEN ? AND ? ORDER BY chunk_index",
+            (source, chunk_index - context_size, chunk_index + context_size),
+        )
+        return [self._to_document(*row) for row in rows]
+
+    def count(self) -> int:
+        return self._query("SELECT COUNT(*) FROM chunks")[0][0]
+
+    def faiss_ids(self) -> List[int]:
+        return [row[0] for row in self._query("SELECT faiss_id FROM chunks ORDER BY faiss_id")]
+
+    def insert(self, doc_ids: Sequence[str], documents: Sequence[Document],
+               document_id: Optional[int] = None) -> List[int]:
+        """Ghi các chunk mới (chưa commit) và trả về id FAISS cấp cho từng chunk."""
+        with self._lock:
+            start = self._conn.execute("SELECT value FROM meta WHERE key = 'next_faiss_id'").fetchone()[0]
+            rows = []
+            next_index = {}
+            for offset, (doc_id, doc) in enumerate(zip(doc_ids, documents)):
+                source = doc.metadata.get("source", "")
+                chunk_index = doc.metadata.get("chunk_index")
+                if chunk_index is None:
+                    # Tài liệu chưa qua Loader: nối tiếp các chunk đã có của cùng source
+                    if source not in next_index:
+                        next_index[source] = self._conn.execute(
+                            "SELECT COALESCE(MAX(chunk_index) + 1, 0) FROM chunks WHERE source = ?", (source,)
+                        ).fetchone()[0]
+                    chunk_index = next_index[source]
+                    next_index[source] += 1
+                rows.append((
+                    start + offset, doc_id, document_id, source, chunk_index, doc.page_content,
+                    json.dumps({**doc.metadata, "chunk_index": chunk_index}, ensure_ascii=False, default=str),
+                ))
+            self._conn.executemany(
+                "INSERT INTO chunks (faiss_id, doc_id, document_id, source, chunk_index, page_content, metadata)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'next_faiss_id'", (start + len(rows),))
+            return [row[0] for row in rows]
+
+    @staticmethod
+    def _document_where(document_id: int, source: Optional[str] = None) -> Tuple[str, list]:
+        # Chunk nạp trước khi có cột document_id được nhận ra qua đường dẫn file (source)
+        if source:
+            return "document_id = ? OR (document_id IS NULL AND source = ?)", [document_id, source]
+        return "document_id = ?", [document_id]
+
+    def document_chunks(self, document_id: int, source: Optional[str] = None) -> Dict[int, Document]:
+        """Các chunk của một Document theo id FAISS (chuyển Document sang index khác)."""
+        where, params = self._document_where(document_id, source)
+        rows = self._query(
+            f"SELECT faiss_id, doc_id, page_content, metadata FROM chunks WHERE {where} ORDER BY chunk_index",
+            params,
+        )
+        return {faiss_id: self._to_document(*row) for faiss_id, *row in rows}
+
+    def delete_document(self, document_id: int, source: Optional[str] = None) -> List[int]:
+        """Xóa (chưa commit) các chunk của một Document, trả về id FAISS của chúng."""
+        with self._lock:
+            where, params = self._document_where(document_id, source)
+            faiss_ids = [row[0] for row in self._conn.execute(f"SELECT faiss_id FROM chunks WHERE {where}", params)]
+            self._conn.execute(f"DELETE FROM chunks WHERE {where}", params)
+            return faiss_ids
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE doc_id = ?", [(doc_id,) for doc_id in ids])
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._conn.rollback()
+
+
+class DocstoreIdMap(Mapping):
+    """index_to_docstore_id của LangChain FAISS, đọc thẳng từ SQLiteDocstore thay vì giữ dict trong RAM."""
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self.docstore = docstore
+
+    def __getitem__(self, faiss_id) -> str:
+        doc_id = self.docstore.doc_id_of(int(faiss_id))
+        if doc_id is None:
+            raise KeyError(faiss_id)
+        return doc_id
+
+    def __len__(self) -> int:
+        return self.docstore.count()
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.docstore.faiss_ids())
+
+
+def create_schema(conn: sqlite3.Connection):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+    if "position" in columns:
+        # Bảng tạo trước khi có id ổn định: id FAISS chính là vị trí cũ
+        conn.execute("ALTER TABLE chunks RENAME COLUMN position TO faiss_id")
+    if columns and "document_id" not in columns:
+        conn.execute("ALTER TABLE chunks ADD COLUMN document_id INTEGER")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS chunks ("
+        " faiss_id INTEGER PRIMARY KEY,"
+        " doc_id TEXT NOT NULL UNIQUE,"
+        " document_id INTEGER,"
+        " source TEXT NOT NULL,"
+        " chunk_index INTEGER NOT NULL,"
+        " page_content TEXT NOT NULL,"
+        " metadata TEXT NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source, chunk_index)")
+    conn.execute("CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document_id)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    conn.execute(
+        "INSERT OR IGNORE INTO meta (key, value)"
+        " SELECT 'next_faiss_id', COALESCE(MAX(faiss_id) + 1, 0) FROM chunks"
+    )
+
+
+def migrate_pickle_docstore(pickle_path: str, path: str, ntotal: int):
+    """Chuyển index.pkl (InMemoryDocstore + index_to_docstore_id) sang SQLite một lần."""
+    with open(pickle_path, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    if len(index_to_docstore_id) != ntotal:
+        raise ValueError(f"{pickle_path} has {len(index_to_docstore_id)} chunks but index.faiss has {ntotal}")
+
+    # Nhiều worker có thể cùng chuyển lúc khởi động: mỗi worker ghi file riêng rồi thay thế
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    conn = sqlite3.connect(tmp_path)
+    create_schema(conn)
+    next_index = {}
+    for position, doc_id in sorted(index_to_docstore_id.items()):
+        doc = docstore.search(doc_id)
+        if not isinstance(doc, Document):
+            continue
+        source = doc.metadata.get("source", "")
+        # Index cũ chưa có chunk_index: lấy theo thứ tự chunk được thêm vào FAISS
+        chunk_index = doc.metadata.get("chunk_index", next_index.get(source, 0))
+        next_index[source] = chunk_index + 1
+        conn.execute(
+            "INSERT INTO chunks (faiss_id, doc_id, source, chunk_index, page_content, metadata)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (position, doc_id, source, chunk_index, doc.page_content,
+             json.dumps({**doc.metadata, "chunk_index": chunk_index}, ensure_ascii=False, default=str)),
+        )
+    conn.execute("UPDATE meta SET value = ? WHERE key = 'next_faiss_id'", (ntotal,))
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence
+
+import numpy as np
+from chonkie.embeddings import BaseEmbeddings
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+
+from .tracing import record_cache, timed
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Kho embedding theo nội dung: key là (model, dimensions, sha256 của text).
+
+    Lưu bền vững trong SQLite (dùng chung giữa các process trên cùng host), phía trước
+    là một LRU trong process để các câu hỏi lặp lại không phải chạm tới đĩa.
+    """
+
+    def __init__(self, path: str, lru_size: int = 2000):
+        self.path = path
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " dimensions INTEGER NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, dimensions, text_hash))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: tuple, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, model: str, dimensions: int, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            missing = []
+            for h in hashes:
+                vector = self._lru.get((model, dimensions, h))
+                if vector is None:
+                    missing.append(h)
+                else:
+                    self._lru.move_to_end((model, dimensions, h))
+                    found[h] = vector
+
+            # SQLite giới hạn số tham số trong một câu lệnh nên truy vấn theo lô
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i + 500]
+                rows = self._connection().execute(
+                    "SELECT text_hash, vector FROM embeddings"
+                    f" WHERE model = ? AND dimensions = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, dimensions, *batch],
+                ).fetchall()
+                for h, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember((model, dimensions, h), vector)
+                    found[h] = vector
+        return found
+
+    def put_many(self, model: str, dimensions: int, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, dimensions, text_hash, vector) VALUES (?, ?, ?, ?)",
+                [
+                    (model, dimensions, h, np.asarray(vector, dtype=np.float32).tobytes())
+                    for h, vector in vectors.items()
+                ],
+            )
+            conn.commit()
+            for h, vector in vectors.items():
+                self._remember((model, dimensions, h), np.asarray(vector, dtype=np.float32))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> EmbeddingStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingStore(settings.CHATBOT_EMBEDDING_CACHE_PATH,
+                                    lru_size=settings.CHATBOT_EMBEDDING_CACHE_LRU_SIZE)
+    return _store
+
+
+def cached_embed(embed_fn, model: str, dimensions: int, texts: List[str]) -> List[np.ndarray]:
+    """Chỉ gọi embed_fn cho các text chưa có trong cache, giữ nguyên thứ tự đầu vào."""
+    store = get_embedding_store()
+    hashes = [text_hash(text) for text in texts]
+    vectors = store.get_many(model, dimensions, hashes)
+
+    missing = {}
+    for h, text in zip(hashes, texts):
+        if h not in vectors and h not in missing:
+            missing[h] = text
+    record_cache("embedding", hits=len(texts) - len(missing), misses=len(missing))
+    if missing:
+        with timed("embedding", model):
+            new_vectors = embed_fn(list(missing.values()))
+        computed = {
+            h: np.asarray(vector, dtype=np.float32)
+            for h, vector in zip(missing.keys(), new_vectors)
+        }
+        store.put_many(model, dimensions, computed)
+        vectors.update(computed)
+
+    return [vectors[h] for h in hashes]
+
+
+async def acached_embed(aembed_fn, model: str, dimensions: int, texts: List[str]) -> List[np.ndarray]:
+    """Bản async của cached_embed: chỉ chờ API embedding, tra/ghi SQLite vẫn chạy sync vì rất nhanh."""
+    store = get_embedding_store()
+    hashes = [text_hash(text) for text in texts]
+    vectors = store.get_many(model, dimensions, hashes)
+
+    missing = {}
+    for h, text in zip(hashes, texts):
+        if h not in vectors and h not in missing:
+            missing[h] = text
+    record_cache("embedding", hits=len(texts) - len(missing), misses=len(missing))
+    if missing:
+        with timed("embedding", model):
+            new_vectors = await aembed_fn(list(missing.values()))
+        computed = {
+            h: np.asarray(vector, dtype=np.float32)
+            for h, vector in zip(missing.keys(), new_vectors)
+        }
+        store.put_many(model, dimensions, computed)
+        vectors.update(computed)
+
+    return [vectors[h] for h in hashes]
+
+
+class CachedEmbeddings(Embeddings):
+    """Bọc embedding LangChain (OpenAIEmbeddings, OnnxEmbeddings) của VectorDB, FAISS bằng EmbeddingStore."""
+
+    def __init__(self, embedding):
+        self.embedding = embedding
+        self.model = embedding.model
+        # Model cần tiền tố riêng cho câu hỏi (e5) lưu vector câu hỏi dưới key khác
+        self.query_model = getattr(embedding, "query_model", None) or self.model
+        self.dimensions = getattr(embedding, "dimensions", None) or 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = cached_embed(self.embedding.embed_documents, self.model, self.dimensions, texts)
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        vectors = cached_embed(lambda texts: [self.embedding.embed_query(texts[0])],
+                               self.query_model, self.dimensions, [text])
+        return vectors[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """embed_query cho nhiều câu hỏi (train_intent_router), theo lô khi câu hỏi và đoạn văn embed như nhau."""
+        if self.query_model == self.model:
+            embed_fn = self.embedding.embed_documents
+        else:
+            embed_fn = lambda batch: [self.embedding.embed_query(text) for text in batch]
+        vectors = cached_embed(embed_fn, self.query_model, self.dimensions, texts)
+        return [vector.tolist() for vector in vectors]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async def aembed(texts):
+            return [await self.embedding.aembed_query(texts[0])]
+
+        vectors = await acached_embed(aembed, self.query_model, self.dimensions, [text])
+        return vectors[0].tolist()
+
+
+class CachedChonkieEmbeddings(BaseEmbeddings):
+    """Bọc embedding chonkie (OpenAIEmbeddings, OnnxChonkieEmbeddings) của SDPMChunker bằng EmbeddingStore."""
+
+    def __init__(self, embedding: BaseEmbeddings):
+        super().__init__()
+        self.embedding = embedding
+        self.model = embedding.model
+        # chonkie không truyền `dimensions` lên API nên vector luôn có số chiều gốc của model,
+        # trùng key với LangChain OpenAIEmbeddings khi không đặt dimensions
+        self.dimensions = 0
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        if not texts:
+            return []
+        return cached_embed(self.embedding.embed_batch, self.model, self.dimensions, texts)
+
+    def similarity(self, u: np.ndarray, v: np.ndarray) -> np.float32:
+        return self.embedding.similarity(u, v)
+
+    @property
+    def dimension(self) -> int:
+        return self.embedding.dimension
+
+    def get_tokenizer_or_token_counter(self):
+        return self.embedding.get_tokenizer_or_token_counter()
+
+    def __repr__(self) -> str:
+        return f"CachedChonkieEmbeddings({self.embedding!r})"
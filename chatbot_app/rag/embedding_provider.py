@@ -0,0 +1,184 @@
+import os
+import threading
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+from chonkie import OpenAIEmbeddings as ChonkieOpenAIEmbeddings
+from chonkie.embeddings import BaseEmbeddings
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+from langchain_openai.embeddings import OpenAIEmbeddings
+
+from .embedding_cache import CachedChonkieEmbeddings, CachedEmbeddings
+
+EMBEDDING_PROVIDERS = ("openai", "onnx")
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-large"
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embedding chạy bằng onnxruntime trên CPU, thay cho gọi API OpenAI.
+
+    `model_dir` chứa `model.onnx` và `tokenizer.json` export từ một sentence-transformer đa ngôn ngữ
+    có tiếng Việt (vd. intfloat/multilingual-e5-base, BAAI/bge-m3). Đầu ra `last_hidden_state` được
+    pool (mean hoặc CLS) rồi chuẩn hóa L2; nếu model đã có đầu ra `sentence_embedding` thì dùng luôn.
+    Model họ e5 cần tiền tố "query: " / "passage: " (query_prefix / passage_prefix).
+    """
+
+    def __init__(self, model_dir: str, max_length: int = 512, batch_size: int = 32, threads: int = 0,
+                 pooling: str = "mean", query_prefix: str = "", passage_prefix: str = ""):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir
+        # Tên model là một phần key của EmbeddingStore và được ghi cạnh index (xem VectorDB)
+        self.model = f"onnx:{os.path.basename(os.path.normpath(model_dir))}"
+        # Câu hỏi và đoạn văn có tiền tố khác nhau thì vector khác nhau, không dùng chung cache
+        self.query_model = f"{self.model}:query" if query_prefix != passage_prefix else self.model
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.pooling = pooling
+        self.query_prefix = query_prefix
+        self.passage_prefix = passage_prefix
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(model_dir, "model.onnx"),
+                                            sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        outputs = [node.name for node in self.session.get_outputs()]
+        self.output_name = "sentence_embedding" if "sentence_embedding" in outputs else outputs[0]
+        self._dimension = None
+
+    def _run(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        output = self.session.run([self.output_name], {k: v for k, v in inputs.items() if k in self.input_names})[0]
+        if output.ndim == 3:
+            if self.pooling == "cls":
+                output = output[:, 0]
+            else:
+                mask = attention_mask[:, :, None].astype(np.float32)
+                output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return (output / np.maximum(norms, 1e-12)).astype(np.float32)
+
+    def embed_array(self, texts: List[str], prefix: str = "") -> np.ndarray:
+        """Embed theo batch, gom các text dài gần bằng nhau vào cùng batch để ít phải pad."""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._run([prefix + texts[i] for i in batch])):
+                vectors[i] = vector
+        return np.stack(vectors)
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            shape = self.session.get_outputs()[0].shape if self.output_name == "sentence_embedding" else None
+            dim = shape[-1] if shape and isinstance(shape[-1], int) else None
+            # Số chiều thường là dynamic trong file export, embed thử một câu để biết
+            self._dimension = dim or int(self._run([" "]).shape[1])
+        return self._dimension
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts, prefix=self.passage_prefix).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text], prefix=self.query_prefix)[0].tolist()
+
+
+class OnnxChonkieEmbeddings(BaseEmbeddings):
+    """OnnxEmbeddings cho SDPMChunker, đếm token bằng chính tokenizer của model."""
+
+    def __init__(self, embedding: OnnxEmbeddings):
+        super().__init__()
+        self.embedding = embedding
+        self.model = embedding.model
+        from tokenizers import Tokenizer
+        # Bản không truncate/pad để chonkie đếm đúng số token của câu dài
+        self.tokenizer = Tokenizer.from_file(os.path.join(embedding.model_dir, "tokenizer.json"))
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        return list(self.embedding.embed_array(texts, prefix=self.embedding.passage_prefix))
+
+    def similarity(self, u: np.ndarray, v: np.ndarray) -> np.float32:
+        # Vector đã chuẩn hóa L2
+        return np.float32(np.dot(u, v))
+
+    @property
+    def dimension(self) -> int:
+        return self.embedding.dimension
+
+    def get_tokenizer_or_token_counter(self):
+        return self.tokenizer
+
+    def __repr__(self) -> str:
+        return f"OnnxChonkieEmbeddings(model={self.model})"
+
+
+_onnx_lock = threading.Lock()
+_onnx_embeddings: Optional[OnnxEmbeddings] = None
+
+
+def get_onnx_embeddings() -> OnnxEmbeddings:
+    """Một session ONNX cho cả process (VectorDB của mọi tổ chức, semantic cache, chunker)."""
+    global _onnx_embeddings
+    with _onnx_lock:
+        if _onnx_embeddings is None:
+            _onnx_embeddings = OnnxEmbeddings(settings.CHATBOT_EMBEDDING_ONNX_MODEL_DIR,
+                                              max_length=settings.CHATBOT_EMBEDDING_ONNX_MAX_LENGTH,
+                                              batch_size=settings.CHATBOT_EMBEDDING_ONNX_BATCH_SIZE,
+                                              threads=settings.CHATBOT_EMBEDDING_ONNX_THREADS,
+                                              pooling=settings.CHATBOT_EMBEDDING_ONNX_POOLING,
+                                              query_prefix=settings.CHATBOT_EMBEDDING_ONNX_QUERY_PREFIX,
+                                              passage_prefix=settings.CHATBOT_EMBEDDING_ONNX_PASSAGE_PREFIX)
+    return _onnx_embeddings
+
+
+@lru_cache(maxsize=None)
+def _embedding(provider: str) -> CachedEmbeddings:
+    if provider == "openai":
+        return CachedEmbeddings(OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY, model=OPENAI_EMBEDDING_MODEL))
+    if provider == "onnx":
+        return CachedEmbeddings(get_onnx_embeddings())
+    raise ValueError(f"Unknown embedding provider: {provider}")
+
+
+def is_openai_embedding(embedding) -> bool:
+    """Embedding gọi API OpenAI (bị giới hạn TPM/RPM), không phải model ONNX chạy trong process."""
+    return getattr(embedding, "model", None) == OPENAI_EMBEDDING_MODEL
+
+
+def get_embedding(provider: Optional[str] = None) -> CachedEmbeddings:
+    """Embedding LangChain cho VectorDB, semantic cache và intent router (settings.CHATBOT_EMBEDDING_PROVIDER)."""
+    return _embedding(provider or settings.CHATBOT_EMBEDDING_PROVIDER)
+
+
+def get_chunker_embedding(provider: Optional[str] = None) -> CachedChonkieEmbeddings:
+    """Embedding chonkie cho SDPMChunker, cùng provider với VectorDB."""
+    provider = provider or settings.CHATBOT_EMBEDDING_PROVIDER
+    if provider == "openai":
+        return CachedChonkieEmbeddings(ChonkieOpenAIEmbeddings(api_key=settings.OPENAI_API_KEY,
+                                                               model=OPENAI_EMBEDDING_MODEL))
+    if provider == "onnx":
+        return CachedChonkieEmbeddings(OnnxChonkieEmbeddings(get_onnx_embeddings()))
+    raise ValueError(f"Unknown embedding provider: {provider}")
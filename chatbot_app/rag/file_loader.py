@@ -1,18 +1,33 @@
 
-from typing import List
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Tuple
+
+import pymupdf
+import pymupdf4llm
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.documents import Document
-from langchain_pymupdf4llm import PyMuPDF4LLMLoader
 
-from chonkie import OpenAIEmbeddings
 from chonkie import SDPMChunker
 
-from .standardize import preprocess_text
-
-from django.conf import settings
+from .standardize import preprocess_texts
+from .embedding_provider import get_chunker_embedding
 
 DEFAULT_CHUNK_SIZE = 1024
 
+
+def _parse_pages(file_path: str, pages: List[int]) -> List[Tuple[int, str]]:
+    """Chạy trong process con: chuyển từng trang sang markdown (như PyMuPDF4LLMLoader) rồi chuẩn hóa tiếng Việt."""
+    texts = []
+    with pymupdf.open(file_path) as doc:
+        for page in pages:
+            text = pymupdf4llm.to_markdown(doc, pages=[page], show_progress=False, graphics_limit=5000)
+            if text.endswith("\n-----\n\n"):
+                text = text[:-8]
+            texts.append(text)
+    return list(zip(pages, preprocess_texts(texts)))
+
 class BaseLoader:
     def __init__(self) -> None:
         pass
@@ -22,8 +37,10 @@ class BaseLoader:
 
 
 class PDFLoader(BaseLoader):
-    def __init__(self) -> None:
+    def __init__(self, max_workers: int = 1) -> None:
         super().__init__()
+        # Số process parse trang song song (pymupdf4llm + pyvi đều tốn CPU)
+        self.max_workers = max_workers
         print("PDFLoader được khởi tạo")
 
     def __call__(self, file_path: str):
@@ -35,7 +52,7 @@ class PDFLoader(BaseLoader):
     def _load_pdf_with_id(self, file_path):
         try:
             print(f"Đang cố gắng tải file PDF từ: {file_path}")
-            pages = PyMuPDF4LLMLoader(file_path).load()
+            pages = self._parse(file_path)
             print(f"Tải thành công với {len(pages)} trang")
         except Exception as e:
             print(f"Lỗi khi tải file PDF: {str(e)}")
@@ -43,42 +60,66 @@ class PDFLoader(BaseLoader):
 
         documents = [
             Document(
-                page_content=preprocess_text(page.page_content),
+                page_content=text,
                 metadata={"page": idx + 1, "source": file_path}
             )
-            for idx, page in enumerate(pages)
+            for idx, text in pages
         ]
         print(f"Đã tạo {len(documents)} Documents")
         return documents
+
+    def _parse(self, file_path: str) -> List[Tuple[int, str]]:
+        with pymupdf.open(file_path) as doc:
+            total_pages = len(doc)
+        # Process daemon (worker prefork của Celery) không được tạo process con: parse tuần tự
+        if self.max_workers <= 1 or total_pages < 2 or multiprocessing.current_process().daemon:
+            return _parse_pages(file_path, list(range(total_pages)))
+
+        # Mỗi process nhận vài lô trang để trang nặng (bảng, nhiều hình) không dồn vào một process
+        step = max(1, math.ceil(total_pages / (self.max_workers * 4)))
+        batches = [list(range(start, min(start + step, total_pages))) for start in range(0, total_pages, step)]
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+            results = pool.map(_parse_pages, [file_path] * len(batches), batches)
+            return [page for batch in results for page in batch]
     
 
 
 class TextSplitter:
-    def __init__(self, embedding=OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY,
-                                            model="text-embedding-3-large")):
-        self.chunker = SDPMChunker(embedding_model=embedding,  
+    def __init__(self, embedding=None, max_workers: int = 1):
+        # Cùng provider với VectorDB (settings.CHATBOT_EMBEDDING_PROVIDER)
+        self.chunker = SDPMChunker(embedding_model=embedding or get_chunker_embedding(),  
                                    threshold=0.5,
                                    chunk_size=DEFAULT_CHUNK_SIZE,
                                    min_sentences=2,
                                    skip_window=2)
+        # SDPMChunker chủ yếu chờ API embedding nên chia trang cho nhiều thread
+        self.max_workers = max_workers
+
     def __call__(self, documents):  
         all_chunks = []
-        for doc in documents:
-            chunks = self.chunker.chunk(doc.page_content)
+        # Vị trí của chunk trong từng file, dùng để lấy các chunk lân cận khi truy xuất
+        chunk_counters = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+            # map giữ đúng thứ tự trang nên chunk_index không đổi so với chạy tuần tự
+            page_chunks = list(pool.map(lambda doc: self.chunker.chunk(doc.page_content), documents))
+        for doc, chunks in zip(documents, page_chunks):
+            source = doc.metadata.get("source")
             # Chuyển đổi chunks thành Document objects với metadata
             for chunk in chunks:
+                chunk_index = chunk_counters.get(source, 0)
+                chunk_counters[source] = chunk_index + 1
                 all_chunks.append(Document(
                     page_content=chunk.text,
-                    metadata=doc.metadata
+                    metadata={**doc.metadata, "chunk_index": chunk_index}
                 ))
         return all_chunks
 
 
 class Loader:
-    def __init__(self) -> None:
+    def __init__(self, parse_workers: int = 1, chunk_workers: int = 1) -> None:
         self.file_type = "pdf"
-        self.doc_loader = PDFLoader()
-        self.doc_splitter = TextSplitter()
+        self.doc_loader = PDFLoader(max_workers=parse_workers)
+        self.doc_splitter = TextSplitter(max_workers=chunk_workers)
 
     def load(self, file_path: str):
         print(f"Bắt đầu tải và xử lý file: {file_path}")
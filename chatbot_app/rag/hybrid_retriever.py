@@ -0,0 +1,84 @@
+from collections import defaultdict
+from typing import Any, List
+
+import numpy as np
+from langchain.callbacks.manager import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .tracing import record_documents, timed
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Thay cho EnsembleRetriever(similarity, mmr): embed câu hỏi một lần, tìm kiếm FAISS một lần
+    lấy fetch_k ứng viên, rồi xếp hạng similarity, MMR và trộn bằng weighted reciprocal rank
+    ngay trên các vector ứng viên bằng NumPy.
+    """
+
+    db: Any
+    k: int = 5
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    weights: List[float] = [0.8, 0.2]
+    c: int = 60
+
+    def _search_candidates(self, query_embedding: np.ndarray):
+        _, indices = self.db.index.search(query_embedding, max(self.k, self.fetch_k))
+        # -1 xuất hiện khi index có ít hơn fetch_k vector
+        candidates = [int(i) for i in indices[0] if i != -1]
+        # Bỏ vector của tài liệu đã xóa (tombstone HNSW, hoặc snapshot cũ chưa kịp nạp lại)
+        alive = self.db.docstore.existing(candidates)
+        return [i for i in candidates if i in alive]
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        query_embedding = np.array([self.db.embedding_function.embed_query(query)], dtype=np.float32)
+        return self._rank(query_embedding)
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        # Chỉ gọi API embedding là chờ async, tìm kiếm FAISS và xếp hạng chỉ mất vài ms nên chạy luôn
+        query_embedding = np.array([await self.db.embedding_function.aembed_query(query)], dtype=np.float32)
+        return self._rank(query_embedding)
+
+    def _rank(self, query_embedding: np.ndarray) -> List[Document]:
+        with timed("faiss", "search"):
+            candidates = self._search_candidates(query_embedding)
+        record_documents("faiss_candidates", len(candidates))
+        if not candidates:
+            return []
+
+        # FAISS trả về ứng viên theo thứ tự similarity nên k phần tử đầu chính là kết quả similarity
+        similarity_ranking = candidates[:self.k]
+
+        vectors = [self.db.index.reconstruct(i) for i in candidates]
+        mmr_ranking = [
+            candidates[i]
+            for i in maximal_marginal_relevance(query_embedding, vectors, k=self.k, lambda_mult=self.lambda_mult)
+        ]
+
+        # Chỉ đọc nội dung của các chunk được xếp hạng, một truy vấn tới docstore
+        documents = self.db.docstore.documents_at(sorted(set(similarity_ranking) | set(mmr_ranking)))
+
+        # Weighted reciprocal rank fusion, gộp các chunk trùng nội dung như EnsembleRetriever
+        rrf_score = defaultdict(float)
+        fused = {}
+        for ranking, weight in zip([similarity_ranking, mmr_ranking], self.weights):
+            for rank, i in enumerate(ranking, start=1):
+                doc = documents.get(i)
+                if doc is None:
+                    continue
+                rrf_score[doc.page_content] += weight / (rank + self.c)
+                fused.setdefault(doc.page_content, doc)
+
+        return sorted(fused.values(), key=lambda doc: rrf_score[doc.page_content], reverse=True)
@@ -0,0 +1,96 @@
+import math
+from typing import Optional, Sequence
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+
+def factory_string(index_type: str, n_vectors: int, dim: int,
+                   nlist: Optional[int] = None, hnsw_m: int = 32, pq_m: int = 64) -> str:
+    """Chuỗi faiss.index_factory cho từng loại index, nlist mặc định ~ 4*sqrt(n)."""
+    # Flat/HNSW bọc IDMap2 để id FAISS là id ổn định của chunk trong docstore (IVF tự lưu id)
+    if index_type == "flat":
+        return "IDMap2,Flat"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{hnsw_m}"
+    # Mỗi cell IVF cần khoảng 39 vector để train k-means ổn định
+    nlist = nlist or int(4 * math.sqrt(n_vectors))
+    nlist = max(1, min(nlist, n_vectors // 39))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        if dim % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}")
+        return f"IVF{nlist},PQ{pq_m}"
+    raise ValueError(f"Unknown FAISS index type: {index_type}")
+
+
+def build_index(index_type: str, vectors: np.ndarray, ids: Optional[Sequence[int]] = None, **params) -> faiss.Index:
+    """Tạo index mới, train trên chính các vector hiện có rồi add kèm id của chunk (mặc định 0..n-1)."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dim = vectors.shape
+    ids = np.arange(n_vectors, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+    index = faiss.index_factory(dim, factory_string(index_type, n_vectors, dim, **params), faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, ids)
+    prepare_index(index)
+    return index
+
+
+def _inner(index: faiss.Index) -> faiss.Index:
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def prepare_index(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> faiss.Index:
+    """
+    Đặt tham số tìm kiếm và bật direct map dạng hashtable cho IVF để vừa reconstruct được
+    vector theo id (HybridRetriever) vừa remove_ids được khi xóa tài liệu.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        if nprobe:
+            ivf.nprobe = nprobe
+    inner = _inner(index)
+    if ef_search and isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    ivf = faiss.try_extract_index_ivf(inner)
+    if ivf is not None:
+        return "ivf_pq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "ivf_flat"
+    return "flat"
+
+
+def has_stable_ids(index: faiss.Index) -> bool:
+    return isinstance(index, faiss.IndexIDMap2) or faiss.try_extract_index_ivf(index) is not None
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    """HNSW không xóa được vector, chỉ đánh dấu xóa trong docstore rồi compact sau."""
+    return not isinstance(_inner(index), faiss.IndexHNSW)
+
+
+def ensure_stable_ids(index: faiss.Index) -> faiss.Index:
+    """Index flat/HNSW cũ (id = vị trí) được dựng lại trong IDMap2 với id = vị trí hiện tại."""
+    if has_stable_ids(index):
+        return index
+    if index.ntotal == 0:
+        return faiss.IndexIDMap2(index)
+    return build_index(index_type_of(index), index.reconstruct_n(0, index.ntotal))
+
+
+def vectors_for(index: faiss.Index, ids: Sequence[int]) -> np.ndarray:
+    prepare_index(index)
+    return index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+
+from chatbot_app.metrics import TENANT_INDEX_EVENTS
+from .index_registry import NO_ORGANIZATION_NAMESPACE
+from .vector_db import VectorDB, index_exists
+
+
+class IndexPool:
+    """
+    LRU các index (VectorDB) đã nạp trong worker, mỗi tổ chức một index.
+
+    Index của tổ chức được nạp khi có câu hỏi đầu tiên và bị bỏ khỏi pool (index dùng lâu nhất trước)
+    khi tổng dung lượng vượt `memory_budget` byte; request đang chạy vẫn giữ tham chiếu tới snapshot
+    của nó nên evict không làm hỏng lượt tìm kiếm dở. Index chung cũ (namespace None) không có request nào
+    hỏi tới, chỉ được nạp như các index khác khi lệnh quản trị/benchmark gọi Chatbot không kèm namespace.
+    """
+
+    def __init__(self, loader: Callable[[Optional[str]], VectorDB], memory_budget: int):
+        self.loader = loader
+        self.memory_budget = memory_budget
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Optional[str], VectorDB]" = OrderedDict()
+        # Mỗi namespace một lock nạp để nhiều request cùng lúc chỉ đọc index từ đĩa một lần
+        self._load_locks: Dict[Optional[str], threading.Lock] = {}
+
+    def peek(self, namespace: Optional[str]) -> Optional[VectorDB]:
+        """Index đã nạp (không nạp mới, không đổi thứ tự LRU)."""
+        with self._lock:
+            return self._entries.get(namespace)
+
+    def get(self, namespace: Optional[str]) -> Optional[VectorDB]:
+        """Index của namespace, nạp nếu chưa có; None nếu tổ chức chưa upload tài liệu nào."""
+        if namespace == NO_ORGANIZATION_NAMESPACE:
+            return None
+
+        with self._lock:
+            vector_db = self._entries.get(namespace)
+            if vector_db is not None:
+                self._entries.move_to_end(namespace)
+                TENANT_INDEX_EVENTS.labels(event="hit").inc()
+                return vector_db
+            load_lock = self._load_locks.setdefault(namespace, threading.Lock())
+
+        with load_lock:
+            vector_db = self.peek(namespace)
+            if vector_db is not None:
+                return vector_db
+            # Worker phục vụ request không tạo index rỗng cho tổ chức chưa có tài liệu
+            if not index_exists(namespace):
+                return None
+            vector_db = self.loader(namespace)
+            TENANT_INDEX_EVENTS.labels(event="load").inc()
+            with self._lock:
+                self._entries[namespace] = vector_db
+                self._evict(keep=namespace)
+        return vector_db
+
+    def _evict(self, keep: Optional[str]):
+        sizes = {namespace: vector_db.memory_bytes() for namespace, vector_db in self._entries.items()}
+        used = sum(sizes.values())
+        for namespace in list(self._entries):
+            if used <= self.memory_budget:
+                break
+            # Index vừa nạp luôn được giữ, kể cả khi riêng nó đã vượt ngân sách
+            if namespace == keep:
+                continue
+            del self._entries[namespace]
+            used -= sizes[namespace]
+            TENANT_INDEX_EVENTS.labels(event="evict").inc()
+            print(f"[DEBUG] Bỏ index {namespace or 'chung'} khỏi pool ({sizes[namespace] / 2**20:.1f} MB)")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+def get_index_pool() -> IndexPool:
+    return IndexPool(loader=lambda namespace: VectorDB(namespace=namespace),
+                     memory_budget=settings.CHATBOT_INDEX_POOL_MEMORY_MB * 2**20)
@@ -0,0 +1,39 @@
+from typing import Optional
+
+from django.core.cache import cache
+
+INDEX_VERSION_KEY = 'chatbot_index_version'
+
+# Namespace của request không thuộc tổ chức nào (ẩn danh, customer chưa gắn partner): không có index nên
+# không truy xuất tài liệu nào, kể cả index chung cũ, và semantic cache cũng tách khỏi index chung
+NO_ORGANIZATION_NAMESPACE = 'no_organization'
+
+
+def index_namespace(organization_id: Optional[int]) -> Optional[str]:
+    """Namespace index của một tổ chức; None là index chung cũ cho các Document chưa gắn tổ chức."""
+    return f'org_{organization_id}' if organization_id else None
+
+
+def request_namespace(organization_id: Optional[int]) -> str:
+    """Namespace cho câu hỏi của người dùng; index chung (None) chỉ dành cho lệnh quản trị và benchmark."""
+    return index_namespace(organization_id) or NO_ORGANIZATION_NAMESPACE
+
+
+def _version_key(namespace: Optional[str]) -> str:
+    # Index chung giữ key cũ để worker đang chạy không phải nạp lại khi nâng cấp
+    return f'{INDEX_VERSION_KEY}:{namespace}' if namespace else INDEX_VERSION_KEY
+
+
+def get_index_version(namespace: Optional[str] = None) -> int:
+    """
+    Phiên bản hiện tại của FAISS index (mỗi namespace một version), dùng chung cho mọi worker qua Redis.
+    Mỗi worker so với IndexSnapshot.version của mình và tự nạp lại khi lệch (VectorDB.ensure_current).
+    """
+    return cache.get_or_set(_version_key(namespace), 0, timeout=None)
+
+
+def bump_index_version(namespace: Optional[str] = None) -> int:
+    """Tăng phiên bản index sau khi một Document được thêm hoặc xóa."""
+    key = _version_key(namespace)
+    cache.add(key, 0, timeout=None)
+    return cache.incr(key)
@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import os
+import queue
+import signal
+import socket
+import struct
+import threading
+import weakref
+from typing import Optional
+
+import msgpack
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Mỗi frame: 4 byte độ dài (big-endian) + payload msgpack
+_HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 16 * 2**20
+
+
+class InferenceError(RuntimeError):
+    """Lỗi xảy ra trong process inference (pipeline lỗi), không phải lỗi kết nối."""
+
+
+def pack_frame(message: dict) -> bytes:
+    payload = msgpack.packb(message, use_bin_type=True)
+    return _HEADER.pack(len(payload)) + payload
+
+
+def _unpack(payload: bytes) -> dict:
+    return msgpack.unpackb(payload, raw=False)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[dict]:
+    """Frame tiếp theo, None nếu đầu kia đóng kết nối giữa hai frame."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame {size} bytes vượt giới hạn {MAX_FRAME_BYTES}")
+    return _unpack(await reader.readexactly(size))
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Inference server đóng kết nối giữa frame")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Optional[dict]:
+    """Bản sync của read_frame."""
+    first = sock.recv(_HEADER.size)
+    if not first:
+        return None
+    (size,) = _HEADER.unpack(first + _recv_exactly(sock, _HEADER.size - len(first)))
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame {size} bytes vượt giới hạn {MAX_FRAME_BYTES}")
+    return _unpack(_recv_exactly(sock, size))
+
+
+class InferenceServer:
+    """
+    Chạy một Chatbot cho cả host qua Unix socket (manage.py run_chatbot_server).
+
+    Mỗi kết nối xử lý lần lượt từng request {"method", "params"}: ask trả về một frame {"result"},
+    stream trả về các frame {"event", "data"} rồi {"done": True}; lỗi pipeline trả về {"error"}.
+    Các kết nối chạy đồng thời trên một event loop vì pipeline đã có bản async (aask/astream).
+    """
+
+    def __init__(self, chatbot, socket_path: str):
+        self.chatbot = chatbot
+        self.socket_path = socket_path
+
+    async def _send(self, writer: asyncio.StreamWriter, message: dict):
+        writer.write(pack_frame(message))
+        await writer.drain()
+
+    async def _dispatch(self, writer: asyncio.StreamWriter, method: str, params: dict):
+        if method == "ask":
+            intent, answer, intent_route = await self.chatbot.aask(**params)
+            await self._send(writer, {"result": [intent, answer, intent_route]})
+        elif method == "stream":
+            stream = self.chatbot.astream(**params)
+            try:
+                async for event, data in stream:
+                    await self._send(writer, {"event": event, "data": data})
+            finally:
+                # Client ngắt giữa chừng: đóng generator ngay để single-flight và tracer được giải phóng,
+                # không đợi GC (các request đang chờ single-flight sẽ phải chờ hết timeout)
+                await stream.aclose()
+            await self._send(writer, {"done": True})
+        elif method == "reload_index":
+            self.chatbot.reload_index(params.get("namespace"))
+            await self._send(writer, {"result": None})
+        elif method == "ping":
+            await self._send(writer, {"result": {"pid": os.getpid()}})
+        else:
+            await self._send(writer, {"error": f"Unknown method: {method}"})
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await read_frame(reader)
+                if request is None:
+                    break
+                try:
+                    await self._dispatch(writer, request.get("method"), request.get("params") or {})
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    logger.exception(f"Inference {request.get('method')} lỗi: {e}")
+                    await self._send(writer, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # Web worker đóng kết nối giữa chừng (client hủy stream, timeout)
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        # Socket cũ còn lại khi process trước bị kill
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path, limit=MAX_FRAME_BYTES)
+        logger.info(f"Inference server lắng nghe tại {self.socket_path} (pid {os.getpid()})")
+        # docker stop gửi SIGTERM: dừng vòng phục vụ để kịp xóa socket
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+class _AsyncPool:
+    """Kết nối asyncio nhàn rỗi của một event loop (StreamReader/Writer gắn với loop tạo ra chúng)."""
+
+    def __init__(self):
+        self.idle = []
+
+
+class RemoteChatbot:
+    """
+    Client mỏng của InferenceServer cho web worker, cùng interface ask/aask/astream/reload_index với Chatbot.
+
+    Giữ tối đa `pool_size` kết nối nhàn rỗi (một bộ cho code sync, một bộ cho mỗi event loop) để không phải
+    mở socket cho mỗi câu hỏi; request đồng thời vượt quá pool thì mở thêm kết nối rồi đóng khi xong.
+    `timeout` là thời gian tối đa chờ câu trả lời (với stream: chờ giữa hai event).
+    """
+
+    def __init__(self, socket_path: str, pool_size: int = 16, timeout: float = 120.0,
+                 connect_timeout: float = 2.0):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._sync_idle = queue.LifoQueue()
+        self._async_pools = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    # --- sync (view DRF, signal) ---
+
+    def _sync_connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(self.timeout)
+        return sock
+
+    def _sync_release(self, sock: socket.socket):
+        if self._sync_idle.qsize() < self.pool_size:
+            self._sync_idle.put(sock)
+        else:
+            sock.close()
+
+    def _call(self, method: str, params: dict):
+        try:
+            sock, reused = self._sync_idle.get_nowait(), True
+        except queue.Empty:
+            sock, reused = self._sync_connect(), False
+        try:
+            try:
+                sock.sendall(pack_frame({"method": method, "params": params}))
+                response = recv_frame(sock)
+            except (BrokenPipeError, ConnectionResetError):
+                response = None
+            if response is None:
+                sock.close()
+                # Kết nối nhàn rỗi đã bị server đóng (restart) trước khi nhận request: gửi lại trên kết nối mới
+                if reused:
+                    return self._call(method, params)
+                raise ConnectionError("Inference server đóng kết nối")
+        except BaseException:
+            sock.close()
+            raise
+        self._sync_release(sock)
+        if "error" in response:
+            raise InferenceError(response["error"])
+        return response["result"]
+
+    def ask(self, question: str, config: dict, user_id: int, is_sktt: bool = False, result: dict = None,
+            namespace: Optional[str] = None):
+        intent, answer, intent_route = self._call("ask", {"question": question, "config": config, "user_id": user_id,
+                                                          "is_sktt": is_sktt, "result": result, "namespace": namespace})
+        return intent, answer, intent_route
+
+    def reload_index(self, namespace: Optional[str] = None):
+        return self._call("reload_index", {"namespace": namespace})
+
+    def warm_up(self):
+        """Kiểm tra inference server đã chạy, không dựng gì trong web worker."""
+        try:
+            info = self._call("ping", {})
+            logger.debug(f"Kết nối inference server {self.socket_path} (pid {info['pid']})")
+        except OSError as e:
+            logger.error(f"Chưa kết nối được inference server {self.socket_path}: {e}")
+
+    # --- async (view async, SSE stream) ---
+
+    def _pool(self) -> _AsyncPool:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._async_pools.get(loop)
+            if pool is None:
+                pool = self._async_pools[loop] = _AsyncPool()
+            return pool
+
+    async def _acquire(self, pool: _AsyncPool):
+        if pool.idle:
+            return pool.idle.pop(), True
+        connection = await asyncio.wait_for(asyncio.open_unix_connection(self.socket_path, limit=MAX_FRAME_BYTES),
+                                            self.connect_timeout)
+        return connection, False
+
+    def _arelease(self, pool: _AsyncPool, connection):
+        if len(pool.idle) < self.pool_size and not connection[1].is_closing():
+            pool.idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def _open_request(self, method: str, params: dict):
+        """Gửi request, trả về (pool, kết nối, frame đầu tiên)."""
+        pool = self._pool()
+        connection, reused = await self._acquire(pool)
+        reader, writer = connection
+        try:
+            try:
+                writer.write(pack_frame({"method": method, "params": params}))
+                await writer.drain()
+                first = await asyncio.wait_for(read_frame(reader), self.timeout)
+            except (BrokenPipeError, ConnectionResetError):
+                first = None
+            if first is None:
+                writer.close()
+                # Như RemoteChatbot._call: kết nối nhàn rỗi cũ thì thử lại một lần
+                if reused:
+                    return await self._open_request(method, params)
+                raise ConnectionError("Inference server đóng kết nối")
+        except BaseException:
+            writer.close()
+            raise
+        return pool, connection, first
+
+    async def aask(self, question: str, config: dict, user_id: int, is_sktt: bool = False, result: dict = None,
+                   namespace: Optional[str] = None):
+        pool, connection, response = await self._open_request(
+            "ask", {"question": question, "config": config, "user_id": user_id,
+                    "is_sktt": is_sktt, "result": result, "namespace": namespace})
+        self._arelease(pool, connection)
+        if "error" in response:
+            raise InferenceError(response["error"])
+        intent, answer, intent_route = response["result"]
+        return intent, answer, intent_route
+
+    async def astream(self, question: str, config: dict, user_id: int, is_sktt: bool = False, result: dict = None,
+                      namespace: Optional[str] = None):
+        pool, connection, frame = await self._open_request(
+            "stream", {"question": question, "config": config, "user_id": user_id,
+                       "is_sktt": is_sktt, "result": result, "namespace": namespace})
+        reader, writer = connection
+        finished = False
+        try:
+            while True:
+                if "error" in frame:
+                    finished = True
+                    raise InferenceError(frame["error"])
+                if frame.get("done"):
+                    finished = True
+                    return
+                yield frame["event"], frame["data"]
+                frame = await asyncio.wait_for(read_frame(reader), self.timeout)
+                if frame is None:
+                    raise ConnectionError("Inference server đóng kết nối giữa stream")
+        finally:
+            # Client ngắt stream giữa chừng: server vẫn đang gửi nên không trả kết nối về pool
+            if finished:
+                self._arelease(pool, connection)
+            else:
+                writer.close()
+
+
+def get_remote_chatbot() -> RemoteChatbot:
+    return RemoteChatbot(settings.CHATBOT_INFERENCE_SOCKET,
+                         pool_size=settings.CHATBOT_INFERENCE_POOL_SIZE,
+                         timeout=settings.CHATBOT_INFERENCE_TIMEOUT,
+                         connect_timeout=settings.CHATBOT_INFERENCE_CONNECT_TIMEOUT)
@@ -0,0 +1,68 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+
+from .file_loader import PDFLoader, TextSplitter
+from .vector_db import VectorDB
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("parsing", "chunking", "embedding", "indexing")
+
+
+class IngestionPipeline:
+    """
+    Nạp một file PDF vào index theo từng bước: parse trang (process pool), chia chunk (thread),
+    embed theo batch lớn song song, rồi gộp vào FAISS một lần duy nhất ở cuối.
+
+    `on_stage(stage)` được gọi khi bắt đầu mỗi bước để cập nhật tiến độ (Document.status),
+    thời gian từng bước được log và trả về trong `timings`.
+    """
+
+    def __init__(self, on_stage: Optional[Callable[[str], None]] = None):
+        self.on_stage = on_stage
+        self.timings: Dict[str, float] = {}
+        self.loader = PDFLoader(max_workers=settings.CHATBOT_INGEST_PARSE_WORKERS)
+        self.splitter = TextSplitter(max_workers=settings.CHATBOT_INGEST_CHUNK_WORKERS)
+
+    @contextmanager
+    def _stage(self, stage: str, document_id: int):
+        if self.on_stage:
+            self.on_stage(stage)
+        start = time.perf_counter()
+        yield
+        self.timings[stage] = time.perf_counter() - start
+        logger.info(f'ingest_stage document={document_id} stage={stage} seconds={self.timings[stage]:.2f}')
+
+    def run(self, document_id: int, file_path: str, replace: bool = False, namespace: Optional[str] = None,
+            source: Optional[str] = None) -> bool:
+        with self._stage("parsing", document_id):
+            pages = self.loader(file_path)
+        if not pages:
+            return False
+        if source:
+            # Upload lại: parse file tạm nhưng chunk mang đường dẫn file chính mà file tạm sẽ thay vào
+            for page in pages:
+                page.metadata["source"] = source
+
+        with self._stage("chunking", document_id):
+            chunks = self.splitter(pages)
+        if not chunks:
+            return False
+
+        # Index riêng của tổ chức sở hữu Document, tạo mới nếu đây là tài liệu đầu tiên
+        vector_db = VectorDB(writable=True, namespace=namespace)
+        with self._stage("embedding", document_id):
+            vectors = vector_db.embed_documents(chunks)
+
+        with self._stage("indexing", document_id):
+            is_succeeded = vector_db.merge_documents(chunks, vectors, document_id=document_id, replace=replace)
+
+        logger.info(
+            f'ingest_done document={document_id} pages={len(pages)} chunks={len(chunks)} '
+            + ' '.join(f'{stage}={seconds:.2f}s' for stage, seconds in self.timings.items())
+        )
+        return is_succeeded
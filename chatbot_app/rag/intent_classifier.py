@@ -48,4 +48,16 @@ class IntentClassifier:
             elif "HTGD" in intent:
                 return "1"
         except Exception as e:
-            return "1" 
\ No newline at end of file
+            return "1" 
+
+    async def aclassify(self, user_input: str) -> str:
+        """Async version of classify, used by the async graph nodes."""
+        try:
+            intent = await self.router_chain.ainvoke({"input": user_input})
+
+            if "TTND" in intent:
+                return "0"
+            elif "HTGD" in intent:
+                return "1"
+        except Exception as e:
+            return "1"
\ No newline at end of file
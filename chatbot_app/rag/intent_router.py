@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import joblib
+import numpy as np
+from django.conf import settings
+from langchain_core.runnables.config import run_in_executor
+
+from chatbot_app.metrics import INTENT_ROUTE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Nhãn lưu trong QAHistory có thể là mã intent hoặc tên lĩnh vực của prompt phân loại
+INTENT_LABELS = {"0": "0", "1": "1", "TTND": "0", "HTGD": "1"}
+
+
+def normalize_intent(intent: str) -> Optional[str]:
+    return INTENT_LABELS.get((intent or "").strip().upper())
+
+
+def embedding_model_name(embedding) -> Optional[str]:
+    """Tên không gian vector của câu hỏi (CachedEmbeddings.query_model), None nếu embedding không có tên."""
+    return getattr(embedding, "query_model", None) or getattr(embedding, "model", None)
+
+
+def embed_questions(embedding, questions: List[str]) -> np.ndarray:
+    # Embed như lúc phân loại (embed_query): model e5 thêm tiền tố "query: " khác với embed_documents
+    if hasattr(embedding, "embed_queries"):
+        vectors = embedding.embed_queries(questions)
+    else:
+        vectors = [embedding.embed_query(question) for question in questions]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def train_intent_model(embedding, questions: List[str], intents: List[str]):
+    """LogisticRegression trên embedding câu hỏi (đã chuẩn hóa), cân bằng lớp vì "1" chiếm đa số."""
+    from sklearn.linear_model import LogisticRegression
+
+    model = LogisticRegression(class_weight="balanced", max_iter=1000)
+    model.fit(embed_questions(embedding, questions), intents)
+    return model
+
+
+def intent_model_payload(embedding, model) -> dict:
+    """Nội dung file joblib: model kèm tên embedding đã dùng để huấn luyện (như embedding.json của index)."""
+    return {"model": model, "embedding_model": embedding_model_name(embedding)}
+
+
+class IntentRouter:
+    """
+    Phân loại intent cục bộ trước khi gọi LLM.
+
+    Model sklearn được huấn luyện từ QAHistory (`manage.py train_intent_router`) và lưu ở
+    `model_path`; chỉ những câu hỏi có xác suất thấp hơn `threshold` mới rơi xuống
+    IntentClassifier (gpt-4o). Khi chưa có model thì luôn dùng LLM như trước.
+    """
+
+    def __init__(self, embedding, classifier, model_path: str, threshold: float = 0.9):
+        self.embedding = embedding
+        self.classifier = classifier
+        self.model_path = model_path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._model = None
+        self._model_mtime = None
+
+    def _load_model(self):
+        # Nạp lại khi file model thay đổi để huấn luyện lại không cần restart worker
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            return None
+        with self._lock:
+            if mtime != self._model_mtime:
+                try:
+                    self._model = self._check_payload(joblib.load(self.model_path))
+                except Exception as e:
+                    logger.exception(f'Cannot load intent model {self.model_path}: {e}')
+                    self._model = None
+                self._model_mtime = mtime
+            return self._model
+
+    def _check_payload(self, payload):
+        # Model học trên embedding khác (đổi provider, đổi model cùng số chiều) thì dùng LLM tới khi huấn luyện lại
+        current = embedding_model_name(self.embedding)
+        if not isinstance(payload, dict):
+            logger.warning(f'Intent model {self.model_path} has no embedding info, retrain with train_intent_router')
+            return None
+        if current is not None and payload.get("embedding_model") != current:
+            logger.warning(f'Intent model {self.model_path} was trained on {payload.get("embedding_model")}, '
+                           f'current embedding is {current}: retrain with train_intent_router')
+            return None
+        return payload["model"]
+
+    def predict(self, question: str) -> Tuple[Optional[str], float]:
+        """Trả về (intent, confidence) của model cục bộ, (None, 0.0) nếu chưa có model."""
+        model = self._load_model()
+        if model is None:
+            return None, 0.0
+        vector = np.asarray(self.embedding.embed_query(question), dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        if getattr(model, "n_features_in_", vector.shape[0]) != vector.shape[0]:
+            # Embedding không có tên (không qua _check_payload) nhưng số chiều lệch
+            return None, 0.0
+        probabilities = model.predict_proba(vector.reshape(1, -1))[0]
+        best = int(np.argmax(probabilities))
+        return str(model.classes_[best]), float(probabilities[best])
+
+    def _confident(self, intent: Optional[str], confidence: float) -> bool:
+        return intent is not None and confidence >= self.threshold
+
+    def _record(self, route: str, intent: str, confidence: float):
+        INTENT_ROUTE_REQUESTS.labels(route=route, intent=intent).inc()
+        logger.info(f'intent_route route={route} intent={intent} confidence={confidence:.3f} '
+                    f'threshold={self.threshold}')
+
+    def classify(self, question: str) -> Tuple[str, str]:
+        """(intent, route): route "local" là dự đoán của model cục bộ, "llm" là nhãn của gpt-4o."""
+        try:
+            intent, confidence = self.predict(question)
+        except Exception as e:
+            logger.exception(f'Local intent routing failed: {e}')
+            intent, confidence = None, 0.0
+
+        if self._confident(intent, confidence):
+            route = "local"
+        else:
+            route = "llm"
+            intent = self.classifier.classify(question) or "1"
+
+        self._record(route, intent, confidence)
+        return intent, route
+
+    async def aclassify(self, question: str) -> Tuple[str, str]:
+        try:
+            # Embed câu hỏi và predict của sklearn là code sync, chạy trong executor
+            intent, confidence = await run_in_executor(None, self.predict, question)
+        except Exception as e:
+            logger.exception(f'Local intent routing failed: {e}')
+            intent, confidence = None, 0.0
+
+        if self._confident(intent, confidence):
+            route = "local"
+        else:
+            route = "llm"
+            intent = await self.classifier.aclassify(question) or "1"
+
+        self._record(route, intent, confidence)
+        return intent, route
+
+
+def get_intent_router(embedding, classifier) -> IntentRouter:
+    return IntentRouter(embedding, classifier,
+                        model_path=settings.CHATBOT_INTENT_ROUTER_MODEL_PATH,
+                        threshold=settings.CHATBOT_INTENT_ROUTER_THRESHOLD)
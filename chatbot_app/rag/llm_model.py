@@ -10,5 +10,7 @@ def get_openai_llm(model_name: str = "gpt-4o",
                      model_name=model_name,
                      max_tokens=max_tokens,
                      temperature=temp,
-                     max_retries=2)
+                     max_retries=2,
+                     # Câu trả lời stream vẫn có số token (tracing)
+                     stream_usage=True)
     return llm
\ No newline at end of file
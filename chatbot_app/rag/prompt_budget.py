@@ -0,0 +1,202 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import tiktoken
+from django.conf import settings
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from chatbot_app.metrics import PROMPT_TOKENS
+
+# Các phần do VectorDB._combine_chunks ghép lại; chunk đã qua preprocess_text (chữ thường) nên nhãn viết hoa không lẫn vào nội dung
+MAIN_LABEL = "[NỘI DUNG CHÍNH]"
+BEFORE_LABEL = "[CONTEXT TRƯỚC]"
+AFTER_LABEL = "[CONTEXT SAU]"
+_PART_PATTERN = re.compile(r"\n\n(?=\[(?:CONTEXT TRƯỚC|NỘI DUNG CHÍNH|CONTEXT SAU)\]:\n)")
+
+summary_template = """
+Tóm tắt ngắn gọn (tối đa {max_words} từ, tiếng Việt) cuộc trò chuyện giữa người dùng và trợ lý tư vấn tâm lý,
+giữ lại các thông tin người dùng đã chia sẻ, vấn đề đang được hỏi và các lời khuyên đã đưa ra.
+Tóm tắt trước đó (có thể trống):
+{summary}
+Các lượt trò chuyện tiếp theo:
+{messages}
+Tóm tắt mới:
+""".strip()
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.encoding_for_model(settings.CHATBOT_PROMPT_TOKENIZER_MODEL)
+
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text)) if text else 0
+
+
+def _split_parts(doc: Document) -> List[Tuple[str, str]]:
+    """Tách nội dung đã enrich thành [(nhãn, text)], document chưa enrich là một phần chính."""
+    if not doc.metadata.get("enriched"):
+        return [(MAIN_LABEL, doc.page_content)]
+    parts = []
+    for part in _PART_PATTERN.split(doc.page_content):
+        label, _, text = part.partition(":\n")
+        parts.append((label, text))
+    return parts
+
+
+def format_messages(messages: Sequence[BaseMessage]) -> str:
+    return "\n".join(
+        f"{'Người dùng' if isinstance(message, HumanMessage) else 'Trợ lý'}: {message.content}"
+        for message in messages
+    )
+
+
+@dataclass
+class PackedPrompt:
+    context: str
+    chat_history: str
+    tokens: Dict[str, int]
+
+
+class PromptBudgeter:
+    """
+    Ghép context và lịch sử chat vào prompt trong giới hạn `max_tokens` (tính bằng tiktoken).
+
+    Context: chunk chính của các tài liệu (đã được reranker xếp hạng) vào trước theo thứ tự hạng,
+    chunk lân cận vào sau nếu còn chỗ; chunk trùng giữa các cửa sổ lân cận chỉ xuất hiện một lần.
+    Lịch sử: giữ nguyên các lượt gần nhất trong `history_tokens`, các lượt cũ hơn được thay bằng
+    bản tóm tắt (state["history_summary"], do node summarize_history tạo một lần rồi dùng lại).
+    """
+
+    def __init__(self, max_tokens: int, history_tokens: int):
+        self.max_tokens = max_tokens
+        self.history_tokens = history_tokens
+
+    def split_history(self, messages: Sequence[BaseMessage]) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+        """(các tin cũ cần tóm tắt, các tin gần nhất giữ nguyên), cắt theo cặp hỏi-đáp."""
+        messages = list(messages)
+        used = 0
+        start = len(messages)
+        for i in range(len(messages) - 2, -2, -2):
+            turn = messages[max(i, 0):start]
+            tokens = count_tokens(format_messages(turn))
+            if used + tokens > self.history_tokens:
+                break
+            used += tokens
+            start = max(i, 0)
+        return messages[:start], messages[start:]
+
+    def pack_history(self, messages: Sequence[BaseMessage], summary: str = "") -> str:
+        older, recent = self.split_history(messages)
+        lines = []
+        if older and summary:
+            lines.append(f"Tóm tắt các lượt trước: {summary}")
+        if recent:
+            lines.append(format_messages(recent))
+        return "\n".join(lines)
+
+    def pack_context(self, documents: Sequence[Document], budget: int) -> str:
+        docs = [_split_parts(doc) for doc in documents]
+        main_texts = {text for parts in docs for label, text in parts if label == MAIN_LABEL}
+
+        selected = set()
+        used = 0
+
+        def take(text: str):
+            nonlocal used
+            if text in selected:
+                return
+            # Tính cả nhãn và dấu phân cách để context không vượt ngân sách
+            tokens = count_tokens(f"{BEFORE_LABEL}:\n{text}\n\n---\n\n")
+            if used + tokens <= budget:
+                selected.add(text)
+                used += tokens
+
+        # Chunk chính theo hạng trước, rồi mới tới chunk lân cận
+        for parts in docs:
+            for label, text in parts:
+                if label == MAIN_LABEL:
+                    take(text)
+        for parts in docs:
+            for label, text in parts:
+                if label != MAIN_LABEL:
+                    take(text)
+
+        blocks = []
+        rendered = set()
+        for parts in docs:
+            block = []
+            for label, text in parts:
+                if text not in selected or text in rendered:
+                    continue
+                rendered.add(text)
+                block.append(f"{MAIN_LABEL if text in main_texts else label}:\n{text}")
+            if block:
+                blocks.append("\n\n".join(block))
+        return "\n\n---\n\n".join(blocks)
+
+    def pack(self, template: str, input: str, answer_query: str, documents, messages: Sequence[BaseMessage],
+             summary: str = "") -> PackedPrompt:
+        tokens = {
+            "template": count_tokens(template),
+            "input": count_tokens(input),
+            "answer_query": count_tokens(answer_query),
+        }
+        chat_history = self.pack_history(messages, summary)
+        tokens["chat_history"] = count_tokens(chat_history)
+
+        if isinstance(documents, str):
+            # Luồng SKTT dùng ngữ cảnh cố định
+            context = documents
+        else:
+            budget = self.max_tokens - sum(tokens.values())
+            context = self.pack_context(documents or [], max(budget, 0))
+        tokens["context"] = count_tokens(context)
+        tokens["total"] = sum(tokens.values())
+
+        for part, value in tokens.items():
+            PROMPT_TOKENS.labels(part=part).observe(value)
+        return PackedPrompt(context=context, chat_history=chat_history, tokens=tokens)
+
+
+class HistorySummarizer:
+    """Tóm tắt các lượt cũ một lần, nối tiếp bản tóm tắt trước thay vì tóm tắt lại từ đầu."""
+
+    def __init__(self, llm, budgeter: PromptBudgeter, max_words: int = 150):
+        self.budgeter = budgeter
+        self.max_words = max_words
+        self.chain = ChatPromptTemplate.from_messages([("user", summary_template)]) | llm | StrOutputParser()
+
+    def pending(self, messages: Sequence[BaseMessage], summarized_upto: Optional[str]) -> List[BaseMessage]:
+        """Các tin đã rời khỏi cửa sổ lịch sử nhưng chưa có trong bản tóm tắt."""
+        older, _ = self.budgeter.split_history(messages)
+        ids = [message.id for message in messages]
+        if summarized_upto in ids:
+            # Cửa sổ có thể nới ra sau lại khi lượt mới ngắn, khi đó không có gì mới để tóm tắt
+            return older[ids.index(summarized_upto) + 1:]
+        # Tin cuối đã tóm tắt bị checkpointer cắt khỏi lịch sử: mọi tin còn lại đều mới hơn
+        return older
+
+    def summarize(self, summary: str, messages: Sequence[BaseMessage]) -> str:
+        return self.chain.invoke({
+            "max_words": self.max_words,
+            "summary": summary or "",
+            "messages": format_messages(messages),
+        })
+
+    async def asummarize(self, summary: str, messages: Sequence[BaseMessage]) -> str:
+        return await self.chain.ainvoke({
+            "max_words": self.max_words,
+            "summary": summary or "",
+            "messages": format_messages(messages),
+        })
+
+
+def get_prompt_budgeter() -> PromptBudgeter:
+    return PromptBudgeter(max_tokens=settings.CHATBOT_PROMPT_MAX_TOKENS,
+                          history_tokens=settings.CHATBOT_PROMPT_HISTORY_TOKENS)
@@ -3,12 +3,14 @@ from langchain_core.output_parsers import StrOutputParser
 from typing import Dict, Any
 from langchain_core.runnables import RunnableLambda
 
+from .prompt_budget import get_prompt_budgeter
+
 class QuestionAnsweringChain:
     """
     Một chain (chuỗi) để trả lời câu hỏi dựa trên 'intent' (ý định) và 'context' (bối cảnh) được cung cấp.
     """
 
-    def __init__(self, llm, answer_query=None):
+    def __init__(self, llm, answer_query=None, budgeter=None):
         """
         Khởi tạo QuestionAnsweringChain.
         
@@ -17,9 +19,11 @@ class QuestionAnsweringChain:
             intent: Intent của câu hỏi (nếu có)
             answer_query: Kết quả truy vấn từ cơ sở dữ liệu (nếu có)
             entities: Các thông tin đã biết về người dùng
+            budgeter: PromptBudgeter giới hạn số token của context và lịch sử chat
         """
         self.llm = llm
         self.answer_query = answer_query or ""
+        self.budgeter = budgeter or get_prompt_budgeter()
         
 
     def create_qa_chain(self,intent: str = "1"):
@@ -41,9 +45,16 @@ class QuestionAnsweringChain:
         ])
         
         def format_input(x: Dict[str, Any]) -> Dict[str, Any]:
+            # Context đã enrich và lịch sử chat được cắt gọn theo ngân sách token
+            packed = self.budgeter.pack(template,
+                                        input=x.get("input", ""),
+                                        answer_query=x.get("answer_query") or "",
+                                        documents=x.get("context") or [],
+                                        messages=x.get("chat_history") or [],
+                                        summary=x.get("history_summary") or "")
             formatted = {
-                "context": x.get("context", ""),
-                "chat_history": x.get("chat_history", ""),
+                "context": packed.context,
+                "chat_history": packed.chat_history,
                 "answer_query": x.get("answer_query", ""),
                 "input": x.get("input", ""),
             }
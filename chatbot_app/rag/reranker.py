@@ -0,0 +1,174 @@
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+
+from .embedding_cache import text_hash
+from .tracing import record_cache, record_documents, timed
+
+RERANK_CACHE_PREFIX = "chatbot_rerank"
+
+
+class RankLLMBackend:
+    """Backend cũ: gọi gpt-4o qua rerankers (rankllm), mỗi câu hỏi một round trip tới OpenAI."""
+
+    name = "rankllm"
+
+    def __init__(self, model_name: str = "gpt-4o"):
+        from rerankers import Reranker
+        self.reranker = Reranker(model_name, model_type="rankllm", api_key=settings.OPENAI_API_KEY)
+
+    def rank(self, query: str, texts: List[str]) -> List[int]:
+        results = self.reranker.rank(query=query, docs=texts, doc_ids=list(range(len(texts))))
+        return [result.doc_id for result in results.top_k(len(texts))]
+
+
+class OnnxCrossEncoderBackend:
+    """
+    Cross-encoder chạy bằng onnxruntime trên CPU.
+
+    `model_dir` chứa `model.onnx` và `tokenizer.json` (export từ một cross-encoder của
+    HuggingFace, vd. bge-reranker hoặc mmarco-mMiniLM cho tiếng Việt).
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir: str, max_length: int = 512, batch_size: int = 16, threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length, strategy="only_second")
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(model_dir, "model.onnx"),
+                                            sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        scores = []
+        for i in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch([(query, text) for text in texts[i:i + self.batch_size]])
+            inputs = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            logits = self.session.run(None, {k: v for k, v in inputs.items() if k in self.input_names})[0]
+            # Model 1 logit (điểm liên quan) hoặc 2 logit (không liên quan / liên quan)
+            scores.append(logits[:, -1] if logits.ndim == 2 else logits)
+        return np.concatenate(scores) if scores else np.array([])
+
+    def rank(self, query: str, texts: List[str]) -> List[int]:
+        return np.argsort(-self.score(query, texts), kind="stable").tolist()
+
+
+class BM25Backend:
+    """
+    Trộn thứ hạng BM25 (tính trên tập ứng viên) với thứ hạng vector ban đầu bằng
+    weighted reciprocal rank, không cần model hay gọi mạng.
+    """
+
+    name = "bm25"
+    token_pattern = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, weight: float = 0.5, c: int = 60):
+        self.k1 = k1
+        self.b = b
+        self.weight = weight
+        self.c = c
+
+    def tokenize(self, text: str) -> List[str]:
+        return self.token_pattern.findall(text.lower())
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        corpus = [self.tokenize(text) for text in texts]
+        n = len(corpus)
+        avgdl = sum(len(doc) for doc in corpus) / n or 1
+        df = Counter(term for doc in corpus for term in set(doc))
+        scores = np.zeros(n)
+        for term in set(self.tokenize(query)):
+            if term not in df:
+                continue
+            idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+            for i, doc in enumerate(corpus):
+                tf = doc.count(term)
+                if tf:
+                    scores[i] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * len(doc) / avgdl))
+        return scores
+
+    def rank(self, query: str, texts: List[str]) -> List[int]:
+        bm25_order = np.argsort(-self.score(query, texts), kind="stable")
+        fused = np.zeros(len(texts))
+        # Danh sách đầu vào đã theo thứ tự của retriever
+        fused += (1 - self.weight) / (np.arange(1, len(texts) + 1) + self.c)
+        fused[bm25_order] += self.weight / (np.arange(1, len(texts) + 1) + self.c)
+        return np.argsort(-fused, kind="stable").tolist()
+
+
+class CachedRerankCompressor(BaseDocumentCompressor):
+    """Compressor cho ContextualCompressionRetriever, cache thứ tự theo (hash câu hỏi, id các chunk)."""
+
+    backend: object
+    k: int = 4
+    cache_ttl: int = 24 * 60 * 60
+
+    @staticmethod
+    def _doc_id(doc: Document) -> str:
+        return doc.id or text_hash(doc.page_content)
+
+    def _cache_key(self, query: str, documents: Sequence[Document]) -> str:
+        doc_ids = hashlib.sha256(",".join(self._doc_id(doc) for doc in documents).encode()).hexdigest()
+        return f"{RERANK_CACHE_PREFIX}:{self.backend.name}:{text_hash(query)}:{doc_ids}"
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+        key = self._cache_key(query, documents)
+        order = cache.get(key)
+        record_cache("rerank", hits=int(order is not None), misses=int(order is None))
+        if order is None:
+            with timed("rerank", self.backend.name):
+                order = self.backend.rank(query, [doc.page_content for doc in documents])
+            cache.set(key, order, self.cache_ttl)
+        reranked = [documents[i] for i in order[:self.k]]
+        record_documents("rerank", len(reranked))
+        return reranked
+
+
+def get_rerank_backend(name: Optional[str] = None):
+    name = name or settings.CHATBOT_RERANKER
+    if name == "rankllm":
+        return RankLLMBackend()
+    if name == "onnx":
+        return OnnxCrossEncoderBackend(settings.CHATBOT_RERANKER_ONNX_MODEL_DIR,
+                                       max_length=settings.CHATBOT_RERANKER_ONNX_MAX_LENGTH,
+                                       threads=settings.CHATBOT_RERANKER_ONNX_THREADS)
+    if name == "bm25":
+        return BM25Backend()
+    raise ValueError(f"Unknown reranker backend: {name}")
+
+
+def get_reranker(k: int = 4, name: Optional[str] = None) -> CachedRerankCompressor:
+    return CachedRerankCompressor(backend=get_rerank_backend(name),
+                                  k=k,
+                                  cache_ttl=settings.CHATBOT_RERANKER_CACHE_TTL)
@@ -0,0 +1,100 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from chatbot_app.metrics import (
+    SEMANTIC_CACHE_REQUESTS,
+    SEMANTIC_CACHE_SAVED_SECONDS,
+)
+from .index_registry import get_index_version
+
+
+@dataclass
+class CachedAnswer:
+    intent: str
+    answer: str
+    elapsed: float
+    expires_at: float
+
+
+@dataclass
+class _Partition:
+    version: Optional[int] = None
+    vectors: Optional[np.ndarray] = None
+    entries: List[CachedAnswer] = field(default_factory=list)
+
+
+class SemanticCache:
+    """
+    Cache câu trả lời theo ngữ nghĩa cho câu hỏi đầu tiên của một thread.
+
+    Câu hỏi (đã qua preprocess_text) được embed và so khớp cosine với các câu hỏi đã cache;
+    nếu độ tương đồng >= threshold thì trả lại câu trả lời cũ. Mỗi namespace index (tổ chức)
+    có phần cache riêng, tự xóa khi phiên bản FAISS index của namespace đó thay đổi.
+    """
+
+    def __init__(self, embedding, threshold: float = 0.95, ttl: int = 86400, max_entries: int = 1000):
+        self.embedding = embedding
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._partitions: Dict[Optional[str], _Partition] = {}
+
+    def embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embedding.embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _partition(self, namespace: Optional[str]) -> _Partition:
+        partition = self._partitions.setdefault(namespace, _Partition())
+        version = get_index_version(namespace)
+        if version != partition.version:
+            partition.vectors = None
+            partition.entries = []
+            partition.version = version
+        return partition
+
+    @staticmethod
+    def _evict_expired(partition: _Partition, now: float):
+        keep = [i for i, entry in enumerate(partition.entries) if entry.expires_at > now]
+        if len(keep) != len(partition.entries):
+            partition.entries = [partition.entries[i] for i in keep]
+            partition.vectors = partition.vectors[keep] if keep else None
+
+    def lookup(self, vector: np.ndarray, namespace: Optional[str] = None) -> Optional[CachedAnswer]:
+        with self._lock:
+            partition = self._partition(namespace)
+            self._evict_expired(partition, time.time())
+
+            hit = None
+            if partition.vectors is not None:
+                scores = partition.vectors @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    hit = partition.entries[best]
+
+        if hit is None:
+            SEMANTIC_CACHE_REQUESTS.labels(result='miss').inc()
+        else:
+            SEMANTIC_CACHE_REQUESTS.labels(result='hit').inc()
+            SEMANTIC_CACHE_SAVED_SECONDS.inc(hit.elapsed)
+        return hit
+
+    def store(self, vector: np.ndarray, intent: str, answer: str, elapsed: float, namespace: Optional[str] = None):
+        entry = CachedAnswer(intent=intent, answer=answer, elapsed=elapsed, expires_at=time.time() + self.ttl)
+        with self._lock:
+            partition = self._partition(namespace)
+            if partition.vectors is None:
+                partition.vectors = vector[np.newaxis, :]
+            else:
+                partition.vectors = np.vstack([partition.vectors, vector])
+            partition.entries.append(entry)
+
+            # Bỏ các entry cũ nhất khi vượt quá max_entries
+            overflow = len(partition.entries) - self.max_entries
+            if overflow > 0:
+                partition.entries = partition.entries[overflow:]
+                partition.vectors = partition.vectors[overflow:]
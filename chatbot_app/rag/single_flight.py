@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import regex as re
+from django.conf import settings
+from django.core.cache import cache
+
+from chatbot_app.metrics import SINGLE_FLIGHT_REQUESTS
+from .index_registry import get_index_version
+
+_WORD_PATTERN = re.compile(r"[\p{L}\p{N}]+")
+
+
+@dataclass
+class SharedAnswer:
+    intent: str
+    answer: str
+    elapsed: float
+
+
+def normalize_question(question: str) -> str:
+    """Câu hỏi đã qua preprocess_text, bỏ thêm dấu câu và khoảng trắng thừa để "abc?" và "abc" trùng nhau."""
+    return " ".join(_WORD_PATTERN.findall(question.lower()))
+
+
+class Flight:
+    """
+    Một lượt tham gia single-flight cho một câu hỏi.
+
+    - leader: giữ lock trên Redis, tự chạy pipeline rồi publish kết quả cho các worker khác.
+    - owner: request đầu tiên của câu hỏi trong process này; nếu không phải leader thì chờ kết quả trên Redis.
+    - còn lại: follower trong cùng process, chờ future của owner.
+    """
+
+    def __init__(self, group: "SingleFlight", key: str, future: Future, owner: bool,
+                 leader: bool = False, token: Optional[str] = None, shared: Optional[SharedAnswer] = None):
+        self.group = group
+        self.key = key
+        self.future = future
+        self.owner = owner
+        self.leader = leader
+        self.token = token
+        self.shared = shared
+        self._closed = False
+
+    @property
+    def lock_key(self):
+        return f"{self.key}:lock"
+
+    @property
+    def result_key(self):
+        return f"{self.key}:result"
+
+    def _poll_redis(self) -> Tuple[bool, Optional[SharedAnswer]]:
+        """Một lần kiểm tra Redis: (xong, kết quả). Lock mất mà không có kết quả nghĩa là leader không chia sẻ."""
+        values = cache.get_many([self.result_key, self.lock_key])
+        if self.result_key in values:
+            return True, SharedAnswer(**values[self.result_key])
+        return self.lock_key not in values, None
+
+    def wait(self) -> Optional[SharedAnswer]:
+        """Chờ kết quả của leader, None nếu là leader hoặc hết thời gian chờ (khi đó tự chạy pipeline)."""
+        if self.leader or self.shared:
+            return self._done(self.shared)
+        if not self.owner:
+            try:
+                return self._done(self.future.result(timeout=self.group.timeout))
+            except FutureTimeoutError:
+                return self._done(None)
+
+        deadline = time.monotonic() + self.group.timeout
+        while time.monotonic() < deadline:
+            finished, shared = self._poll_redis()
+            if finished:
+                return self._done(shared)
+            time.sleep(self.group.poll_interval)
+        return self._done(None)
+
+    async def await_result(self) -> Optional[SharedAnswer]:
+        if self.leader or self.shared:
+            return self._done(self.shared)
+        if not self.owner:
+            try:
+                # shield để timeout của request này không hủy future mà các request khác đang chờ
+                shared = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.future)), self.group.timeout)
+                return self._done(shared)
+            except asyncio.TimeoutError:
+                return self._done(None)
+
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.group.timeout
+        while time.monotonic() < deadline:
+            finished, shared = await loop.run_in_executor(None, self._poll_redis)
+            if finished:
+                return self._done(shared)
+            await asyncio.sleep(self.group.poll_interval)
+        return self._done(None)
+
+    def _done(self, shared: Optional[SharedAnswer]) -> Optional[SharedAnswer]:
+        if shared is not None:
+            SINGLE_FLIGHT_REQUESTS.labels(role="follower").inc()
+            if self.owner:
+                self.future.set_result(shared)
+        elif self.leader:
+            SINGLE_FLIGHT_REQUESTS.labels(role="leader").inc()
+        else:
+            SINGLE_FLIGHT_REQUESTS.labels(role="fallback").inc()
+        return shared
+
+    def publish(self, intent: str, answer: str, elapsed: float):
+        """Chia sẻ câu trả lời cho các request đang chờ (chỉ gọi với câu trả lời dùng chung được)."""
+        shared = SharedAnswer(intent=intent, answer=answer, elapsed=elapsed)
+        if self.leader:
+            cache.set(self.result_key, shared.__dict__, timeout=self.group.result_ttl)
+        if self.owner and not self.future.done():
+            self.future.set_result(shared)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.leader and cache.get(self.lock_key) == self.token:
+            cache.delete(self.lock_key)
+        if self.owner:
+            # Leader lỗi hoặc không chia sẻ câu trả lời: follower không chờ đến hết timeout mà tự chạy
+            if not self.future.done():
+                self.future.set_result(None)
+            self.group.release(self.key, self.future)
+
+
+class SingleFlight:
+    """
+    Gộp các request cùng một câu hỏi đầu tiên đang chạy đồng thời thành một lần chạy pipeline.
+
+    Trong một process, các request chờ chung một Future; giữa các worker uvicorn, request đầu tiên
+    giữ lock trên Redis (cache.add) và ghi câu trả lời vào result key, worker khác poll key này.
+    Follower chờ tối đa `timeout` giây rồi tự chạy pipeline. Khóa gắn với namespace và version index
+    để không chia sẻ câu trả lời giữa các tổ chức hoặc dựa trên tài liệu cũ.
+    """
+
+    def __init__(self, timeout: float = 30.0, result_ttl: int = 30, poll_interval: float = 0.2):
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def key(self, question: str, namespace: Optional[str] = None) -> str:
+        digest = hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+        return f"chatbot_single_flight:{namespace or 'default'}:{get_index_version(namespace)}:{digest}"
+
+    def begin(self, question: str, namespace: Optional[str] = None) -> Flight:
+        key = self.key(question, namespace)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return Flight(self, key, future, owner=False)
+            future = Future()
+            self._inflight[key] = future
+
+        flight = Flight(self, key, future, owner=True)
+        # Leader vừa xong trên worker khác: dùng luôn kết quả còn trong result key
+        result = cache.get(flight.result_key)
+        if result is not None:
+            flight.shared = SharedAnswer(**result)
+            return flight
+
+        token = uuid.uuid4().hex
+        # Lock hết hạn cùng lúc với timeout của follower để leader chết không giữ lock mãi
+        if cache.add(flight.lock_key, token, timeout=int(self.timeout) + 1):
+            flight.leader = True
+            flight.token = token
+        return flight
+
+    def release(self, key: str, future: Future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+
+def get_single_flight() -> SingleFlight:
+    return SingleFlight(timeout=settings.CHATBOT_SINGLE_FLIGHT_TIMEOUT,
+                        result_ttl=settings.CHATBOT_SINGLE_FLIGHT_RESULT_TTL,
+                        poll_interval=settings.CHATBOT_SINGLE_FLIGHT_POLL_INTERVAL)
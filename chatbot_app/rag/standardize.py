@@ -1,6 +1,9 @@
+import string
 import unicodedata
+from functools import lru_cache
+from typing import List
+
 import regex as re
-from pyvi import ViTokenizer, ViPosTagger
 
 bang_nguyen_am= [['a', 'à', 'á', 'ả', 'ã', 'ạ', 'a'],
                   ['ă', 'ằ', 'ắ', 'ẳ', 'ẵ', 'ặ', 'aw'],
@@ -22,6 +25,12 @@ for i in range(len(bang_nguyen_am)):
     for j in range(len(bang_nguyen_am[i]) - 1):
         nguyen_am_to_ids[bang_nguyen_am[i][j]] = (i, j)
 
+# Tiếng Việt chỉ có vài nghìn âm tiết nên cache kết quả chuẩn hóa theo từ (kèm dấu câu dính liền)
+WORD_CACHE_SIZE = 65536
+_WORD_PATTERN = re.compile(r'(^\p{P}*)([p{L}.]*\p{L}+)(\p{P}*$)')
+# Xóa các nguyên âm mang dấu thanh: từ không đổi độ dài sau translate thì không có dấu để đặt lại
+_REMOVE_TONED_VOWELS = str.maketrans('', '', ''.join(row[j] for row in bang_nguyen_am for j in range(1, 6)))
+
 # Chuẩn hóa unicode 
 # Có 2 loại unicode : unicode tổ hơp và unicode dựng sẵn, điêu này dẫn tới việc 2 từ giống nhau sẽ bị coi là khác nhau 
 # Chuẩn hóa tất cả về 1 loại là unicode dựng sẵn
@@ -127,19 +136,95 @@ def standardize_vietnamese_sentence(sentence):
     sentence = sentence.lower()
     words = sentence.split()
     for index, word in enumerate(words):
-        cw = re.sub(r'(^\p{P}*)([p{L}.]*\p{L}+)(\p{P}*$)', r'\1/\2/\3', word).split('/')
-        # print(cw)
-        if len(cw) == 3:
-            cw[1] = standardize_vietnamese_word(cw[1])
-        words[index] = ''.join(cw)
+        # Fast path: không có dấu thanh thì standardize_vietnamese_word trả về nguyên từ,
+        # và không có '/' thì tách/ghép lại cũng ra đúng từ gốc
+        if '/' not in word and len(word.translate(_REMOVE_TONED_VOWELS)) == len(word):
+            continue
+        words[index] = _standardize_token(word)
     return ' '.join(words)
 
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def _standardize_token(word):
+    cw = _WORD_PATTERN.sub(r'\1/\2/\3', word).split('/')
+    if len(cw) == 3:
+        cw[1] = standardize_vietnamese_word(cw[1])
+    return ''.join(cw)
+
 # Tách từ tiếng việt, từ tiếng việt không giống như tiếng anh, tách từ tiếng anh ta chỉ cần tách bằng khoảng trắng
 # Tuy nhiên từ tiếng Việt có cả từ đơn lẫn từ ghép nên tách từ tiêng Việt sẽ phúc tạp hơn 
 # Project sử dung thu viện pyvi (xem mã nguồn tại : https://github.com/trungtv/pyvi) để phục vụ bài toán con tách từ Tiếng Việt 
 def tokenize_vietnamese(text):
-	text = ViTokenizer.tokenize(text)
-	return text
+	return tokenize_vietnamese_batch([text])[0]
+
+
+@lru_cache(maxsize=1)
+def _vi_tokenizer():
+    """Class bên trong module pyvi.ViTokenizer, giữ model CRF và từ điển bi/tri-gram (nạp mất ~1s nên để tới lần tách từ đầu tiên)."""
+    from pyvi import ViTokenizer
+    return ViTokenizer.ViTokenizer
+
+
+def _sent2features(tokens):
+    """Giống ViTokenizer.sent2features nhưng chỉ tính lower/istitle/isupper của mỗi âm tiết một lần."""
+    lowers = [token.lower() for token in tokens]
+    titles = [token.istitle() for token in tokens]
+    uppers = [token.isupper() for token in tokens]
+    tokenizer = _vi_tokenizer()
+    bi_grams, tri_grams = tokenizer.bi_grams, tokenizer.tri_grams
+    n = len(tokens)
+    features = []
+    for i, word in enumerate(tokens):
+        f = {
+            'bias': 1.0,
+            'word.lower()': lowers[i],
+            'word.isupper()': uppers[i],
+            'word.istitle()': titles[i],
+            'word.isdigit()': word.isdigit(),
+        }
+        if i > 0:
+            f['-1:word.lower()'] = lowers[i - 1]
+            f['-1:word.istitle()'] = titles[i - 1]
+            f['-1:word.isupper()'] = uppers[i - 1]
+            f['-1:word.bi_gram()'] = ' '.join([tokens[i - 1], word]).lower() in bi_grams
+            if i > 1:
+                f['-2:word.tri_gram()'] = ' '.join([tokens[i - 2], tokens[i - 1], word]).lower() in tri_grams
+        if i < n - 1:
+            f['+1:word.lower()'] = lowers[i + 1]
+            f['+1:word.istitle()'] = titles[i + 1]
+            f['+1:word.isupper()'] = uppers[i + 1]
+            f['+1:word.bi_gram()'] = ' '.join([word, tokens[i + 1]]).lower() in bi_grams
+            if i < n - 2:
+                f['+2:word.tri_gram()'] = ' '.join([word, tokens[i + 1], tokens[i + 2]]).lower() in tri_grams
+        features.append(f)
+    return features
+
+
+def tokenize_vietnamese_batch(texts: List[str]) -> List[str]:
+    """Như ViTokenizer.tokenize cho nhiều đoạn văn, gọi CRF một lần cho cả lô."""
+    tokenizer = _vi_tokenizer()
+    syllables = [tokenizer.sylabelize(text)[1] for text in texts]
+    non_empty = [tokens for tokens in syllables if tokens]
+    labels = iter(tokenizer.model.predict([_sent2features(tokens) for tokens in non_empty]) if non_empty else [])
+
+    outputs = []
+    for text, tmp in zip(texts, syllables):
+        if not tmp:
+            outputs.append(text)
+            continue
+        tags = next(labels)
+        parts = [tmp[0]]
+        for i in range(1, len(tags)):
+            if tags[i] == 'I_W' and tmp[i] not in string.punctuation and \
+                    tmp[i - 1] not in string.punctuation and \
+                    not tmp[i][0].isdigit() and not tmp[i - 1][0].isdigit() \
+                    and not (tmp[i][0].istitle() and not tmp[i - 1][0].istitle()):
+                parts.append('_')
+            else:
+                parts.append(' ')
+            parts.append(tmp[i])
+        outputs.append(''.join(parts))
+    return outputs
 
 # Đưa về chữ viết thường 
 def to_lowercase(text):
@@ -147,12 +232,13 @@ def to_lowercase(text):
 
 
 def preprocess_text(text):
-	text = standardize_unicode(text)
-	text = standardize_vietnamese_sentence(text)
-	text = tokenize_vietnamese(text)
-	text = to_lowercase(text)
+	return preprocess_texts([text])[0]
 
-	return text
+
+def preprocess_texts(texts: List[str]) -> List[str]:
+	"""preprocess_text cho nhiều đoạn (các trang PDF), tách từ pyvi theo lô."""
+	texts = [standardize_vietnamese_sentence(standardize_unicode(text)) for text in texts]
+	return [to_lowercase(text) for text in tokenize_vietnamese_batch(texts)]
 
 if __name__ == "__main__":
     file = open("D:/Desktop/output_chunks_1.txt", "r", encoding="utf-8")
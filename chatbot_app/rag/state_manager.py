@@ -1,5 +1,5 @@
 from typing_extensions import Annotated, TypedDict
-from typing import Sequence
+from typing import Optional, Sequence
 from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
 
@@ -11,6 +11,13 @@ class StateManager(TypedDict):
     answer_query: str
     answer: str
     current_intent: str
+    # Nguồn của current_intent trong lượt này: "local" (model cục bộ), "llm", "" nếu không phân loại (SKTT)
+    intent_route: str
     is_sktt: bool
     user_id: int
-    result: dict
\ No newline at end of file
+    result: dict
+    # Tóm tắt các lượt chat đã rời khỏi cửa sổ lịch sử và id của tin cuối đã được tóm tắt
+    history_summary: str
+    history_summary_upto: str
+    # Namespace index của tổ chức người hỏi (None: index chung)
+    namespace: Optional[str]
\ No newline at end of file
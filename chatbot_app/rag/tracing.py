@@ -0,0 +1,233 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.callbacks.manager import dispatch_custom_event
+
+from chatbot_app.metrics import (
+    CACHE_LOOKUPS,
+    LLM_TOKENS,
+    REQUEST_SECONDS,
+    RETRIEVED_DOCUMENTS,
+    STAGE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Tên custom event mà embedding, FAISS và reranker gửi lên callback của request đang chạy
+TRACE_EVENT = "chatbot_trace"
+
+
+def _dispatch(data: dict):
+    try:
+        dispatch_custom_event(TRACE_EVENT, data)
+    except RuntimeError:
+        # Ngoài pipeline (ingestion, semantic cache trước graph): chỉ ghi Prometheus
+        pass
+
+
+def record_stage(kind: str, name: str, seconds: float):
+    """Thời gian của một bước không tự phát callback LangChain (embedding, FAISS, rerank)."""
+    STAGE_SECONDS.labels(kind=kind, name=name).observe(seconds)
+    _dispatch({"type": "stage", "kind": kind, "name": name, "seconds": seconds})
+
+
+def record_cache(cache: str, hits: int, misses: int):
+    if hits:
+        CACHE_LOOKUPS.labels(cache=cache, result="hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache=cache, result="miss").inc(misses)
+    _dispatch({"type": "cache", "cache": cache, "hits": hits, "misses": misses})
+
+
+def record_documents(stage: str, count: int):
+    RETRIEVED_DOCUMENTS.labels(stage=stage).observe(count)
+    _dispatch({"type": "documents", "stage": stage, "count": count})
+
+
+@contextmanager
+def timed(kind: str, name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(kind, name, time.perf_counter() - started)
+
+
+def _token_usage(response) -> tuple:
+    """(prompt, completion) từ LLMResult: usage_metadata của message (cả khi stream), không thì llm_output."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class RequestTracer(BaseCallbackHandler):
+    """
+    Callback của một câu hỏi: đo từng node LangGraph, từng lần gọi LLM (kèm token) và retriever,
+    gom thêm custom event của embedding/FAISS/rerank, rồi ghi một dòng log JSON khi request kết thúc.
+    """
+
+    # Chạy ngay trong thread/event loop gọi callback, không đẩy sang executor
+    run_inline = True
+
+    def __init__(self, method: str, **fields):
+        self.method = method
+        self.fields = fields
+        self.route = "pipeline"
+        self.started = time.perf_counter()
+        self._runs = {}
+        self._lock = threading.Lock()
+        self.stages = defaultdict(lambda: defaultdict(float))
+        self.llm_calls = 0
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.cache = defaultdict(lambda: {"hit": 0, "miss": 0})
+        self.documents = {}
+
+    def config(self, config: dict) -> dict:
+        """Bản sao config có thêm callback này, các callback sẵn có được giữ nguyên."""
+        return {**config, "callbacks": [*(config.get("callbacks") or []), self]}
+
+    def add_stage(self, kind: str, name: str, seconds: float):
+        with self._lock:
+            self.stages[kind][name] += seconds
+
+    @contextmanager
+    def stage(self, kind: str, name: str):
+        """Đo một bước ngoài graph (semantic cache, chờ single-flight) của request này."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            STAGE_SECONDS.labels(kind=kind, name=name).observe(seconds)
+            self.add_stage(kind, name, seconds)
+
+    def _start(self, run_id, kind: str, name: str):
+        self._runs[run_id] = (kind, name, time.perf_counter())
+
+    def _finish(self, run_id) -> Optional[tuple]:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        kind, name, started = run
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.labels(kind=kind, name=name).observe(seconds)
+        self.add_stage(kind, name, seconds)
+        return kind, name
+
+    # --- node LangGraph ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Runnable con trong node cũng mang metadata langgraph_node (và trùng tên khi hàm cùng tên node),
+        # chỉ đo run của chính node
+        if node and kwargs.get("name") == node and not node.startswith("__") and parent_run_id not in self._runs:
+            self._start(run_id, "node", node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    # --- LLM ---
+
+    def _start_llm(self, run_id, metadata, kwargs):
+        model = (metadata or {}).get("ls_model_name") or kwargs.get("name") or "llm"
+        self._start(run_id, "llm", model)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start_llm(run_id, metadata, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start_llm(run_id, metadata, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._finish(run_id)
+        if run is None:
+            return
+        prompt_tokens, completion_tokens = _token_usage(response)
+        LLM_TOKENS.labels(model=run[1], type="prompt").observe(prompt_tokens)
+        LLM_TOKENS.labels(model=run[1], type="completion").observe(completion_tokens)
+        with self._lock:
+            self.llm_calls += 1
+            self.tokens["prompt"] += prompt_tokens
+            self.tokens["completion"] += completion_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    # --- retriever ---
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "retriever", kwargs.get("name") or "retriever")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        run = self._finish(run_id)
+        if run is not None:
+            RETRIEVED_DOCUMENTS.labels(stage=run[1]).observe(len(documents))
+            self.documents[run[1]] = len(documents)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    # --- embedding, FAISS, rerank (record_*) ---
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        if name != TRACE_EVENT:
+            return
+        if data["type"] == "stage":
+            self.add_stage(data["kind"], data["name"], data["seconds"])
+        elif data["type"] == "cache":
+            with self._lock:
+                self.cache[data["cache"]]["hit"] += data["hits"]
+                self.cache[data["cache"]]["miss"] += data["misses"]
+        elif data["type"] == "documents":
+            self.documents[data["stage"]] = data["count"]
+
+    def summary(self, seconds: float) -> dict:
+        return {
+            "method": self.method,
+            "route": self.route,
+            **self.fields,
+            "seconds": round(seconds, 3),
+            "stages": {kind: {name: round(value, 3) for name, value in names.items()}
+                       for kind, names in self.stages.items()},
+            "llm_calls": self.llm_calls,
+            "tokens": self.tokens,
+            "cache": dict(self.cache),
+            "documents": self.documents,
+        }
+
+
+@contextmanager
+def trace_request(method: str, config: dict, **fields):
+    """
+    Đo một câu hỏi từ đầu tới cuối: `tracer.config(config)` cho graph, `tracer.route` đặt theo nhánh trả lời.
+    Ghi chatbot_request_seconds và một dòng log `chatbot_request {...}` kể cả khi pipeline lỗi.
+    """
+    thread_id = (config.get("configurable") or {}).get("thread_id")
+    tracer = RequestTracer(method, thread_id=thread_id, **fields)
+    try:
+        yield tracer
+    except (GeneratorExit, asyncio.CancelledError):
+        # Client ngắt stream hoặc hủy request
+        tracer.route = "cancelled"
+        raise
+    except BaseException:
+        tracer.route = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - tracer.started
+        REQUEST_SECONDS.labels(method=method, route=tracer.route).observe(seconds)
+        logger.info("chatbot_request " + json.dumps(tracer.summary(seconds), ensure_ascii=False, default=str))
@@ -1,27 +1,147 @@
+import json
+import logging
 import os
-from typing import List
-from langchain.retrievers import EnsembleRetriever, ContextualCompressionRetriever
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+import faiss
+import numpy as np
+from langchain.retrievers import ContextualCompressionRetriever
 from langchain_core.retrievers import BaseRetriever
-from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.callbacks.manager import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
 from langchain_community.vectorstores import FAISS
-from langchain_openai.embeddings import OpenAIEmbeddings
 from langchain_core.documents import Document
 from django.conf import settings
 
-from rerankers import Reranker
+from .embedding_provider import OPENAI_EMBEDDING_MODEL, get_embedding, is_openai_embedding
+from .batch_embedding import embed_concurrently
+from .hybrid_retriever import HybridRetriever
+from .reranker import get_reranker
+from .index_registry import get_index_version
+from .index_factory import build_index, ensure_stable_ids, index_type_of, prepare_index, supports_remove, vectors_for
+from .docstore import DocstoreIdMap, SQLiteDocstore, migrate_pickle_docstore
+from .tracing import record_stage
+
+logger = logging.getLogger(__name__)
 
 vector_db_path = os.path.join(settings.BASE_DIR, "chatbot_app", "indexes")
 
 
+def index_dir(namespace: Optional[str] = None) -> str:
+    """Thư mục index của namespace (org_<id>); index chung cũ nằm ngay ở chatbot_app/indexes."""
+    return os.path.join(vector_db_path, namespace) if namespace else vector_db_path
+
+
+def index_exists(namespace: Optional[str] = None) -> bool:
+    return os.path.exists(os.path.join(index_dir(namespace), "index.faiss"))
+
+
+# Nạp lại index ở background, một luồng để các lần nạp không chồng lên nhau
+_reload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-reload")
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """
+    Một phiên bản FAISS index đã nạp xong, không bị thay thế giữa chừng một lượt tìm kiếm.
+    db là None khi worker chỉ đọc chưa thấy index nào (chờ ingestion tạo).
+    """
+    version: int
+    db: Optional[FAISS]
+
+
 class VectorDB:
     def __init__(self,
                  vector_db=FAISS,
-                 embedding=OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY,
-                                            model="text-embedding-3-large")):
+                 embedding=None,
+                 writable: bool = False,
+                 namespace: Optional[str] = None,
+                 verify_embedding: bool = True):
         self.vector_db = vector_db
-        self.embedding = embedding
-        self.db = self._load_or_initialize_db()
-        self.reranker = Reranker('gpt-4o', model_type="rankllm", api_key = settings.OPENAI_API_KEY)
+        # Provider chọn qua settings.CHATBOT_EMBEDDING_PROVIDER (openai | onnx)
+        self.embedding = embedding or get_embedding()
+        # Mỗi tổ chức một index riêng (index_registry.index_namespace), None là index chung
+        self.namespace = namespace
+        self.path = index_dir(namespace)
+        self.index_faiss_path = os.path.join(self.path, "index.faiss")
+        # Nội dung + metadata của chunk, thay cho index.pkl (chỉ còn dùng để chuyển đổi một lần)
+        self.docstore_path = os.path.join(self.path, "docstore.sqlite3")
+        self.legacy_pickle_path = os.path.join(self.path, "index.pkl")
+        # Embedding đã dùng để dựng index, vector của provider khác không tìm chung được
+        self.embedding_info_path = os.path.join(self.path, "embedding.json")
+        # Worker phục vụ request mở index chỉ đọc (mmap); ingestion/migrate_index cần writable=True
+        self.writable = writable
+        # reindex_embeddings mở index cũ bằng embedding mới nên bỏ qua kiểm tra
+        self.verify_embedding = verify_embedding
+        self.snapshot = self._load_snapshot()
+        # Backend chọn qua settings.CHATBOT_RERANKER (rankllm | onnx | bm25)
+        self.reranker = get_reranker(k=4)
+        self._reload_lock = threading.Lock()
+        self._reload_future: Optional[Future] = None
+        self._version_checked_at = time.monotonic()
+
+    @property
+    def db(self) -> Optional[FAISS]:
+        return self.snapshot.db
+
+    def _load_snapshot(self, initialize: bool = True) -> IndexSnapshot:
+        # Đọc version trước khi đọc file: nếu index đổi trong lúc nạp thì lần kiểm tra sau vẫn thấy version mới
+        version = get_index_version(self.namespace)
+        db = self._load_or_initialize_db(initialize=initialize)
+        if db is not None:
+            # Index HNSW/IVF (migrate_index) cần đặt lại efSearch/nprobe sau khi nạp
+            prepare_index(db.index, nprobe=settings.CHATBOT_FAISS_NPROBE, ef_search=settings.CHATBOT_FAISS_EF_SEARCH)
+        return IndexSnapshot(version=version, db=db)
+
+    def reload(self) -> Future:
+        """
+        Nạp index từ đĩa ở background rồi đổi snapshot, các request đang chạy vẫn dùng bản cũ.
+        Nhiều lần gọi liên tiếp khi chưa bắt đầu nạp được gộp thành một.
+        """
+        with self._reload_lock:
+            if self._reload_future is None or self._reload_future.running() or self._reload_future.done():
+                self._reload_future = _reload_executor.submit(self._reload)
+            return self._reload_future
+
+    def ensure_current(self):
+        """
+        So version đang phục vụ với version trên Redis (tối đa mỗi CHATBOT_INDEX_VERSION_CHECK_INTERVAL giây),
+        nếu worker khác đã thêm/xóa tài liệu thì nạp lại ở background. Request hiện tại vẫn dùng bản cũ.
+        """
+        now = time.monotonic()
+        if now - self._version_checked_at < settings.CHATBOT_INDEX_VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked_at = now
+        try:
+            version = get_index_version(self.namespace)
+        except Exception as e:
+            print(f"[ERROR] Không đọc được index version: {e}")
+            return
+        if version != self.snapshot.version:
+            self.reload()
+
+    def _reload(self) -> IndexSnapshot:
+        try:
+            snapshot = self._load_snapshot(initialize=False)
+        except Exception as e:
+            print(f"[ERROR] Không nạp lại được index, giữ phiên bản {self.snapshot.version}: {e}")
+            raise
+        # Gán một tham chiếu nên việc đổi snapshot là nguyên tử
+        self.snapshot = snapshot
+        print(f"[DEBUG] Đã nạp index {self.namespace or 'chung'} phiên bản {snapshot.version}: "
+              f"{snapshot.db.index.ntotal} chunks")
+        return snapshot
+
+    def _open_store(self, index: faiss.Index, writable: bool) -> FAISS:
+        docstore = SQLiteDocstore(self.docstore_path, read_only=not writable)
+        return self.vector_db(embedding_function=self.embedding,
+                              index=index,
+                              docstore=docstore,
+                              index_to_docstore_id=DocstoreIdMap(docstore))
 
     def _initialize_index(self):
         empty_content = " "
@@ -29,77 +149,233 @@ class VectorDB:
             page_content=empty_content,
             metadata={"id": "empty", "page": 1, "source": "empty.pdf"}
         )]
-        db = self.vector_db.from_documents(documents=documents, embedding=self.embedding)
-        db.save_local(vector_db_path)
-        return db
+        vectors = np.asarray(self.embedding.embed_documents([empty_content]), dtype=np.float32)
+        self.write_embedding_info(vectors.shape[1])
+        db = self._open_store(faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1])), writable=True)
+        self._add_documents(db, documents, vectors)
+        self._save(db)
 
-    def _load_or_initialize_db(self):
-        """Load existing index or initialize if not found."""
-        os.makedirs(vector_db_path, exist_ok=True)
+    def _load_or_initialize_db(self, initialize: bool = True) -> Optional[FAISS]:
+        """Load existing index or initialize if not found (chỉ process ghi); worker chỉ đọc nhận None."""
+        if not os.path.exists(self.index_faiss_path):
+            # Khi nạp lại không được tạo index rỗng đè lên index đang có
+            if not initialize:
+                raise FileNotFoundError(self.index_faiss_path)
+            # Chỉ một process ghi (ingestion, lệnh quản trị) được tạo index; các worker uvicorn cùng tạo
+            # lúc deploy mới sẽ ghi đè index.faiss và docstore của nhau. Worker chỉ đọc trả kết quả rỗng
+            # tới khi ingestion tăng version (ensure_current)
+            if not self.writable:
+                return None
+            os.makedirs(self.path, exist_ok=True)
+            self._initialize_index()
 
-        index_faiss = os.path.join(vector_db_path, "index.faiss")
-        index_pkl = os.path.join(vector_db_path, "index.pkl")
+        # faiss 1.9 map trực tiếp inverted lists của index IVF (migrate_index --type ivf_flat/ivf_pq),
+        # các worker dùng chung page cache; index flat/HNSW vẫn được đọc vào heap
+        flags = 0 if self.writable else faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(self.index_faiss_path, flags)
+        self._check_embedding(index)
+        if not self.writable:
+            self._warn_if_not_mapped(index)
 
-        if os.path.exists(index_faiss) and os.path.exists(index_pkl):
-            try:
-                db = self.vector_db.load_local(vector_db_path,
-                                               embeddings=self.embedding,
-                                               allow_dangerous_deserialization=True)
-            except Exception as e:
-                db = self._initialize_index()
-        else:
-            db = self._initialize_index()
+        if not os.path.exists(self.docstore_path):
+            migrate_pickle_docstore(self.legacy_pickle_path, self.docstore_path, index.ntotal)
 
-        return db
+        if self.writable:
+            # Index cũ dùng vị trí làm id, chuyển sang IDMap2 để thêm/xóa không làm lệch id của chunk khác
+            index = ensure_stable_ids(index)
+        # Chunk đã commit nhưng index.faiss chưa kịp ghi (tiến trình bị dừng giữa chừng) không có vector
+        # nên không bao giờ được tìm thấy, không cần dọn
+        return self._open_store(index, writable=self.writable)
 
+    def index_embedding_model(self) -> str:
+        """Model embedding ghi cạnh index; index dựng trước khi có embedding.json đều dùng OpenAI."""
+        try:
+            with open(self.embedding_info_path) as f:
+                return json.load(f)["model"]
+        except FileNotFoundError:
+            return OPENAI_EMBEDDING_MODEL
 
-    def add_data(self, new_documents):
-        if not new_documents:
+    def write_embedding_info(self, dimension: int):
+        model = getattr(self.embedding, "model", None)
+        if model is None:
+            return
+        tmp_path = f"{self.embedding_info_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"model": model, "dimension": int(dimension)}, f)
+        os.replace(tmp_path, self.embedding_info_path)
+
+    def _check_embedding(self, index: faiss.Index):
+        # Embedding truyền thẳng vào (script, benchmark) không có tên model thì không kiểm tra
+        model = getattr(self.embedding, "model", None)
+        if model is None or not self.verify_embedding:
+            return
+        recorded = self.index_embedding_model()
+        if recorded != model:
+            raise ValueError(
+                f"Index {self.path} ({index.d} chiều) được dựng bằng embedding {recorded}, không dùng được với "
+                f"{model}: chạy manage.py reindex_embeddings hoặc đổi lại CHATBOT_EMBEDDING_PROVIDER"
+            )
+
+    def _add_documents(self, db: FAISS, documents: List[Document], vectors: np.ndarray, document_id: Optional[int] = None):
+        ids = db.docstore.insert([str(uuid.uuid4()) for _ in documents], documents, document_id=document_id)
+        db.index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+
+    def _remove_document(self, db: FAISS, document_id: int, source: Optional[str] = None) -> int:
+        """Xóa chunk của Document khỏi docstore (chưa commit) và khỏi index nếu loại index cho phép."""
+        ids = db.docstore.delete_document(document_id, source)
+        if ids and supports_remove(db.index):
+            db.index.remove_ids(np.asarray(ids, dtype=np.int64))
+        # HNSW: vector vẫn nằm trong index nhưng không còn nội dung trong docstore (tombstone)
+        return len(ids)
+
+    def _warn_if_not_mapped(self, index: faiss.Index):
+        index_type = index_type_of(index)
+        if index_type.startswith("ivf") or index.ntotal < settings.CHATBOT_FAISS_IVF_MIN_VECTORS:
+            return
+        logger.warning(
+            f"Index {self.namespace or 'chung'} là {index_type} với {index.ntotal} vector: được đọc vào heap của "
+            f"mọi worker thay vì mmap, chạy manage.py migrate_index --type ivf_flat để dùng chung page cache"
+        )
+
+    def _convert_if_needed(self, db: FAISS):
+        """
+        Index mới luôn là flat (IVF không train được trên vài vector); khi đủ CHATBOT_FAISS_IVF_MIN_VECTORS
+        thì dựng lại thành CHATBOT_FAISS_INDEX_TYPE (IVF) để worker chỉ đọc mmap thay vì nạp vào heap.
+        """
+        index_type = settings.CHATBOT_FAISS_INDEX_TYPE
+        # Chỉ đổi index flat; HNSW là loại được chọn bằng migrate_index nên giữ nguyên
+        if not index_type.startswith("ivf") or index_type_of(db.index) != "flat":
+            return
+        if db.index.ntotal < settings.CHATBOT_FAISS_IVF_MIN_VECTORS:
+            return
+        # Như compact: bỏ chunk đã commit nhưng chưa có vector
+        in_index = set(faiss.vector_to_array(db.index.id_map).tolist())
+        ids = [i for i in db.docstore.faiss_ids() if i in in_index]
+        ntotal = db.index.ntotal
+        db.index = build_index(index_type, vectors_for(db.index, ids), ids=ids,
+                               nlist=settings.CHATBOT_FAISS_NLIST or None,
+                               hnsw_m=settings.CHATBOT_FAISS_HNSW_M,
+                               pq_m=settings.CHATBOT_FAISS_PQ_M)
+        logger.info(f"Đã chuyển index {self.namespace or 'chung'} từ flat sang {index_type} ({ntotal} vector)")
+
+    def _compact_if_needed(self, db: FAISS):
+        """Dựng lại index từ các vector còn sống khi tỷ lệ tombstone vượt CHATBOT_INDEX_COMPACT_RATIO."""
+        ntotal = db.index.ntotal
+        # Flat/IVF đã remove_ids trực tiếp, chỉ HNSW mới tích tombstone
+        if not ntotal or supports_remove(db.index):
+            return
+        # Bỏ các chunk đã commit nhưng chưa có vector (tiến trình dừng trước khi ghi index.faiss)
+        in_index = set(faiss.vector_to_array(db.index.id_map).tolist())
+        ids = [i for i in db.docstore.faiss_ids() if i in in_index]
+        if (ntotal - len(ids)) / ntotal <= settings.CHATBOT_INDEX_COMPACT_RATIO:
+            return
+        index_type = index_type_of(db.index)
+        # Vector lấy lại từ index hiện có nên không phải embed lại tài liệu nào
+        db.index = build_index(index_type, vectors_for(db.index, ids), ids=ids,
+                               nlist=settings.CHATBOT_FAISS_NLIST or None,
+                               hnsw_m=settings.CHATBOT_FAISS_HNSW_M,
+                               pq_m=settings.CHATBOT_FAISS_PQ_M)
+        print(f"[DEBUG] Đã compact index {index_type}: {ntotal} -> {db.index.ntotal} vector")
+
+    def _save(self, db: FAISS = None):
+        db = db or self.db
+        # Commit docstore trước: nếu dừng trước khi ghi index thì chunk mới chỉ là dòng không có vector
+        # và chunk đã xóa thành tombstone, cả hai đều không bao giờ được trả về
+        db.docstore.commit()
+        # Ghi ra file tạm rồi thay thế để worker khác không nạp phải file ghi dở
+        tmp_path = f"{self.index_faiss_path}.tmp"
+        faiss.write_index(db.index, tmp_path)
+        os.replace(tmp_path, self.index_faiss_path)
+
+    def memory_bytes(self) -> int:
+        """Ước lượng dung lượng index trong worker bằng kích thước file index.faiss (IndexPool dùng để evict)."""
+        try:
+            return os.path.getsize(self.index_faiss_path)
+        except OSError:
+            return 0
+
+    def embed_documents(self, documents: List[Document]) -> np.ndarray:
+        """Embed theo batch lớn, song song (CHATBOT_INGEST_EMBED_*), trong rate limit nếu provider là OpenAI."""
+        return embed_concurrently(self.embedding.embed_documents,
+                                  [doc.page_content for doc in documents],
+                                  batch_size=settings.CHATBOT_INGEST_EMBED_BATCH_SIZE,
+                                  concurrency=settings.CHATBOT_INGEST_EMBED_CONCURRENCY,
+                                  rate_limited=is_openai_embedding(self.embedding))
+
+    def merge_documents(self, documents: List[Document], vectors: np.ndarray,
+                        document_id: Optional[int] = None, replace: bool = False) -> bool:
+        """
+        Gộp chunk đã embed vào index một lần rồi ghi file. replace=True (upload lại cùng file) xóa chunk cũ
+        của Document trong cùng transaction docstore, nên worker khác chỉ thấy bản cũ hoặc bản mới.
+        """
+        try:
+            if replace and document_id is not None:
+                removed = self._remove_document(self.db, document_id, documents[0].metadata.get("source"))
+                print(f"[DEBUG] Thay {removed} chunks cũ của document {document_id}")
+            self._add_documents(self.db, documents, vectors, document_id=document_id)
+            if replace:
+                self._compact_if_needed(self.db)
+            self._convert_if_needed(self.db)
+        except Exception as e:
+            print(f"[ERROR] Lỗi khi thêm documents vào index: {e}")
+            self.db.docstore.rollback()
             return False
-        
-        batch_size = 5
-        total_docs = len(new_documents)
-        
-        for i in range(0, total_docs, batch_size):
-            batch = new_documents[i:i + batch_size]
-            try:
-                self.db.add_documents(documents=batch)
-                print(f"[DEBUG] Đã thêm batch {i//batch_size + 1}: {len(batch)} documents")
-            except Exception as e:
-                print(f"[ERROR] Lỗi khi thêm batch {i//batch_size + 1}: {e}")
-                return False
-        
-        # Save sau khi thêm tất cả batch
-        self.db.save_local(vector_db_path)
-        print(f"[DEBUG] Hoàn thành thêm {total_docs} documents vào vector store")
+
+        self._save()
+        print(f"[DEBUG] Hoàn thành thêm {len(documents)} documents vào vector store")
         return True
 
+    def add_data(self, new_documents, document_id: Optional[int] = None, replace: bool = False):
+        if not new_documents:
+            return False
+
+        # Embed hết trước khi đụng vào index: lỗi giữa chừng không để lại index thiếu chunk cũ
+        started = time.perf_counter()
+        try:
+            vectors = self.embed_documents(new_documents)
+        except Exception as e:
+            print(f"[ERROR] Lỗi khi embed {len(new_documents)} documents: {e}")
+            return False
+        embedded = time.perf_counter()
+        record_stage("ingestion", "embed", embedded - started)
+
+        merged = self.merge_documents(new_documents, vectors, document_id=document_id, replace=replace)
+        merge_seconds = time.perf_counter() - embedded
+        record_stage("ingestion", "merge", merge_seconds)
+        logger.debug(f'add_data chunks={len(new_documents)} embed={embedded - started:.2f}s merge={merge_seconds:.2f}s')
+        return merged
+
+    def delete_document(self, document_id: int, source: Optional[str] = None) -> int:
+        """Xóa toàn bộ chunk của một Document khỏi index, các tài liệu khác giữ nguyên vector."""
+        try:
+            removed = self._remove_document(self.db, document_id, source)
+            self._compact_if_needed(self.db)
+        except Exception as e:
+            print(f"[ERROR] Lỗi khi xóa document {document_id} khỏi index: {e}")
+            self.db.docstore.rollback()
+            raise
+        self._save()
+        print(f"[DEBUG] Đã xóa {removed} chunks của document {document_id}")
+        return removed
+
     def get_retriever(self,
                       search_kwargs: dict = {"k": 5},
-                      weights: List[float] = [0.8, 0.2]):
-    
-        faiss_retriever = self.db.as_retriever(
-            search_type="similarity",
-            search_kwargs=search_kwargs
-        )
-        
-        mmr_retriever = self.db.as_retriever(
-            search_type="mmr",
-            search_kwargs=search_kwargs
-        )
-        
-        ensemble_retriever = EnsembleRetriever(
-            retrievers=[faiss_retriever, mmr_retriever],
-            weights=weights
-        )
-        return ensemble_retriever
+                      weights: List[float] = [0.8, 0.2],
+                      snapshot: Optional[IndexSnapshot] = None):
+        # Một lần embed + một lần tìm kiếm, similarity và MMR được tính cục bộ rồi trộn RRF
+        snapshot = snapshot or self.snapshot
+        return HybridRetriever(db=snapshot.db,
+                               k=search_kwargs.get("k", 5),
+                               fetch_k=search_kwargs.get("fetch_k", 20),
+                               lambda_mult=search_kwargs.get("lambda_mult", 0.5),
+                               weights=weights)
     
     def get_compressed_retriever(self, search_kwargs: dict = {"k": 8}):
         # Tạo base retriever
         base_retriever = self.get_context_enriched_retriever()
         
         # Tạo compressor từ reranker
-        compressor = self.reranker.as_langchain_compressor(k=4)
+        compressor = self.reranker
         
         # Tạo compressed retriever
         compressed_retriever = ContextualCompressionRetriever(
@@ -117,10 +393,30 @@ class VectorDB:
             k: Số chunks chính cần lấy
             context_size: Số chunks lân cận mỗi bên
         """
+        self.ensure_current()
+
+        # Giữ snapshot của cả lượt tìm kiếm để không lẫn hai phiên bản index khi đang đổi
+        snapshot = self.snapshot
+        if snapshot.db is None:
+            return []
+
         # Tìm kiếm cơ bản trước
-        retriever = self.get_retriever(search_kwargs={"k": k})
+        retriever = self.get_retriever(search_kwargs={"k": k}, snapshot=snapshot)
         docs = retriever.invoke(query)
-        
+        return self._enrich(snapshot, docs, context_size)
+
+    async def acontext_enriched_search(self, query: str, k: int = 5, context_size: int = 1):
+        """Bản async của context_enriched_search cho ainvoke/astream."""
+        self.ensure_current()
+        snapshot = self.snapshot
+        if snapshot.db is None:
+            return []
+
+        retriever = self.get_retriever(search_kwargs={"k": k}, snapshot=snapshot)
+        docs = await retriever.ainvoke(query)
+        return self._enrich(snapshot, docs, context_size)
+
+    def _enrich(self, snapshot: IndexSnapshot, docs: List[Document], context_size: int):
         if not docs:
             return []
         
@@ -132,7 +428,7 @@ class VectorDB:
             source = doc.metadata.get('source', '')
             
             # Tìm các chunks lân cận
-            context_docs = self._get_neighbor_chunks(source, chunk_index, context_size)
+            context_docs = self._get_neighbor_chunks(snapshot, source, chunk_index, context_size)
             
             if context_docs:
                 # Tạo enriched content từ các chunks lân cận
@@ -154,39 +450,12 @@ class VectorDB:
         
         return enriched_docs
     
-    def _get_neighbor_chunks(self, source: str, chunk_index: int, context_size: int):
-        """Tìm các chunks lân cận"""        
-        # Query để tìm chunks cùng source (trick đơn giản)
-        try:
-            # Tìm kiếm với source name
-            source_docs = self.db.similarity_search(f"source:{source}", k=50)
-            
-            # Filter theo source thật sự và sort theo chunk_index
-            same_source_docs = []
-            for doc in source_docs:
-                if doc.metadata.get('source') == source:
-                    same_source_docs.append(doc)
-            
-            # Sort theo chunk_index
-            same_source_docs.sort(key=lambda x: x.metadata.get('chunk_index', 0))
-            
-            # Tìm vị trí của chunk hiện tại
-            current_pos = -1
-            for i, doc in enumerate(same_source_docs):
-                if doc.metadata.get('chunk_index') == chunk_index:
-                    current_pos = i
-                    break
-            
-            if current_pos >= 0:
-                # Lấy context chunks
-                start = max(0, current_pos - context_size)
-                end = min(len(same_source_docs), current_pos + context_size + 1)
-                return same_source_docs[start:end]
-                
-        except Exception as e:
-            print(f"[DEBUG] Lỗi khi tìm neighbor chunks: {e}")
-            
-        return []
+    def _get_neighbor_chunks(self, snapshot: IndexSnapshot, source: str, chunk_index: int, context_size: int):
+        """Tìm các chunks lân cận theo (source, chunk_index) trong docstore, không cần gọi embedding hay tìm kiếm vector"""
+        neighbors = snapshot.db.docstore.neighbors(source, chunk_index, context_size)
+        if not any(doc.metadata.get("chunk_index") == chunk_index for doc in neighbors):
+            return []
+        return neighbors
     
     def _combine_chunks(self, chunks: List[Document], main_chunk_index: int):
         """Kết hợp các chunks thành content enriched"""
@@ -223,6 +492,14 @@ class VectorDB:
                 run_manager: CallbackManagerForRetrieverRun = None
             ) -> List[Document]:
                 return vector_db_instance.context_enriched_search(query, k, context_size)
+
+            async def _aget_relevant_documents(
+                self,
+                query: str,
+                *,
+                run_manager: AsyncCallbackManagerForRetrieverRun = None
+            ) -> List[Document]:
+                return await vector_db_instance.acontext_enriched_search(query, k, context_size)
         
         return SimpleContextRetriever()
 
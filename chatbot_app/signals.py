@@ -1,30 +1,51 @@
 import logging
-from concurrent.futures import ThreadPoolExecutor
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 from django.apps import apps
 
 from .models import Document
-from .tasks import add_document_task_thread
+from .tasks import ingest_document_task, delete_document_task
+from .rag.index_registry import bump_index_version, index_namespace
 
 
 logger = logging.getLogger(__name__)
 
-executor = ThreadPoolExecutor(max_workers=1)
-
 @receiver(post_save, sender=Document)
 def load_post_save_document(sender, instance, created, **kwargs):
     if created:
         if not instance.file_path:
             logger.error(f'Skipping document {instance.id}: No file path.')
             return
-        transaction.on_commit(lambda: executor.submit(
-            add_document_task_thread,
+        # Chạy trên queue ingestion (một worker Celery duy nhất ghi index)
+        transaction.on_commit(lambda: ingest_document_task.delay(
             instance.id,
             instance.file_path.path,
         ))
     else:
-        chatbot = apps.get_app_config('chatbot_app').chatbot
-        chatbot.reset()
\ No newline at end of file
+        # Chỉ đổi index, không dựng lại toàn bộ chatbot trong request đang lưu Document.
+        # Tăng version như các task để worker web khác và inference server cũng nạp lại;
+        # process này nạp lại ngay nếu đã dựng chatbot
+        chatbot = apps.get_app_config('chatbot_app').loaded_chatbot
+        namespace = index_namespace(instance.organization_id)
+
+        def reload_index():
+            bump_index_version(namespace)
+            if chatbot is not None:
+                chatbot.reload_index(namespace)
+
+        transaction.on_commit(reload_index)
+
+
+@receiver(post_delete, sender=Document)
+def load_post_delete_document(sender, instance, **kwargs):
+    # Chỉ xóa vector của document này, các tài liệu khác không phải embed lại
+    document_id = instance.id
+    organization_id = instance.organization_id
+    file_path = instance.file_path.path if instance.file_path else ''
+    transaction.on_commit(lambda: delete_document_task.delay(
+        document_id,
+        file_path,
+        organization_id,
+    ))
@@ -1,35 +1,79 @@
 import logging
-from django.core.exceptions import ObjectDoesNotExist
+import os
+from celery import shared_task
 from .models import Document 
-from .rag.vector_db import VectorDB
-from .rag.file_loader import Loader
+from .rag.index_registry import bump_index_version, index_namespace
 
 
 logger = logging.getLogger(__name__)
 
 
-def add_document_task_thread(document_id: int, file_path: str):
-    document = None
+def _set_status(document_id: int, status: str):
+    # update() không phát post_save nên worker ingestion không nạp lại chatbot sau mỗi bước
+    Document.objects.filter(id=document_id).update(status=status)
+
+
+def _discard_upload(upload_path: str):
+    try:
+        os.remove(upload_path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f'Error deleting pending upload {upload_path}: {e}')
+
+
+@shared_task
+def ingest_document_task(document_id: int, file_path: str, replace: bool = False, upload_path: str = None):
+    """
+    upload_path: file upload lại đang nằm dưới tên tạm (DocumentViewSet._replace). File này được parse,
+    và chỉ thay vào file_path sau khi index đã có chunk mới; lỗi thì file và chunk cũ giữ nguyên.
+    """
+    document = Document.objects.filter(id=document_id).values('organization_id').first()
+    if document is None:
+        logger.error(f'Document with ID {document_id} not found.')
+        if upload_path:
+            _discard_upload(upload_path)
+        return
+    namespace = index_namespace(document['organization_id'])
 
     try:
-        document = Document.objects.get(id=document_id)
-        
         if not file_path:
             raise ValueError('File path is empty.')
 
-        docs = Loader().load(file_path=file_path)
-        is_succeeded = VectorDB().add_data(new_documents=docs)
+        # faiss, langchain, chonkie, pyvi chỉ được import trong worker ingestion, không phải ở mọi process
+        # import tasks (web, beat, signals)
+        from .rag.ingestion import IngestionPipeline
 
-        if is_succeeded is None:
-            raise RuntimeError('VectorDB returned None unexpectedly.')
+        pipeline = IngestionPipeline(on_stage=lambda stage: _set_status(document_id, stage))
+        is_succeeded = pipeline.run(document_id, upload_path or file_path, replace=replace, namespace=namespace,
+                                    source=file_path if upload_path else None)
 
-        document.status = Document.Status.COMPLETED if is_succeeded else Document.Status.FAILED
-        document.save(update_fields=['status'])
+        if is_succeeded:
+            if upload_path:
+                # os.replace thay file cũ một bước, không có lúc nào Document trỏ tới file không tồn tại
+                os.replace(upload_path, file_path)
+                upload_path = None
+            bump_index_version(namespace)
 
-    except ObjectDoesNotExist:
-        logger.error(f'Document with ID {document_id} not found.')
+        _set_status(document_id, Document.Status.COMPLETED if is_succeeded else Document.Status.FAILED)
+
+    except Exception as e:
+        _set_status(document_id, Document.Status.FAILED)
+        logger.exception(f'Error processing document {document_id}: {e}')
+
+    finally:
+        if upload_path:
+            _discard_upload(upload_path)
+
+
+@shared_task
+def delete_document_task(document_id: int, file_path: str, organization_id: int = None):
+    # Document đã bị xóa khỏi DB nên tổ chức được truyền vào từ signal
+    namespace = index_namespace(organization_id)
+    try:
+        from .rag.vector_db import VectorDB
+
+        if VectorDB(writable=True, namespace=namespace).delete_document(document_id, source=file_path):
+            bump_index_version(namespace)
     except Exception as e:
-        if document:
-            document.status = Document.Status.FAILED
-            document.save(update_fields=['status'])
-        logger.exception(f'Error processing document {document_id}: {e}')
\ No newline at end of file
+        logger.exception(f'Error removing document {document_id} from index: {e}')
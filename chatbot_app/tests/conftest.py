@@ -0,0 +1,7 @@
+import os
+
+import django
+
+# Chạy pytest không qua manage.py: dùng settings của project (cần các biến môi trường như khi chạy server)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
@@ -0,0 +1,56 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from chatbot_app.rag.chatbot import Chatbot
+
+SURVEY_RESULT = {"DASS-21": {"stress": "nặng", "anxiety": "vừa"}}
+
+
+def make_chatbot():
+    """Chatbot không dựng LLM/index: graph, semantic cache và single-flight là mock."""
+    chatbot = Chatbot.__new__(Chatbot)
+    chatbot.app = mock.Mock()
+    chatbot.app.get_state.return_value.values = {}
+    chatbot.app.invoke.return_value = {"current_intent": "1", "answer": "Bạn nên nghỉ ngơi."}
+    chatbot.semantic_cache = mock.Mock()
+    chatbot.semantic_cache.embed.return_value = np.ones(4, dtype=np.float32)
+    chatbot.semantic_cache.lookup.return_value = None
+    chatbot.single_flight = mock.Mock()
+    chatbot.single_flight.begin.return_value.wait.return_value = None
+    return chatbot
+
+
+@override_settings(CHATBOT_SEMANTIC_CACHE_ENABLED=True, CHATBOT_SINGLE_FLIGHT_ENABLED=False)
+class SemanticCacheTests(SimpleTestCase):
+    config = {"configurable": {"thread_id": "t-1"}}
+
+    def test_first_turn_answer_is_cached(self):
+        chatbot = make_chatbot()
+        chatbot.ask("Làm sao để bớt căng thẳng?", dict(self.config), 1)
+        chatbot.semantic_cache.lookup.assert_called_once()
+        chatbot.semantic_cache.store.assert_called_once()
+
+    def test_survey_result_is_neither_looked_up_nor_stored(self):
+        chatbot = make_chatbot()
+        intent, answer, _ = chatbot.ask("Làm sao để bớt căng thẳng?", dict(self.config), 1, result=SURVEY_RESULT)
+        self.assertEqual((intent, answer), ("1", "Bạn nên nghỉ ngơi."))
+        chatbot.semantic_cache.embed.assert_not_called()
+        chatbot.semantic_cache.lookup.assert_not_called()
+        chatbot.semantic_cache.store.assert_not_called()
+
+
+@override_settings(CHATBOT_SEMANTIC_CACHE_ENABLED=False, CHATBOT_SINGLE_FLIGHT_ENABLED=True)
+class SingleFlightTests(SimpleTestCase):
+    config = {"configurable": {"thread_id": "t-2"}}
+
+    def test_first_turn_answer_is_shared(self):
+        chatbot = make_chatbot()
+        chatbot.ask("Làm sao để bớt căng thẳng?", dict(self.config), 1)
+        chatbot.single_flight.begin.return_value.publish.assert_called_once()
+
+    def test_survey_result_does_not_join_a_flight(self):
+        chatbot = make_chatbot()
+        chatbot.ask("Làm sao để bớt căng thẳng?", dict(self.config), 1, result=SURVEY_RESULT)
+        chatbot.single_flight.begin.assert_not_called()
@@ -0,0 +1,61 @@
+import unicodedata
+
+import pytest
+import regex as re
+from pyvi import ViTokenizer
+
+from chatbot_app.rag.standardize import (
+    preprocess_text,
+    preprocess_texts,
+    standardize_unicode,
+    standardize_vietnamese_sentence,
+    standardize_vietnamese_word,
+)
+
+SAMPLES = [
+    "Sinh viên được nghỉ học tối đa bao nhiêu buổi?",
+    # Dấu kiểu mới (oà, uý) phải được đặt lại như kiểu cũ
+    "Hoà Bình, thuỷ điện và THUÝ NGÂN: khoẻ mạnh, loà xoà.",
+    # Từ có '/' không đi fast path
+    "Học phí 350.000đ/tín chỉ, học kỳ 1/2024 và/hoặc tốc độ 40km/h.",
+    # Chữ hoa, qu/gi, số và dấu câu dính liền
+    "QUÁ TRÌNH xét Học Bổng: GIÁ trị ĐIỂM rèn luyện (≥ 80) ... “Quy chế” - Điều 5!",
+    # Unicode tổ hợp (NFD) phải ra giống bản dựng sẵn
+    unicodedata.normalize("NFD", "Căng thẳng, lo âu và trầm cảm ở sinh viên năm nhất"),
+    "",
+    "   ",
+]
+
+
+def reference_standardize_sentence(sentence):
+    """standardize_vietnamese_sentence trước khi có fast path và cache theo từ."""
+    words = sentence.lower().split()
+    for index, word in enumerate(words):
+        cw = re.sub(r'(^\p{P}*)([p{L}.]*\p{L}+)(\p{P}*$)', r'\1/\2/\3', word).split('/')
+        if len(cw) == 3:
+            cw[1] = standardize_vietnamese_word(cw[1])
+        words[index] = ''.join(cw)
+    return ' '.join(words)
+
+
+def reference_preprocess(text):
+    """preprocess_text trước khi tách từ pyvi theo lô."""
+    text = standardize_unicode(text)
+    text = reference_standardize_sentence(text)
+    text = ViTokenizer.tokenize(text)
+    return text.lower()
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_standardize_sentence_matches_reference(text):
+    text = standardize_unicode(text)
+    assert standardize_vietnamese_sentence(text) == reference_standardize_sentence(text)
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_preprocess_text_matches_reference(text):
+    assert preprocess_text(text) == reference_preprocess(text)
+
+
+def test_preprocess_texts_matches_reference():
+    assert preprocess_texts(SAMPLES) == [reference_preprocess(text) for text in SAMPLES]
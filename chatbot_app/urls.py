@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import QAViewSet, DocumentViewSet, FAQViewSet
+from .views import QAViewSet, DocumentViewSet, FAQViewSet, ask_async
+from .metrics import metrics_view
 
 router = DefaultRouter()
 router.register(r'ask', QAViewSet, basename='ask')
@@ -8,5 +9,7 @@ router.register(r'documents', DocumentViewSet, basename='documents')
 router.register(r'faq', FAQViewSet, basename='faq')
 
 urlpatterns = [
+    path('ask/async/', ask_async, name='chatbot-ask-async'),
     path('', include(router.urls)),
+    path('metrics/', metrics_view, name='chatbot-metrics'),
 ]
\ No newline at end of file
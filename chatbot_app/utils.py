@@ -1,6 +1,8 @@
 import os
 import re
+import json
 from django.core.files.storage import FileSystemStorage
+from rest_framework.renderers import BaseRenderer
 
 class CustomStorage(FileSystemStorage):
     def get_available_name(self, name, max_length=None):
@@ -25,4 +27,21 @@ class CustomStorage(FileSystemStorage):
             else:
                 base = f'{base}(1)'
 
-        return f'{base}{ext}'
\ No newline at end of file
+        return f'{base}{ext}'
+
+
+def format_sse(event: str, data) -> str:
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+class ServerSentEventRenderer(BaseRenderer):
+    """
+    Lets DRF negotiate `Accept: text/event-stream`; the stream itself is a StreamingHttpResponse,
+    so only error payloads (e.g. serializer errors) ever go through render().
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_sse('error', data).encode(self.charset)
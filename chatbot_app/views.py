@@ -1,24 +1,73 @@
 import os
+import json
+import logging
 from django.core.cache import cache
 from django.apps import apps
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.exceptions import AuthenticationFailed
 
 from .models import Document, FAQ, QAHistory
+from .utils import ServerSentEventRenderer, format_sse
+from .tasks import ingest_document_task
+from .rag.index_registry import request_namespace
 from .serializers import (
     DocumentSerializer,
     FAQSerializer,
     InputQASerializer,
     OutputQASerializer,
 )
+from core.authentication import CustomJWTAuthentication
 from core.permissions import IsOrganizationUser, IsCustomerUser
 from core.ratelimit import rate_limit_decorator
 from core.pagination import CustomPagination
 
-chatbot = apps.get_app_config('chatbot_app').chatbot
+logger = logging.getLogger(__name__)
+
+
+def get_chatbot():
+    # Dựng ở câu hỏi đầu tiên nếu worker chưa warm-up (ChatbotAppConfig.warm_up)
+    return apps.get_app_config('chatbot_app').chatbot
+
+
+def get_user_organization(user):
+    """Tổ chức của người dùng (owner, partner hoặc customer của tổ chức), None nếu không thuộc tổ chức nào."""
+    if not user.is_authenticated:
+        return None
+    if hasattr(user, 'organization_profile'):
+        return user.organization_profile
+    if hasattr(user, 'partner_profile'):
+        return user.partner_profile.organization
+    if hasattr(user, 'customer_profile') and user.customer_profile.partner_id:
+        return user.customer_profile.partner.organization
+    return None
+
+
+def save_qa_history(user, thread_id, question, intent, answer, is_sktt=False, intent_route=''):
+    """Lưu lượt hỏi đáp: lịch sử của người dùng và dữ liệu huấn luyện của manage.py train_intent_router."""
+    # Người hỏi ẩn danh không có user; luồng SKTT không qua phân loại intent nên không dùng làm nhãn
+    if is_sktt or not answer or user is None or not user.is_authenticated:
+        return
+    try:
+        QAHistory.objects.create(user=user, thread_id=thread_id, intent=intent or '',
+                                 intent_route=intent_route or '', question=question, answer=answer)
+    except Exception as e:
+        logger.exception(f"Không lưu được QAHistory của thread {thread_id}: {e}")
+
+
+def get_index_namespace(user):
+    # Câu hỏi chỉ được tìm trong index của tổ chức người hỏi; không thuộc tổ chức nào thì không có index
+    organization = get_user_organization(user)
+    return request_namespace(organization.id if organization else None)
 
 
 class QAViewSet(viewsets.ViewSet):
@@ -31,7 +80,11 @@ class QAViewSet(viewsets.ViewSet):
             result = serializer.validated_data.get('result', None)
             user_id = 1
             config = {'configurable': {'thread_id': thread_id, 'stream_mode': 'updates'}}
-            current_intent, answer = chatbot.ask(question, config, user_id, is_sktt=is_sktt, result=result)
+            namespace = get_index_namespace(request.user)
+            current_intent, answer, intent_route = get_chatbot().ask(question, config, user_id, is_sktt=is_sktt,
+                                                                     result=result, namespace=namespace)
+            save_qa_history(request.user, thread_id, question, current_intent, answer, is_sktt=is_sktt,
+                            intent_route=intent_route)
 
             output_serializer = OutputQASerializer(data={'answer': answer})
             if output_serializer.is_valid():
@@ -39,13 +92,103 @@ class QAViewSet(viewsets.ViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='stream', renderer_classes=[JSONRenderer, ServerSentEventRenderer])
+    def stream(self, request):
+        serializer = InputQASerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        question = serializer.validated_data['question']
+        thread_id = serializer.validated_data['thread_id']
+        is_sktt = serializer.validated_data.get('is_sktt', False)
+        result = serializer.validated_data.get('result', None)
+        user_id = 1
+        config = {'configurable': {'thread_id': thread_id}}
+        user = request.user
+        namespace = get_index_namespace(user)
+
+        async def event_stream():
+            try:
+                # Dựng chatbot (nếu chưa có) ngoài event loop
+                chatbot = await sync_to_async(get_chatbot, thread_sensitive=False)()
+                async for event, data in chatbot.astream(question, config, user_id, is_sktt=is_sktt, result=result,
+                                                         namespace=namespace):
+                    yield format_sse(event, data)
+                    if event == 'done':
+                        await sync_to_async(save_qa_history)(user, thread_id, question, data['intent'],
+                                                             data['answer'], is_sktt=is_sktt,
+                                                             intent_route=data.get('intent_route', ''))
+            except Exception as e:
+                # Lỗi nội bộ (OpenAI, Redis, FAISS) có thể chứa đường dẫn hay key: chỉ ghi log, client nhận lỗi chung
+                logger.exception(f"Stream của thread {thread_id} lỗi: {e}")
+                yield format_sse('error', {'error': 'Internal server error'})
+
+        response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Tắt buffer của nginx để token được đẩy xuống client ngay
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+def _request_user(request):
+    """(người gửi request, namespace index của họ) cho view Django thuần (không qua authentication của DRF)."""
+    user = request.user
+    result = CustomJWTAuthentication().authenticate(request)
+    if result is not None:
+        user, _ = result
+    return user, get_index_namespace(user)
+
+
+@csrf_exempt
+@require_POST
+async def ask_async(request):
+    """
+    Giống QAViewSet.create nhưng là async view của Django (DRF chưa hỗ trợ async): pipeline chạy bằng
+    ainvoke nên request đang chờ OpenAI không giữ thread nào bận, một worker giữ được nhiều cuộc chat cùng lúc.
+    """
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        data = request.POST
+
+    serializer = InputQASerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Xác thực JWT và tra tổ chức đều đụng tới DB
+        user, namespace = await sync_to_async(_request_user)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+
+    question = serializer.validated_data['question']
+    thread_id = serializer.validated_data['thread_id']
+    is_sktt = serializer.validated_data.get('is_sktt', False)
+    result = serializer.validated_data.get('result', None)
+    user_id = 1
+    config = {'configurable': {'thread_id': thread_id}}
+    # Lần dựng đầu tiên mất vài giây, không chạy trên event loop
+    chatbot = await sync_to_async(get_chatbot, thread_sensitive=False)()
+    current_intent, answer, intent_route = await chatbot.aask(question, config, user_id, is_sktt=is_sktt,
+                                                              result=result, namespace=namespace)
+    await sync_to_async(save_qa_history)(user, thread_id, question, current_intent, answer, is_sktt=is_sktt,
+                                         intent_route=intent_route)
+
+    output_serializer = OutputQASerializer(data={'answer': answer})
+    if not output_serializer.is_valid():
+        return JsonResponse(output_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse(output_serializer.data, json_dumps_params={'ensure_ascii': False})
+
 
 class DocumentViewSet(viewsets.ViewSet):
     permission_classes = [IsOrganizationUser]
 
     @rate_limit_decorator(rate='20/m')
     def list(self, request):
-        documents = Document.objects.all().order_by('-uploaded_at')
+        documents = Document.objects.filter(organization=request.user.organization_profile).order_by('-uploaded_at')
         serializer = DocumentSerializer(documents, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -56,7 +199,15 @@ class DocumentViewSet(viewsets.ViewSet):
         if not file:
             return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
 
+        organization = request.user.organization_profile
+        # Upload lại file cùng tên: thay vector của document cũ thay vì thêm một bản trùng
+        document = Document.objects.filter(
+            organization=organization,
+            file_name=file.name,
+        ).order_by('-uploaded_at').first()
+
         serializer = DocumentSerializer(
+            document,
             data={
                 'file_path': file,
                 'file_name': file.name,
@@ -65,12 +216,34 @@ class DocumentViewSet(viewsets.ViewSet):
             context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if document is not None:
+            return self._replace(document, serializer)
+
+        serializer.save(organization=organization)
         return Response(status=status.HTTP_201_CREATED)
 
+    def _replace(self, document, serializer):
+        # File cũ vẫn phục vụ (và là source của chunk cũ) trong lúc ingest: lưu upload dưới tên tạm,
+        # task chỉ thay nó vào đường dẫn cũ sau khi index đã có chunk mới
+        upload = serializer.validated_data['file_path']
+        storage = document.file_path.storage
+        upload_name = storage.save(f'documents/pending/{upload.name}', upload)
+        # update() không phát post_save, việc nạp lại index do task bên dưới lo
+        Document.objects.filter(pk=document.pk).update(
+            file_name=serializer.validated_data['file_name'],
+            status=Document.Status.WAITING,
+        )
+        transaction.on_commit(lambda: ingest_document_task.delay(
+            document.id,
+            document.file_path.path,
+            True,
+            storage.path(upload_name),
+        ))
+        return Response(status=status.HTTP_200_OK)
+
     @rate_limit_decorator(rate='20/m')
     def destroy(self, request, pk=None):
-        document = get_object_or_404(Document, pk=pk)
+        document = get_object_or_404(Document, pk=pk, organization=request.user.organization_profile)
         document_file_path = document.file_path.path
         document.delete()
         if os.path.exists(document_file_path):
@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from django.apps import apps
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Chỉ worker web (uvicorn) đi qua file này: dựng chatbot trước khi nhận request đầu tiên.
+# celery worker, beat và manage.py không import asgi nên chatbot chỉ được dựng khi thật sự cần
+apps.get_app_config('chatbot_app').warm_up()
@@ -258,6 +258,111 @@ OPENAI_API_KEY=env('OPENAI_API_KEY')
 CELERY_BROKER_URL = env('CELERY_BROKER_URL')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
+# Ingestion tài liệu chatbot chạy trên queue riêng (service celery-ingestion, pool solo) để chỉ có
+# một tiến trình ghi FAISS index và upload mới không phải chờ các task khác
+CELERY_TASK_ROUTES = {
+    'chatbot_app.tasks.ingest_document_task': {'queue': 'ingestion'},
+    'chatbot_app.tasks.delete_document_task': {'queue': 'ingestion'},
+}
+
+# Chatbot
+# Worker web dựng chatbot (FAISS, LLM, reranker, graph) ngay khi khởi động (config/asgi.py); tắt để dựng ở câu hỏi
+# đầu tiên. Celery worker, beat và manage.py không bao giờ dựng chatbot khi khởi động
+CHATBOT_WARMUP = env.bool('CHATBOT_WARMUP', default=True)
+# Ngân sách thời gian khởi động (giây) của process không dựng chatbot, kiểm tra bằng manage.py benchmark_startup
+CHATBOT_STARTUP_BUDGET_SECONDS = env.float('CHATBOT_STARTUP_BUDGET_SECONDS', default=2.0)
+# local: mỗi worker web tự dựng Chatbot; remote: mọi worker dùng chung một process manage.py run_chatbot_server
+CHATBOT_INFERENCE_MODE = env('CHATBOT_INFERENCE_MODE', default='local')
+# Unix socket của inference server, phải nằm trên volume chung giữa web và chatbot
+CHATBOT_INFERENCE_SOCKET = env('CHATBOT_INFERENCE_SOCKET', default=os.path.join(RUNTIME_DIR, 'chatbot.sock'))
+# Số kết nối nhàn rỗi tối đa mỗi worker giữ tới inference server
+CHATBOT_INFERENCE_POOL_SIZE = env.int('CHATBOT_INFERENCE_POOL_SIZE', default=16)
+# Thời gian chờ câu trả lời (stream: giữa hai event) và thời gian chờ kết nối, tính bằng giây
+CHATBOT_INFERENCE_TIMEOUT = env.float('CHATBOT_INFERENCE_TIMEOUT', default=120.0)
+CHATBOT_INFERENCE_CONNECT_TIMEOUT = env.float('CHATBOT_INFERENCE_CONNECT_TIMEOUT', default=2.0)
+# Bộ nhớ hội thoại dùng chung giữa các worker uvicorn
+CHATBOT_CHECKPOINT_REDIS_URL = env('CHATBOT_CHECKPOINT_REDIS_URL', default=CELERY_BROKER_URL)
+CHATBOT_CHECKPOINT_TTL = env.int('CHATBOT_CHECKPOINT_TTL', default=7 * 24 * 60 * 60)
+CHATBOT_CHECKPOINT_MAX_MESSAGES = env.int('CHATBOT_CHECKPOINT_MAX_MESSAGES', default=20)
+
+# Token Prometheus gửi trong header "Authorization: Bearer <token>" khi scrape /api/chatbot/metrics/;
+# để trống thì chỉ tài khoản staff (đăng nhập admin) xem được
+CHATBOT_METRICS_TOKEN = env('CHATBOT_METRICS_TOKEN', default='')
+
+# Cache câu trả lời theo ngữ nghĩa cho câu hỏi đầu tiên của thread
+CHATBOT_SEMANTIC_CACHE_ENABLED = env.bool('CHATBOT_SEMANTIC_CACHE_ENABLED', default=True)
+CHATBOT_SEMANTIC_CACHE_THRESHOLD = env.float('CHATBOT_SEMANTIC_CACHE_THRESHOLD', default=0.95)
+CHATBOT_SEMANTIC_CACHE_TTL = env.int('CHATBOT_SEMANTIC_CACHE_TTL', default=24 * 60 * 60)
+CHATBOT_SEMANTIC_CACHE_MAX_ENTRIES = env.int('CHATBOT_SEMANTIC_CACHE_MAX_ENTRIES', default=1000)
+
+# Gộp các câu hỏi đầu tiên giống nhau đang chạy đồng thời (giữa các worker qua Redis): follower chờ tối đa
+# TIMEOUT giây rồi tự chạy pipeline, kết quả của leader được giữ RESULT_TTL giây cho request đến muộn
+CHATBOT_SINGLE_FLIGHT_ENABLED = env.bool('CHATBOT_SINGLE_FLIGHT_ENABLED', default=True)
+CHATBOT_SINGLE_FLIGHT_TIMEOUT = env.float('CHATBOT_SINGLE_FLIGHT_TIMEOUT', default=30.0)
+CHATBOT_SINGLE_FLIGHT_RESULT_TTL = env.int('CHATBOT_SINGLE_FLIGHT_RESULT_TTL', default=30)
+CHATBOT_SINGLE_FLIGHT_POLL_INTERVAL = env.float('CHATBOT_SINGLE_FLIGHT_POLL_INTERVAL', default=0.2)
+
+# Embedding cho VectorDB, SDPMChunker, semantic cache: openai (text-embedding-3-large) hoặc onnx (model
+# sentence-transformer đa ngôn ngữ chạy CPU, thư mục chứa model.onnx + tokenizer.json). Đổi provider cần dựng
+# lại index bằng manage.py reindex_embeddings. THREADS=0 để onnxruntime tự chọn theo số core; chunk dài hơn
+# MAX_LENGTH token bị cắt khi embed. Model e5 cần QUERY_PREFIX="query: " và PASSAGE_PREFIX="passage: "
+CHATBOT_EMBEDDING_PROVIDER = env('CHATBOT_EMBEDDING_PROVIDER', default='openai')
+CHATBOT_EMBEDDING_ONNX_MODEL_DIR = env('CHATBOT_EMBEDDING_ONNX_MODEL_DIR', default=os.path.join(RUNTIME_DIR, 'embedding'))
+CHATBOT_EMBEDDING_ONNX_MAX_LENGTH = env.int('CHATBOT_EMBEDDING_ONNX_MAX_LENGTH', default=512)
+CHATBOT_EMBEDDING_ONNX_BATCH_SIZE = env.int('CHATBOT_EMBEDDING_ONNX_BATCH_SIZE', default=32)
+CHATBOT_EMBEDDING_ONNX_THREADS = env.int('CHATBOT_EMBEDDING_ONNX_THREADS', default=0)
+CHATBOT_EMBEDDING_ONNX_POOLING = env('CHATBOT_EMBEDDING_ONNX_POOLING', default='mean')
+CHATBOT_EMBEDDING_ONNX_QUERY_PREFIX = env('CHATBOT_EMBEDDING_ONNX_QUERY_PREFIX', default='')
+CHATBOT_EMBEDDING_ONNX_PASSAGE_PREFIX = env('CHATBOT_EMBEDDING_ONNX_PASSAGE_PREFIX', default='')
+
+# Cache embedding theo nội dung (SQLite + LRU trong process)
+CHATBOT_EMBEDDING_CACHE_PATH = env('CHATBOT_EMBEDDING_CACHE_PATH', default=os.path.join(RUNTIME_DIR, 'embedding_cache.sqlite3'))
+CHATBOT_EMBEDDING_CACHE_LRU_SIZE = env.int('CHATBOT_EMBEDDING_CACHE_LRU_SIZE', default=2000)
+
+# Chu kỳ (giây) mỗi worker kiểm tra version index trên Redis để nạp lại tài liệu mới
+CHATBOT_INDEX_VERSION_CHECK_INTERVAL = env.float('CHATBOT_INDEX_VERSION_CHECK_INTERVAL', default=2.0)
+
+# Loại FAISS index (flat | hnsw | ivf_flat | ivf_pq) cho migrate_index và cho index flat đã đủ lớn, cùng tham số tìm kiếm khi nạp.
+# Chỉ IVF được worker mmap (dùng chung page cache), flat/HNSW bị đọc vào heap của từng worker
+CHATBOT_FAISS_INDEX_TYPE = env('CHATBOT_FAISS_INDEX_TYPE', default='ivf_flat')
+# Index mới bắt đầu là flat; ingestion tự chuyển sang CHATBOT_FAISS_INDEX_TYPE (nếu là IVF) khi có từ ngần này vector,
+# worker cảnh báo khi nạp index flat/HNSW lớn hơn
+CHATBOT_FAISS_IVF_MIN_VECTORS = env.int('CHATBOT_FAISS_IVF_MIN_VECTORS', default=2000)
+CHATBOT_FAISS_NLIST = env.int('CHATBOT_FAISS_NLIST', default=0)
+CHATBOT_FAISS_HNSW_M = env.int('CHATBOT_FAISS_HNSW_M', default=32)
+CHATBOT_FAISS_PQ_M = env.int('CHATBOT_FAISS_PQ_M', default=64)
+CHATBOT_FAISS_NPROBE = env.int('CHATBOT_FAISS_NPROBE', default=16)
+CHATBOT_FAISS_EF_SEARCH = env.int('CHATBOT_FAISS_EF_SEARCH', default=64)
+# Mỗi tổ chức một index riêng, worker giữ các index đã nạp trong LRU tối đa ngần này MB (theo kích thước index.faiss)
+CHATBOT_INDEX_POOL_MEMORY_MB = env.int('CHATBOT_INDEX_POOL_MEMORY_MB', default=1024)
+# Tỷ lệ vector đã xóa (tombstone, chỉ HNSW) trong index vượt ngưỡng này thì dựng lại index
+CHATBOT_INDEX_COMPACT_RATIO = env.float('CHATBOT_INDEX_COMPACT_RATIO', default=0.2)
+
+# Ingestion: số process parse PDF, số thread chia chunk, batch/số batch embed song song
+CHATBOT_INGEST_PARSE_WORKERS = env.int('CHATBOT_INGEST_PARSE_WORKERS', default=4)
+CHATBOT_INGEST_CHUNK_WORKERS = env.int('CHATBOT_INGEST_CHUNK_WORKERS', default=4)
+CHATBOT_INGEST_EMBED_BATCH_SIZE = env.int('CHATBOT_INGEST_EMBED_BATCH_SIZE', default=256)
+CHATBOT_INGEST_EMBED_CONCURRENCY = env.int('CHATBOT_INGEST_EMBED_CONCURRENCY', default=4)
+# Rate limit của tài khoản OpenAI cho model embedding (token/phút, request/phút)
+CHATBOT_EMBEDDING_TPM = env.int('CHATBOT_EMBEDDING_TPM', default=1000000)
+CHATBOT_EMBEDDING_RPM = env.int('CHATBOT_EMBEDDING_RPM', default=3000)
+
+# Reranker cho retriever: rankllm (gpt-4o), onnx (cross-encoder chạy CPU) hoặc bm25
+CHATBOT_RERANKER = env('CHATBOT_RERANKER', default='rankllm')
+CHATBOT_RERANKER_ONNX_MODEL_DIR = env('CHATBOT_RERANKER_ONNX_MODEL_DIR', default=os.path.join(RUNTIME_DIR, 'reranker'))
+CHATBOT_RERANKER_ONNX_MAX_LENGTH = env.int('CHATBOT_RERANKER_ONNX_MAX_LENGTH', default=512)
+CHATBOT_RERANKER_ONNX_THREADS = env.int('CHATBOT_RERANKER_ONNX_THREADS', default=0)
+CHATBOT_RERANKER_CACHE_TTL = env.int('CHATBOT_RERANKER_CACHE_TTL', default=24 * 60 * 60)
+
+# Phân loại intent cục bộ (train_intent_router), dưới ngưỡng thì hỏi LLM
+CHATBOT_INTENT_ROUTER_MODEL_PATH = env('CHATBOT_INTENT_ROUTER_MODEL_PATH', default=os.path.join(RUNTIME_DIR, 'intent_router.joblib'))
+CHATBOT_INTENT_ROUTER_THRESHOLD = env.float('CHATBOT_INTENT_ROUTER_THRESHOLD', default=0.9)
+
+# Ngân sách token cho prompt gpt-4o (context + lịch sử chat), lịch sử giữ nguyên tối đa HISTORY_TOKENS,
+# các lượt cũ hơn được tóm tắt bằng gpt-4o-mini
+CHATBOT_PROMPT_MAX_TOKENS = env.int('CHATBOT_PROMPT_MAX_TOKENS', default=6000)
+CHATBOT_PROMPT_HISTORY_TOKENS = env.int('CHATBOT_PROMPT_HISTORY_TOKENS', default=1500)
+CHATBOT_PROMPT_TOKENIZER_MODEL = env('CHATBOT_PROMPT_TOKENIZER_MODEL', default='gpt-4o')
 
 CELERY_BEAT_SCHEDULE = {
     'check_appointment_notification-every-1-minutes': {
@@ -0,0 +1,20 @@
+import threading
+
+from django.conf import settings
+
+_lock = threading.Lock()
+
+
+def get_firebase_app():
+    """
+    App Firebase mặc định, khởi tạo ở lần dùng đầu tiên (đăng nhập Google, gửi thông báo FCM)
+    thay vì trong AppConfig.ready() của mọi process (migrate, collectstatic, celery beat...).
+    """
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _lock:
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(settings.GOOGLE_APPLICATION_CREDENTIALS)
+            firebase_admin.initialize_app(cred)
+    return firebase_admin.get_app()
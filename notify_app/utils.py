@@ -1,12 +1,15 @@
-from firebase_admin.messaging import Message, Notification
 from fcm_django.models import FCMDevice 
 
+from core.firebase import get_firebase_app
+
 
 def send_firebase_notification(user_ids, title, body):
+    from firebase_admin.messaging import Message, Notification
+
     message = Message(
         notification=Notification(title=title, body=body)
     )
 
     devices = FCMDevice.objects.filter(user__id__in=user_ids)
     if devices:
-        devices.send_message(message)
\ No newline at end of file
+        devices.send_message(message, app=get_firebase_app())
\ No newline at end of file
@@ -1,13 +1,16 @@
 from django.contrib.auth import authenticate
-from firebase_admin import auth
 from rest_framework.exceptions import AuthenticationFailed
 
+from core.firebase import get_firebase_app
+
 
 class Google:
     @staticmethod
     def validate(id_token):
+        from firebase_admin import auth
+
         try:
-            decoded_token = auth.verify_id_token(id_token)
+            decoded_token = auth.verify_id_token(id_token, app=get_firebase_app())
             return decoded_token
         except auth.ExpiredIdTokenError:
             raise AuthenticationFailed('Token has expired.')